@@ -0,0 +1,167 @@
+import os
+import time
+import atexit
+import threading
+
+from dotenv import load_dotenv
+
+from helpers import bulk_update_mock_answers
+from metrics import metrics
+
+load_dotenv()
+
+# Graded answers written back per UPDATE statement
+ANSWER_WRITE_BATCH_SIZE = int(os.getenv("ANSWER_WRITE_BATCH_SIZE") or "50")
+# Longest time in seconds a graded answer waits in the buffer
+ANSWER_WRITE_FLUSH_SECONDS = float(
+    os.getenv("ANSWER_WRITE_FLUSH_SECONDS") or "5")
+
+
+class MockAnswerWriter:
+    """
+    Buffers graded answers and writes them back to MockAnswers in set-based
+    batches. A batch is flushed when it reaches `batch_size`, when its oldest
+    entry is `flush_interval` seconds old, and when the writer is closed
+    (including at interpreter exit). Safe to use from several threads.
+
+    Args:
+        session_factory (callable): Returns a new SQLAlchemy session, used
+                                    only by the writer.
+        batch_size (int): Results per flush.
+        flush_interval (float): Seconds before a partial batch is flushed.
+        on_flushed (callable, optional): Called as on_flushed(context, ok) for
+                                         every flushed result, where ok is
+                                         False if the record wasn't found or
+                                         couldn't be written.
+        on_batch_flushed (callable, optional): Called as
+                                         on_batch_flushed(session, results)
+                                         after every batch with the results
+                                         written, and the writer's session.
+    """
+
+    def __init__(self, session_factory, batch_size=ANSWER_WRITE_BATCH_SIZE,
+                 flush_interval=ANSWER_WRITE_FLUSH_SECONDS, on_flushed=None,
+                 on_batch_flushed=None):
+        self.session = session_factory()
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.on_flushed = on_flushed
+        self.on_batch_flushed = on_batch_flushed
+        self.written = 0
+        self.missing = 0
+        self.failed = 0
+
+        self._buffer = []
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._closed = threading.Event()
+
+        self._timer = threading.Thread(
+            target=self._flush_periodically, name="answer-writer", daemon=True)
+        self._timer.start()
+        atexit.register(self.close)
+
+    def add(self, result, context=None):
+        """
+        Queue one graded answer for writing.
+
+        Args:
+            result (MockAnswerResult): The values to write.
+            context: Passed back to on_flushed with the outcome.
+        """
+        with self._lock:
+            if not self._buffer:
+                self._oldest = time.monotonic()
+            self._buffer.append((result, context))
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Write everything buffered so far. Returns the number written."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+                self._oldest = None
+            if not batch:
+                return 0
+
+            try:
+                with metrics.timer("db_write"):
+                    outcomes = bulk_update_mock_answers(
+                        self.session, [result for result, _ in batch])
+            except Exception as ex:
+                print(
+                    f"[-] Error writing {len(batch)} MockAnswers: {ex}, writing them one by one.")
+                outcomes = self._write_each(batch)
+            else:
+                written = sum(outcomes)
+                self.written += written
+                self.missing += len(batch) - written
+                metrics.inc("answers_written_total", written)
+                print(
+                    f"[+] Wrote {written}/{len(batch)} MockAnswers in one batch.")
+
+            for (result, context), ok in zip(batch, outcomes):
+                if not ok:
+                    print(
+                        f"-> MockAnswers not updated for mock_question_id: {result.mock_question_id} user_mock_id: {result.user_mock_id} and user_id: {result.user_id}")
+                if self.on_flushed:
+                    try:
+                        self.on_flushed(context, ok)
+                    except Exception as ex:
+                        print(f"[-] Error after writing MockAnswers: {ex}")
+
+            written = [result for (result, _), ok in zip(batch, outcomes) if ok]
+            if self.on_batch_flushed and written:
+                try:
+                    self.on_batch_flushed(self.session, written)
+                except Exception as ex:
+                    self.session.rollback()
+                    print(f"[-] Error after writing MockAnswers: {ex}")
+            return sum(outcomes)
+
+    def _write_each(self, batch):
+        """
+        Write a batch that failed as a whole one result at a time, so a single
+        bad row doesn't fail the others. Returns the outcome of each result.
+        """
+        outcomes = []
+        for result, _ in batch:
+            try:
+                ok, = bulk_update_mock_answers(self.session, [result])
+            except Exception as ex:
+                print(
+                    f"[-] Error writing MockAnswers for user_mock_id: {result.user_mock_id}: {ex}")
+                ok = False
+                self.failed += 1
+            else:
+                self.written += ok
+                self.missing += not ok
+            outcomes.append(ok)
+        written = sum(outcomes)
+        metrics.inc("answers_written_total", written)
+        print(f"[+] Wrote {written}/{len(batch)} MockAnswers one by one.")
+        return outcomes
+
+    def _flush_periodically(self):
+        while not self._closed.wait(min(1.0, self.flush_interval)):
+            with self._lock:
+                due = self._oldest is not None and \
+                    time.monotonic() - self._oldest >= self.flush_interval
+            if due:
+                self.flush()
+
+    def stats(self):
+        return {"written": self.written, "missing": self.missing, "failed": self.failed}
+
+    def close(self):
+        """Flush what's left and release the session. Safe to call twice."""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._timer.join()
+        self.flush()
+        self.session.close()
+        atexit.unregister(self.close)
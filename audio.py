@@ -0,0 +1,150 @@
+import os
+import subprocess
+from collections import namedtuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Sample rate Whisper models expect
+SAMPLE_RATE = 16000
+
+# A recording whose loudest frame stays below this (dBFS) is blank. Kept
+# low so a quiet microphone or low input gain still counts as speech.
+SILENCE_THRESHOLD_DB = float(os.getenv("AUDIO_SILENCE_DB") or "-60")
+# Frames more than this many dB below the loudest frame count as silence
+# when trimming, so the threshold follows the recording's level
+SILENCE_RELATIVE_DB = float(os.getenv("AUDIO_SILENCE_RELATIVE_DB") or "35")
+# Least speech in milliseconds for an answer not to count as blank
+MIN_SPEECH_MS = int(os.getenv("AUDIO_MIN_SPEECH_MS") or "300")
+FRAME_MS = 30
+# Silence kept around the speech so word edges aren't clipped
+PADDING_MS = 250
+# Opus bitrate of the re-encoded audio, plenty for 16 kHz speech
+ENCODED_BITRATE = "24k"
+ENCODED_EXTENSION = ".ogg"
+# Everything that changes the trimmed audio, for transcript cache keys
+PREPROCESS_SETTINGS = (f"trim:{SILENCE_THRESHOLD_DB:g}:{SILENCE_RELATIVE_DB:g}:"
+                       f"{MIN_SPEECH_MS}:{PADDING_MS}")
+
+# A decoded and trimmed answer. `samples` is the trimmed 16 kHz mono audio,
+# `data` the same re-encoded as Ogg/Opus; durations are in seconds.
+PreparedAudio = namedtuple(
+    "PreparedAudio", ["samples", "data", "duration", "speech_duration", "silent"])
+
+
+def decode_audio(data, sample_rate=SAMPLE_RATE):
+    """
+    Decode an in-memory audio file to mono float32 PCM by piping it through
+    ffmpeg, without writing it to disk.
+
+    Args:
+        data (bytes): The encoded audio file, e.g. a browser webm recording.
+        sample_rate (int): Sample rate to resample to.
+
+    Returns:
+        np.ndarray: Samples in [-1, 1].
+
+    Raises:
+        RuntimeError: If ffmpeg can't decode the audio.
+    """
+    cmd = [
+        "ffmpeg", "-nostdin", "-threads", "0",
+        "-i", "pipe:0",
+        "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(sample_rate),
+        "-",
+    ]
+    try:
+        out = subprocess.run(cmd, input=data, capture_output=True, check=True).stdout
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(
+            f"Failed to decode audio: {e.stderr.decode(errors='ignore')}") from e
+
+    return np.frombuffer(out, np.int16).flatten().astype(np.float32) / 32768.0
+
+
+def speech_bounds(samples, sample_rate=SAMPLE_RATE, threshold_db=SILENCE_THRESHOLD_DB,
+                  min_speech_ms=MIN_SPEECH_MS, relative_db=SILENCE_RELATIVE_DB):
+    """
+    Find where speech starts and ends with a frame energy VAD: 30 ms frames
+    within `relative_db` of the loudest frame, and louder than `threshold_db`
+    dBFS, count as speech.
+
+    Args:
+        samples (np.ndarray): Mono float32 samples in [-1, 1].
+        sample_rate (int): Sample rate of `samples`.
+        threshold_db (float): Frame RMS level below which a frame is always
+                              silence.
+        min_speech_ms (int): Less speech than this counts as silence, so
+                             clicks and pops don't make an answer non-blank.
+        relative_db (float): How far below the loudest frame a frame still
+                             counts as speech.
+
+    Returns:
+        tuple: (start, end) sample indices including some padding, or None
+               if the audio is silent.
+    """
+    frame = sample_rate * FRAME_MS // 1000
+    count = len(samples) // frame
+    if count == 0:
+        return None
+
+    frames = samples[:count * frame].reshape(count, frame)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+    level = 20 * np.log10(np.maximum(rms, 1e-10))
+    voiced = np.flatnonzero(level > max(threshold_db, level.max() - relative_db))
+    if len(voiced) * FRAME_MS < min_speech_ms:
+        return None
+
+    padding = sample_rate * PADDING_MS // 1000
+    start = max(0, int(voiced[0]) * frame - padding)
+    end = min(len(samples), (int(voiced[-1]) + 1) * frame + padding)
+    return start, end
+
+
+def encode_audio(samples, sample_rate=SAMPLE_RATE):
+    """
+    Encode mono float32 samples as a compact Ogg/Opus file in memory.
+
+    Raises:
+        RuntimeError: If ffmpeg can't encode the audio.
+    """
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+    cmd = [
+        "ffmpeg", "-nostdin", "-threads", "0",
+        "-f", "s16le", "-ac", "1", "-ar", str(sample_rate), "-i", "pipe:0",
+        "-c:a", "libopus", "-b:a", ENCODED_BITRATE, "-application", "voip",
+        "-f", "ogg", "-",
+    ]
+    try:
+        return subprocess.run(cmd, input=pcm, capture_output=True, check=True).stdout
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(
+            f"Failed to encode audio: {e.stderr.decode(errors='ignore')}") from e
+
+
+def preprocess_audio(data, encode=True):
+    """
+    Decode an answer recording once, trim leading and trailing silence and,
+    with `encode`, re-encode it compactly for upload.
+
+    Args:
+        data (bytes): The encoded audio file as downloaded.
+        encode (bool): Also build the Ogg/Opus file; local transcription
+                       uses the samples directly and doesn't need it.
+
+    Returns:
+        PreparedAudio: With `silent` set and no samples or data when the
+                       recording holds no speech.
+    """
+    samples = decode_audio(data)
+    duration = len(samples) / SAMPLE_RATE
+
+    bounds = speech_bounds(samples)
+    if bounds is None:
+        return PreparedAudio(None, None, duration, 0.0, True)
+
+    samples = samples[bounds[0]:bounds[1]]
+    encoded = encode_audio(samples) if encode else None
+    return PreparedAudio(samples, encoded, duration, len(samples) / SAMPLE_RATE, False)
@@ -0,0 +1,234 @@
+"""
+Local stand-ins for the services the grading jobs call, served from one
+HTTP server so a benchmark never touches production:
+
+    /storage/v1/object/...   Supabase storage, serving the files in download/
+    /v1/audio/transcriptions OpenAI Whisper
+    /v1/chat/completions     OpenAI chat (single and batched grading)
+    /v1/users                Clerk Backend API
+    /v3/mail/send            SendGrid
+    /api/chat                Ollama chat (grading)
+
+Each service waits its configured latency before answering, to mimic the
+round trip to the real API.
+
+    python benchmarks/fake_services.py --port 8700 --openai-latency 0.8
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import argparse
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_AUDIO_DIR = os.path.join(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))), "download")
+
+
+def fake_score(text):
+    """A stable 0-5 score for a text, so repeated runs grade identically."""
+    return int(hashlib.sha256(text.encode()).hexdigest(), 16) % 6
+
+
+class FakeServices:
+    """
+    Fake Supabase storage, OpenAI, Clerk, SendGrid and Ollama endpoints.
+
+    Args:
+        audio_dir (str): Folder whose files are served by storage downloads.
+        latency (dict): Seconds of delay per service: "storage", "openai",
+                        "clerk", "sendgrid" and "ollama".
+    """
+
+    def __init__(self, audio_dir=DEFAULT_AUDIO_DIR, latency=None):
+        self.audio_dir = audio_dir
+        self.latency = {"storage": 0.0, "openai": 0.0, "clerk": 0.0,
+                        "sendgrid": 0.0, "ollama": 0.0, **(latency or {})}
+        self.requests = {}
+        self._prefixes = set()
+        self._lock = threading.Lock()
+
+    def count(self, service):
+        with self._lock:
+            self.requests[service] = self.requests.get(service, 0) + 1
+
+    def handler(self):
+        services = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def do_DELETE(self):
+                self._dispatch("DELETE")
+
+            def _dispatch(self, method):
+                url = urlparse(self.path)
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                path = url.path
+
+                if path.startswith("/storage/v1/object/"):
+                    service, reply = "storage", services.storage(method, path, body)
+                elif path.startswith("/v1/audio/") or path.startswith("/v1/chat/"):
+                    service, reply = "openai", services.openai(path, body)
+                elif path.startswith("/v1/users"):
+                    service, reply = "clerk", services.clerk(path, parse_qs(url.query))
+                elif path == "/v3/mail/send":
+                    service, reply = "sendgrid", services.sendgrid(body)
+                elif path == "/api/chat":
+                    service, reply = "ollama", services.ollama(body)
+                else:
+                    service, reply = None, (404, {"error": "Not found"})
+
+                if service:
+                    services.count(service)
+                    time.sleep(services.latency[service])
+                self._reply(*reply)
+
+            def _reply(self, status, body=None):
+                if isinstance(body, bytes):
+                    data, content_type = body, "application/octet-stream"
+                else:
+                    data = json.dumps(body).encode() if body is not None else b""
+                    content_type = "application/json"
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def storage(self, method, path, body):
+        if method == "GET":
+            # /storage/v1/object/<bucket>/<prefix>/<file>
+            file_path = os.path.join(self.audio_dir, os.path.basename(path))
+            try:
+                with open(file_path, "rb") as f:
+                    return 200, f.read()
+            except FileNotFoundError:
+                return 404, {"error": "not_found", "message": "Object not found"}
+        if method == "DELETE":
+            prefixes = json.loads(body or b"{}").get("prefixes", [])
+            return 200, [{"name": prefix} for prefix in prefixes]
+        return 405, {"error": "Method not allowed"}
+
+    def openai(self, path, body):
+        if path.endswith("/audio/transcriptions"):
+            # Multipart upload; the file name is enough for a stable transcript
+            match = re.search(rb'filename="([^"]+)"', body)
+            name = match.group(1).decode() if match else "answer"
+            return 200, {"text": f"benchmark transcript of {name}"}
+
+        request = json.loads(body)
+        prompt = request["messages"][-1]["content"]
+        response_format = (request.get("response_format") or {}).get("type")
+        if response_format == "json_object":
+            count = int(re.search(r"Evaluate these (\d+)", prompt).group(1))
+            content = json.dumps({"scores": [fake_score(prompt + str(n)) for n in range(count)]})
+        elif response_format == "json_schema":
+            content = json.dumps({"score": fake_score(prompt)})
+        else:
+            content = str(fake_score(prompt))
+        prompt_tokens = sum(len(m["content"]) for m in request["messages"]) // 4
+        return 200, {
+            "id": "chatcmpl-benchmark",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": 3,
+                      "total_tokens": prompt_tokens + 3,
+                      "prompt_tokens_details": {"cached_tokens": self.cached_tokens(request)}},
+        }
+
+    def cached_tokens(self, request):
+        """
+        Mimic OpenAI's automatic prompt caching: a system prefix seen before
+        is served from cache, in 128-token steps, once it is 1024 tokens long.
+        """
+        messages = request["messages"]
+        if messages[0]["role"] != "system":
+            return 0
+        prefix = messages[0]["content"]
+        tokens = len(prefix) // 4
+        with self._lock:
+            seen = prefix in self._prefixes
+            self._prefixes.add(prefix)
+        if not seen or tokens < 1024:
+            return 0
+        return tokens // 128 * 128
+
+    def clerk(self, path, query):
+        def user(user_id):
+            return {
+                "id": user_id,
+                "primary_email_address_id": f"idn_{user_id}",
+                "email_addresses": [{"id": f"idn_{user_id}",
+                                     "email_address": f"{user_id}@benchmark.invalid"}],
+            }
+
+        if path.rstrip("/") == "/v1/users":
+            return 200, [user(user_id) for user_id in query.get("user_id", [])]
+        return 200, user(path.rsplit("/", 1)[-1])
+
+    def sendgrid(self, body):
+        personalizations = json.loads(body).get("personalizations", [])
+        if not 1 <= len(personalizations) <= 1000:
+            return 400, {"errors": [{"message": "Bad personalizations"}]}
+        return 202, None
+
+    def ollama(self, body):
+        request = json.loads(body)
+        prompt = request["messages"][-1]["content"]
+        score = fake_score(prompt)
+        # A JSON schema in format asks for {"score": n}
+        content = json.dumps({"score": score}) if isinstance(request.get("format"), dict) else str(score)
+        return 200, {
+            "model": request.get("model"),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "message": {"role": "assistant", "content": content},
+            "done": True,
+            "done_reason": "stop",
+            "prompt_eval_count": sum(len(m["content"]) for m in request["messages"]) // 4,
+            "eval_count": 3,
+        }
+
+    def serve(self, port):
+        """Start serving on a background thread. Returns the server."""
+        server = ThreadingHTTPServer(("127.0.0.1", port), self.handler())
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--port", type=int, default=8700)
+    parser.add_argument("--audio-dir", default=DEFAULT_AUDIO_DIR)
+    for service in ("storage", "openai", "clerk", "sendgrid", "ollama"):
+        parser.add_argument(f"--{service}-latency", type=float, default=0.0,
+                            help=f"Seconds before each {service} reply")
+    args = parser.parse_args()
+
+    services = FakeServices(args.audio_dir, {
+        service: getattr(args, f"{service}_latency")
+        for service in ("storage", "openai", "clerk", "sendgrid", "ollama")})
+    server = services.serve(args.port)
+    print(f"[+] Fake services listening on http://127.0.0.1:{args.port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,189 @@
+"""
+Offline end-to-end benchmark of the grading jobs. Seeds a local database
+from download/, starts the fake services with the given latencies, runs
+grade_tests.py, finalise_grading.py and email_outbox.py against them and
+appends answers/sec, per-stage timings and peak RSS to
+benchmarks/results.jsonl together with the commit they were measured on.
+
+    python benchmarks/run.py --concurrency 8 --openai-latency 0.8
+    python benchmarks/run.py --database-url postgresql://localhost/grading_bench --env GRADING_BATCH=1
+    python benchmarks/run.py --openai-latency 2 --ollama-latency 0.5 --env GRADING_BACKENDS=openai,ollama
+
+Seeding drops every table in the database. A --database-url whose name
+doesn't contain "bench" is refused unless --recreate is passed.
+"""
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+
+from sqlalchemy import create_engine, select, func
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+from models.schema import MockAnswers, UserMocks, EmailOutbox  # noqa: E402
+from benchmarks.fake_services import FakeServices, DEFAULT_AUDIO_DIR  # noqa: E402
+from benchmarks.seed import seed, check_disposable, AUDIO_PREFIX  # noqa: E402
+
+RESULTS_PATH = os.path.join(REPO, "benchmarks", "results.jsonl")
+JOBS = ["grade_tests", "finalise_grading", "email_outbox"]
+# Stand-in credentials; create_client() only checks the key looks like a JWT
+FAKE_JWT = "benchmark.benchmark.benchmark"
+
+
+def git_commit():
+    """Return (commit hash, whether the tree has uncommitted changes)."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                    cwd=REPO, capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def run_job(job, env, workdir):
+    """Run one job script to completion. Returns its wall time, peak RSS and exit code."""
+    with open(os.path.join(workdir, f"{job}.log"), "w") as log:
+        started = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, f"{job}.py"], cwd=REPO, env=env,
+                                stdout=log, stderr=subprocess.STDOUT)
+        _, status, usage = os.wait4(proc.pid, 0)
+        elapsed = time.perf_counter() - started
+    proc.returncode = os.waitstatus_to_exitcode(status)
+
+    return {
+        "seconds": round(elapsed, 3),
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": round(usage.ru_maxrss / 1024, 1),
+        "exit_code": proc.returncode,
+    }
+
+
+def job_stages(metrics_dir, job):
+    """Per-stage timings from the job's metrics JSON summary."""
+    paths = sorted(glob.glob(os.path.join(metrics_dir, f"{job}-*.json")))
+    if not paths:
+        return {}
+    with open(paths[-1]) as f:
+        summary = json.load(f)
+    return {
+        h["labels"]["stage"]: {k: h[k] for k in ("count", "sum", "p50", "p95", "p99")}
+        for h in summary["histograms"] if h["name"] == "stage_seconds"
+    }
+
+
+def count_rows(database_url):
+    engine = create_engine(database_url)
+    with engine.connect() as conn:
+        counts = {
+            "graded": conn.execute(select(func.count()).where(MockAnswers.score.is_not(None))).scalar(),
+            "finalised": conn.execute(select(func.count()).where(UserMocks.attempts > 0)).scalar(),
+            "emails_sent": conn.execute(select(func.count()).where(EmailOutbox.status == "sent")).scalar(),
+        }
+    engine.dispose()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--database-url", help="Defaults to a fresh SQLite file; its tables are dropped")
+    parser.add_argument("--recreate", action="store_true",
+                        help="Drop the --database-url tables even if its name doesn't contain 'bench'")
+    parser.add_argument("--audio-dir", default=DEFAULT_AUDIO_DIR)
+    parser.add_argument("--limit", type=int, help="Grade only this many recordings")
+    parser.add_argument("--concurrency", type=int, default=1, help="GRADING_CONCURRENCY")
+    parser.add_argument("--port", type=int, default=8700)
+    for service, default in (("storage", 0.05), ("openai", 0.5), ("clerk", 0.1),
+                             ("sendgrid", 0.2), ("ollama", 1.0)):
+        parser.add_argument(f"--{service}-latency", type=float, default=default,
+                            help=f"Seconds before each fake {service} reply (default {default})")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Extra environment for the jobs, e.g. GRADING_BATCH=1")
+    parser.add_argument("--label", help="Free-form note stored with the result")
+    parser.add_argument("--results", default=RESULTS_PATH)
+    args = parser.parse_args()
+    if args.database_url:
+        try:
+            check_disposable(args.database_url, args.recreate)
+        except ValueError as ex:
+            parser.error(str(ex))
+
+    workdir = tempfile.mkdtemp(prefix="grading-benchmark-")
+    database_url = args.database_url or f"sqlite:///{os.path.join(workdir, 'benchmark.sqlite3')}"
+    answers = seed(database_url, args.audio_dir, args.limit, recreate=args.recreate)
+    print(f"[+] Seeded {answers} answers, working in {workdir}")
+
+    latency = {service: getattr(args, f"{service}_latency")
+               for service in ("storage", "openai", "clerk", "sendgrid", "ollama")}
+    services = FakeServices(args.audio_dir, latency)
+    server = services.serve(args.port)
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    extra_env = dict(item.split("=", 1) for item in args.env)
+    env = {
+        **os.environ,
+        "POSTGRES_URL": database_url,
+        "SUPABASE_URL": base_url,
+        "SUPABASE_KEY": FAKE_JWT,
+        "SUPABASE_BUCKET": "answers",
+        "SUPABASE_PREFIX": AUDIO_PREFIX,
+        "OPENAI_API_KEY": "sk-benchmark",
+        "OPENAI_BASE_URL": f"{base_url}/v1",
+        "CLERK_SECRET_KEY": "sk_benchmark",
+        "CLERK_API_URL": base_url,
+        "SENDGRID_API_KEY": "SG.benchmark",
+        "SENDGRID_API_URL": base_url,
+        "OLLAMA_HOST": base_url,
+        "TRANSCRIBE_ENGINE": "openai",
+        "GRADING_CONCURRENCY": str(args.concurrency),
+        "DOWNLOADS_FOLDER": os.path.join(workdir, "downloads"),
+        "CACHE_PATH": os.path.join(workdir, "cache.sqlite3"),
+        "DELETE_JOURNAL_PATH": os.path.join(workdir, "pending_deletes.json"),
+        "METRICS": "1",
+        "METRICS_DIR": os.path.join(workdir, "metrics"),
+        **extra_env,
+    }
+
+    jobs = {}
+    try:
+        for job in JOBS:
+            jobs[job] = run_job(job, env, workdir)
+            print(f"[+] {job}: {jobs[job]}")
+    finally:
+        server.shutdown()
+
+    counts = count_rows(database_url)
+    grade_seconds = jobs["grade_tests"]["seconds"]
+    commit, dirty = git_commit()
+    result = {
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "commit": commit,
+        "dirty": dirty,
+        "label": args.label,
+        "config": {"answers": answers, "concurrency": args.concurrency,
+                   "latency": latency, "env": extra_env,
+                   "database": database_url.split(":", 1)[0]},
+        **counts,
+        "answers_per_second": round(counts["graded"] / grade_seconds, 3) if grade_seconds else None,
+        "jobs": jobs,
+        "stages": {job: job_stages(env["METRICS_DIR"], job) for job in JOBS},
+        "requests": services.requests,
+    }
+
+    with open(args.results, "a") as f:
+        f.write(json.dumps(result) + "\n")
+    print(
+        f"[+] {counts['graded']}/{answers} answers graded in {grade_seconds:.1f}s "
+        f"({result['answers_per_second']} answers/s), results appended to {args.results}")
+
+
+if __name__ == "__main__":
+    main()
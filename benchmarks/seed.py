@@ -0,0 +1,121 @@
+"""
+Seed a local database with a grading backlog built from the webm recordings
+in download/: one mock per language, user mocks of QUESTIONS_PER_MOCK
+answers, and a subscription per user so every answer is gradable.
+
+    python benchmarks/seed.py sqlite:///.cache/benchmark.sqlite3
+
+Every table in the database is dropped and recreated first. Unless the
+database name contains "bench", --recreate must be passed to confirm it.
+"""
+import os
+import sys
+import argparse
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.schema import Base, Mocks, MockQuestions, MockAnswers, UserMocks, Subscriptions  # noqa: E402
+from benchmarks.fake_services import DEFAULT_AUDIO_DIR  # noqa: E402
+
+QUESTIONS_PER_MOCK = 5
+LANGUAGES = ["Hindi", "Punjabi", "Nepali", "Urdu"]
+# Storage prefix of the seeded audio, matching SUPABASE_PREFIX in the run
+AUDIO_PREFIX = "benchmark"
+
+
+def check_disposable(database_url, recreate=False):
+    """
+    Refuse to seed a database that doesn't look like a benchmark one, since
+    seeding drops every table in it.
+
+    Raises:
+        ValueError: Unless `recreate` is set or the database name contains "bench".
+    """
+    name = os.path.basename(make_url(database_url).database or "")
+    if not recreate and "bench" not in name.lower():
+        raise ValueError(
+            f"[-] Seeding drops every table in {name or database_url!r}; pass --recreate "
+            f"to confirm, or use a database whose name contains 'bench'.")
+
+
+def seed(database_url, audio_dir=DEFAULT_AUDIO_DIR, limit=None, questions_per_mock=QUESTIONS_PER_MOCK,
+         recreate=False):
+    """
+    Drop and recreate the schema and insert one pending answer per audio file.
+
+    Args:
+        database_url (str): SQLAlchemy URL of the database to (re)create.
+        audio_dir (str): Folder of answer recordings.
+        limit (int, optional): Use only the first `limit` recordings.
+        questions_per_mock (int): Questions per mock, and answers per user mock.
+        recreate (bool): Drop the tables even if the database name doesn't
+                         contain "bench".
+
+    Returns:
+        int: The number of answers seeded.
+
+    Raises:
+        ValueError: If the database doesn't look disposable, see check_disposable.
+    """
+    check_disposable(database_url, recreate)
+    files = sorted(name for name in os.listdir(audio_dir) if name.endswith(".webm"))
+    if limit:
+        files = files[:limit]
+
+    engine = create_engine(database_url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+
+    for language in LANGUAGES:
+        mock_id = f"mock-{language.lower()}"
+        session.add(Mocks(id=mock_id, name=f"{language} benchmark", description="Benchmark mock",
+                          time_duration=20, no_of_qa=questions_per_mock, language="English"))
+        for n in range(questions_per_mock):
+            session.add(MockQuestions(
+                id=f"{mock_id}-q{n}", mock_id=mock_id, audio_file_url=f"questions/{mock_id}-q{n}.mp3",
+                order=n + 1, language="English", answer_language=language,
+                transcript=f"Reference translation {n} of the {language} benchmark mock."))
+    session.flush()
+
+    started = datetime.utcnow() - timedelta(hours=1)
+    for start in range(0, len(files), questions_per_mock):
+        number = start // questions_per_mock
+        mock_id = f"mock-{LANGUAGES[number % len(LANGUAGES)].lower()}"
+        user_id = f"user_{number:04d}"
+        user_mock_id = f"um-{number:04d}"
+        session.add(Subscriptions(id=f"sub-{number:04d}", user_id=user_id, mocks_available=10,
+                                  mocks_used=1, payment_required=False, created_on=started))
+        session.add(UserMocks(id=user_mock_id, mock_id=mock_id, user_id=user_id,
+                              attempts=0, created_on=started))
+        for n, name in enumerate(files[start:start + questions_per_mock]):
+            session.add(MockAnswers(
+                id=f"ans-{start + n:05d}", mock_question_id=f"{mock_id}-q{n}", user_mock_id=user_mock_id,
+                user_id=user_id, audio_file_url=f"{AUDIO_PREFIX}/{name}", mock_id=mock_id,
+                created_on=started + timedelta(seconds=start + n)))
+
+    session.commit()
+    session.close()
+    engine.dispose()
+    return len(files)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("database_url")
+    parser.add_argument("--audio-dir", default=DEFAULT_AUDIO_DIR)
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--recreate", action="store_true",
+                        help="Drop the tables even if the database name doesn't contain 'bench'")
+    args = parser.parse_args()
+
+    try:
+        count = seed(args.database_url, args.audio_dir, args.limit, recreate=args.recreate)
+    except ValueError as ex:
+        parser.error(str(ex))
+    print(f"[+] Seeded {count} answers into {args.database_url}")
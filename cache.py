@@ -0,0 +1,233 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+
+from dotenv import load_dotenv
+
+from metrics import metrics
+
+load_dotenv()
+
+# SQLite file shared by the local caches, one table per cache
+CACHE_PATH = os.getenv("CACHE_PATH") or ".cache/grading.sqlite3"
+TRANSCRIPT_CACHE_MAX_ENTRIES = int(
+    os.getenv("TRANSCRIPT_CACHE_MAX_ENTRIES") or "20000")
+TRANSCRIPT_CACHE_MAX_AGE_DAYS = float(
+    os.getenv("TRANSCRIPT_CACHE_MAX_AGE_DAYS") or "30")
+GRADING_CACHE_MAX_ENTRIES = int(
+    os.getenv("GRADING_CACHE_MAX_ENTRIES") or "50000")
+GRADING_CACHE_MAX_AGE_DAYS = float(
+    os.getenv("GRADING_CACHE_MAX_AGE_DAYS") or "90")
+
+# How many writes happen between two eviction passes
+EVICT_EVERY = 100
+
+
+class SqliteCache:
+    """
+    A small persistent key/value cache stored in one SQLite table, with
+    age-based expiry and least-recently-used eviction. Safe to share between
+    threads; several processes may also use the same file.
+
+    Args:
+        table (str): Name of the table holding this cache.
+        path (str): SQLite database file.
+        max_entries (int): Entries kept before the least recently used are
+                           evicted. 0 disables the cache.
+        max_age (float): Seconds an entry stays valid after it is written.
+    """
+
+    def __init__(self, table, path=CACHE_PATH, max_entries=10000, max_age=None):
+        self.table = table
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+        if self.enabled:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._conn = sqlite3.connect(
+                path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_on REAL NOT NULL, last_used REAL NOT NULL)")
+            self._conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {table}_last_used ON {table} (last_used)")
+            self._conn.commit()
+            self.evict()
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    @staticmethod
+    def make_key(*parts):
+        """Build a cache key by hashing the given parts together."""
+        digest = hashlib.sha256()
+        for part in parts:
+            if not isinstance(part, bytes):
+                part = str(part).encode("utf-8")
+            # Length prefix so ("ab", "c") and ("a", "bc") don't collide
+            digest.update(len(part).to_bytes(8, "big"))
+            digest.update(part)
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Return the cached value for `key`, or None on a miss."""
+        return self.get_any([key])
+
+    def get_any(self, keys):
+        """
+        Return the value of the first of `keys` that is cached, or None if
+        none is. Counts as a single lookup in the hit/miss statistics.
+        """
+        if not self.enabled:
+            return None
+
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                row = self._conn.execute(
+                    f"SELECT value, created_on FROM {self.table} WHERE key = ?", (key,)).fetchone()
+                if row is None or (self.max_age and row[1] < now - self.max_age):
+                    continue
+
+                self._conn.execute(
+                    f"UPDATE {self.table} SET last_used = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+                self.hits += 1
+                metrics.inc("cache_lookups_total", cache=self.table, result="hit")
+                return row[0]
+
+            self.misses += 1
+            metrics.inc("cache_lookups_total", cache=self.table, result="miss")
+            return None
+
+    def put(self, key, value):
+        """Store `value` under `key`, replacing any previous entry."""
+        if not self.enabled:
+            return
+
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created_on, last_used) "
+                "VALUES (?, ?, ?, ?)", (key, value, now, now))
+            self._conn.commit()
+            self._writes += 1
+            due = self._writes % EVICT_EVERY == 0
+        if due:
+            self.evict()
+
+    def evict(self):
+        """Drop expired entries, then the least recently used above the cap."""
+        if not self.enabled:
+            return
+
+        with self._lock:
+            if self.max_age:
+                self._conn.execute(
+                    f"DELETE FROM {self.table} WHERE created_on < ?", (time.time() - self.max_age,))
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN ("
+                f"SELECT key FROM {self.table} ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,))
+            self._conn.commit()
+
+    def stats(self):
+        """Return hit/miss counters and the hit rate for this process."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+    def close(self):
+        if self._conn is not None:
+            self.evict()
+            self._conn.close()
+            self._conn = None
+
+
+class TranscriptCache(SqliteCache):
+    """
+    Transcripts keyed by the SHA-256 of the audio bytes, the answer language
+    and the transcription engine/model, so a recording is never paid for twice.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_entries=TRANSCRIPT_CACHE_MAX_ENTRIES,
+                 max_age_days=TRANSCRIPT_CACHE_MAX_AGE_DAYS):
+        super().__init__("transcripts", path, max_entries,
+                         max_age_days * 86400 if max_age_days else None)
+
+    def get_or_transcribe(self, audio, language, engine, transcribe_fn):
+        """
+        Return the cached transcript for this audio, or call `transcribe_fn()`
+        and cache its result.
+
+        Args:
+            audio (bytes): The raw audio file contents.
+            language (str): The answer language.
+            engine (str): Engine and model, e.g. "openai:whisper-1".
+            transcribe_fn (callable): Produces the transcript on a miss.
+
+        Returns:
+            str: The transcribed text.
+        """
+        transcript = self.get_transcript(audio, language, engine)
+        if transcript is not None:
+            return transcript
+
+        transcript = transcribe_fn()
+        self.put_transcript(audio, language, engine, transcript)
+        return transcript
+
+    def transcript_key(self, audio, language, engine):
+        return self.make_key(hashlib.sha256(audio).digest(), language.lower(), engine)
+
+    def get_transcript(self, audio, language, engine):
+        """The cached transcript for this audio, or None."""
+        transcript = self.get(self.transcript_key(audio, language, engine))
+        if transcript is not None:
+            print(f"-> Transcript cache hit ({engine}, {language})")
+        return transcript
+
+    def put_transcript(self, audio, language, engine, transcript):
+        self.put(self.transcript_key(audio, language, engine), transcript)
+
+
+def normalize_text(text):
+    """
+    Normalize a text for cache keys: Unicode NFC and collapsed whitespace.
+    Case and punctuation are kept since the rubric can score them.
+    """
+    return " ".join(unicodedata.normalize("NFC", text or "").split())
+
+
+class GradingCache(SqliteCache):
+    """
+    LLM grading replies keyed by the normalized reference and answer, the
+    language, the prompt version and the model. Because the prompt version is
+    a hash of the prompt text, editing a prompt invalidates its old entries.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_entries=GRADING_CACHE_MAX_ENTRIES,
+                 max_age_days=GRADING_CACHE_MAX_AGE_DAYS):
+        super().__init__("gradings", path, max_entries,
+                         max_age_days * 86400 if max_age_days else None)
+
+    def grading_key(self, reference, answer, language, prompt_version, model):
+        """Cache key of one graded answer."""
+        return self.make_key(normalize_text(reference), normalize_text(answer),
+                             language.lower(), prompt_version, model)
@@ -0,0 +1,97 @@
+import os
+import threading
+
+import httpx
+from dotenv import load_dotenv
+from ollama import Client
+from openai import OpenAI, DefaultHttpxClient
+from supabase import create_client, ClientOptions
+
+load_dotenv()
+
+# Connections kept open per client, shared by all worker threads
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE") or "20")
+# Read timeout in seconds for API calls (audio uploads and LLM replies)
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT") or "120")
+HTTP_CONNECT_TIMEOUT = 10.0
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def _limits():
+    return httpx.Limits(max_connections=HTTP_POOL_SIZE,
+                        max_keepalive_connections=HTTP_POOL_SIZE)
+
+
+def _timeout():
+    return httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+
+
+def _get_or_create(key, factory):
+    """Return the client registered under `key`, building it once if needed."""
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = factory()
+                _clients[key] = client
+    return client
+
+
+def get_openai_client(api_key):
+    """
+    Return the process-wide OpenAI client for this API key, backed by a
+    keep-alive HTTP/2 connection pool.
+    """
+    return _get_or_create(("openai", api_key), lambda: OpenAI(
+        api_key=api_key,
+        timeout=_timeout(),
+        http_client=DefaultHttpxClient(http2=True, limits=_limits()),
+    ))
+
+
+def get_supabase_client(supabase_url, supabase_key):
+    """
+    Return the process-wide Supabase client for this project. Its storage
+    client keeps its own pooled HTTP/2 connection.
+    """
+    def build():
+        client = create_client(supabase_url, supabase_key, options=ClientOptions(
+            storage_client_timeout=HTTP_TIMEOUT))
+        # Create the lazily built storage client now, while holding the lock
+        client.storage
+        return client
+
+    return _get_or_create(("supabase", supabase_url, supabase_key), build)
+
+
+def get_ollama_client(host):
+    """Return the process-wide Ollama client for this host."""
+    return _get_or_create(("ollama", host), lambda: Client(
+        host=host, timeout=_timeout(), limits=_limits()))
+
+
+def get_http_client():
+    """
+    Return the shared HTTP client used for plain REST APIs (Clerk, SendGrid,
+    Postmark). httpx clients are safe to use from several threads.
+    """
+    return _get_or_create("http", lambda: httpx.Client(
+        http2=True, timeout=_timeout(), limits=_limits()))
+
+
+def close_clients():
+    """Close every registered client and its connection pool."""
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+
+    for client in clients:
+        if isinstance(client, httpx.Client):
+            client.close()
+        elif isinstance(client, OpenAI):
+            client.close()
+        elif isinstance(client, Client):
+            client._client.close()
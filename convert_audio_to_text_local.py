@@ -1,28 +1,49 @@
-import whisper
-import torch
+import sys
+import time
+from whisper_pool import WhisperPool, WHISPER_BATCH_SIZE
 
 
-def transcribe(audio_file, language):
+def transcribe(pool, audio_file, language):
     """
-    Transcribes the given audio data using the Whisper speech recognition model.
+    Transcribes the given audio file on the local Whisper worker pool.
 
     Args:
-        audio_np: The audio data to be transcribed.
+        pool (WhisperPool): Pool of workers with the model already loaded.
+        audio_file (str): Path to the audio file to be transcribed.
+        language (str): Whisper language code, e.g. "en".
 
     Returns:
         str: The transcribed text.
     """
-    # Load Whisper Model
-    model = whisper.load_model("small")  # or base
-    torch.cuda.empty_cache()
-    # stt = whisper.load_model("small")  # or base
-    # Set fp16=True if using a GPU
-    # audio = model.load_audio(audio_file)
-    result = model.transcribe(audio_file, fp16=True, language=language)
-    return result
+    return pool.transcribe(audio_file, language)
 
 
-file_name = '/home/gojira/Desktop/oberoi.io/naati/data/data/thyroid_test.ogg'
-transcription = transcribe(file_name, 'en')
+if __name__ == "__main__":
+    # Usage: python convert_audio_to_text_local.py <language> <file> [<file> ...]
+    if len(sys.argv) > 2:
+        language, file_names = sys.argv[1], sys.argv[2:]
+    else:
+        language = 'en'
+        file_names = [
+            '/home/gojira/Desktop/oberoi.io/naati/data/data/thyroid_test.ogg']
 
-print(transcription)
+    pool = WhisperPool()
+    try:
+        if WHISPER_BATCH_SIZE > 1:
+            started = time.monotonic()
+            audio_seconds = 0.0
+            for start in range(0, len(file_names), WHISPER_BATCH_SIZE):
+                texts, seconds = pool.transcribe_batch(
+                    file_names[start:start + WHISPER_BATCH_SIZE], language)
+                audio_seconds += seconds
+                for transcription in texts:
+                    print(transcription)
+            elapsed = time.monotonic() - started
+            print(
+                f"[+] {audio_seconds:.0f}s of audio in {elapsed:.1f}s, {audio_seconds / elapsed:.2f} audio-seconds per second")
+        else:
+            for file_name in file_names:
+                transcription = transcribe(pool, file_name, language)
+                print(transcription)
+    finally:
+        pool.close()
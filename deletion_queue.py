@@ -0,0 +1,143 @@
+import os
+import json
+import fcntl
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+from helpers import delete_supabase_files
+from metrics import metrics
+
+load_dotenv()
+
+# Paths sent per Supabase storage remove() call
+STORAGE_DELETE_CHUNK = int(os.getenv("STORAGE_DELETE_CHUNK") or "100")
+# Paths that failed to delete, retried on the next run
+DELETE_JOURNAL_PATH = os.getenv(
+    "DELETE_JOURNAL_PATH") or ".cache/pending_deletes.json"
+# Runs a path is retried before it is given up on
+DELETE_MAX_ATTEMPTS = 5
+
+
+class StorageDeletionQueue:
+    """
+    Collects the storage paths of persisted answers and deletes them in
+    chunked remove() calls at the end of the run. Paths that fail are written
+    to a journal and retried by the next run's flush. Safe to add to from
+    several threads.
+
+    Args:
+        bucket_name (str): The Supabase storage bucket.
+        supabase_url (str): The Supabase project URL.
+        supabase_key (str): The Supabase project API key.
+        journal_path (str): JSON file holding paths left for the next run.
+        chunk_size (int): Paths per remove() call.
+    """
+
+    def __init__(self, bucket_name, supabase_url, supabase_key,
+                 journal_path=DELETE_JOURNAL_PATH, chunk_size=STORAGE_DELETE_CHUNK):
+        self.bucket_name = bucket_name
+        self.supabase_url = supabase_url
+        self.supabase_key = supabase_key
+        self.journal_path = journal_path
+        self.chunk_size = chunk_size
+        self._paths = []
+        self._lock = threading.Lock()
+
+    def add(self, path):
+        """Queue a file path within the bucket for deletion."""
+        with self._lock:
+            self._paths.append(path.lstrip("/"))
+
+    @contextmanager
+    def _journal_lock(self):
+        """Hold an exclusive lock on the journal, shared with other processes."""
+        if os.path.dirname(self.journal_path):
+            os.makedirs(os.path.dirname(self.journal_path), exist_ok=True)
+        with open(f"{self.journal_path}.lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _load_journal(self):
+        try:
+            with open(self.journal_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"[-] Error reading deletion journal {self.journal_path}: {e}")
+            return {}
+
+    def _save_journal(self, attempts):
+        directory, name = os.path.split(self.journal_path)
+        fd, tmp_path = tempfile.mkstemp(prefix=f"{name}.", suffix=".tmp", dir=directory or ".")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(attempts, f)
+            os.replace(tmp_path, self.journal_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def flush(self):
+        """
+        Delete the queued paths plus those left over from earlier runs.
+
+        Returns:
+            tuple: (deleted, failed) path counts.
+        """
+        with self._lock:
+            queued, self._paths = self._paths, []
+
+        # Failed attempts so far, per path. The journal is only locked while
+        # it is read and written, not during the deletes, so workers sharing
+        # it never wait on each other's storage calls.
+        try:
+            with self._journal_lock():
+                attempts = self._load_journal()
+        except OSError as e:
+            print(f"[-] Error locking deletion journal {self.journal_path}: {e}")
+            attempts = {}
+        for path in queued:
+            attempts.setdefault(path, 0)
+        if not attempts:
+            return 0, 0
+
+        paths = list(attempts)
+        with metrics.timer("storage_delete"):
+            deleted = delete_supabase_files(
+                paths, self.bucket_name, self.supabase_url, self.supabase_key, self.chunk_size)
+        metrics.inc("storage_files_deleted_total", len(deleted))
+
+        retry = {}
+        for path in paths:
+            if path in deleted:
+                continue
+            if attempts[path] + 1 >= DELETE_MAX_ATTEMPTS:
+                print(
+                    f"[-] Giving up deleting '{path}' after {DELETE_MAX_ATTEMPTS} attempts.")
+                continue
+            retry[path] = attempts[path] + 1
+
+        try:
+            with self._journal_lock():
+                # Keep what other runs added meanwhile, minus the paths handled here
+                journal = self._load_journal()
+                for path in paths:
+                    journal.pop(path, None)
+                journal.update(retry)
+                self._save_journal(journal)
+        except OSError as e:
+            print(f"[-] Error writing deletion journal {self.journal_path}: {e}")
+
+        failed = len(paths) - len(deleted)
+        if failed:
+            metrics.inc("errors_total", failed, stage="storage_delete")
+        print(
+            f"[+] Deleted {len(deleted)}/{len(paths)} files from storage, {len(retry)} kept for retry.")
+        return len(deleted), failed
@@ -0,0 +1,156 @@
+import os
+import time
+import threading
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Caps on the audio kept in DOWNLOADS_FOLDER
+DOWNLOAD_CACHE_MAX_BYTES = int(
+    os.getenv("DOWNLOAD_CACHE_MAX_BYTES") or str(500 * 1024 * 1024))
+DOWNLOAD_CACHE_MAX_FILES = int(os.getenv("DOWNLOAD_CACHE_MAX_FILES") or "1000")
+
+# Suffix of files still being written
+TMP_SUFFIX = ".part"
+# Age in seconds after which another process's unfinished write counts as
+# abandoned; younger ones may still be in progress in a concurrent worker
+DOWNLOAD_TMP_MAX_AGE_SECONDS = float(
+    os.getenv("DOWNLOAD_TMP_MAX_AGE_SECONDS") or "3600")
+
+
+class DownloadCache:
+    """
+    Manages the download folder as a size-capped cache of answer audio.
+
+    Files are evicted least recently used first once the folder holds more
+    than `max_bytes` or `max_files`, and removed as soon as their answer is
+    committed. Reading a file marks it as used. Safe to use from several
+    threads. A cache without a folder does nothing.
+
+    Args:
+        folder (str): The download folder, or None to disable the cache.
+        max_bytes (int): Total size kept before evicting.
+        max_files (int): Number of files kept before evicting.
+    """
+
+    def __init__(self, folder, max_bytes=DOWNLOAD_CACHE_MAX_BYTES, max_files=DOWNLOAD_CACHE_MAX_FILES):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.reused = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+    def path(self, file_name):
+        return os.path.join(self.folder, os.path.basename(file_name))
+
+    def get(self, file_name):
+        """Return the cached bytes of `file_name`, or None if not cached."""
+        if not self.folder:
+            return None
+
+        path = self.path(file_name)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            # Mark as recently used for LRU eviction
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+
+        self.reused += 1
+        return data
+
+    def put(self, file_name, data):
+        """Store `data` as `file_name` and evict down to the caps."""
+        if not self.folder:
+            return None
+
+        path = self.path(file_name)
+        tmp_path = f"{path}.{os.getpid()}-{threading.get_ident()}{TMP_SUFFIX}"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self.evict(keep=path)
+        return path
+
+    def discard(self, file_name):
+        """Remove `file_name`, e.g. once its answer is committed."""
+        if not self.folder:
+            return
+
+        try:
+            os.remove(self.path(file_name))
+        except FileNotFoundError:
+            pass
+
+    def _entries(self):
+        entries = []
+        with os.scandir(self.folder) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.endswith(TMP_SUFFIX):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self, keep=None):
+        """Delete least recently used files until the folder is within the caps."""
+        if not self.folder:
+            return
+
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            count = len(entries)
+            for _, size, path in entries:
+                if total <= self.max_bytes and count <= self.max_files:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.remove(path)
+                    self.evicted += 1
+                except FileNotFoundError:
+                    pass
+                total -= size
+                count -= 1
+
+    def cleanup(self, pending_file_names):
+        """
+        Startup pass: remove files that don't belong to a pending answer and
+        leftovers of interrupted writes, then evict down to the caps. Another
+        process's unfinished write is only removed once it is older than
+        DOWNLOAD_TMP_MAX_AGE_SECONDS, as it may still be in progress.
+
+        Args:
+            pending_file_names (set): File names of answers still to grade.
+        """
+        if not self.folder:
+            return
+
+        removed = 0
+        own_tmp = f".{os.getpid()}-"
+        abandoned_before = time.time() - DOWNLOAD_TMP_MAX_AGE_SECONDS
+        with os.scandir(self.folder) as it:
+            for entry in it:
+                if not entry.is_file():
+                    continue
+                if entry.name.endswith(TMP_SUFFIX):
+                    stale = own_tmp in entry.name or entry.stat().st_mtime < abandoned_before
+                else:
+                    stale = entry.name not in pending_file_names
+                if stale:
+                    try:
+                        os.remove(entry.path)
+                        removed += 1
+                    except FileNotFoundError:
+                        pass
+
+        self.evict()
+        print(f"[+] Removed {removed} orphaned files from {self.folder}")
+
+    def stats(self):
+        return {"reused": self.reused, "evicted": self.evicted}
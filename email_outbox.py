@@ -0,0 +1,210 @@
+import os
+import time
+from datetime import datetime, timedelta
+
+import httpx
+from dotenv import load_dotenv
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from sqlalchemy import create_engine, select, or_
+from sqlalchemy.orm import sessionmaker
+
+from clients import get_http_client, close_clients
+from models.schema import EmailOutbox
+from user_directory import UserDirectory
+from metrics import metrics
+
+# Load environment variables from .env file
+load_dotenv()
+
+DATABASE_URL = os.getenv("POSTGRES_URL")
+SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY")
+EMAIL_USER = os.getenv("EMAIL_USER") or "support@naatininja.com"
+# SendGrid API, overridable with SENDGRID_API_URL (e.g. testing/sendgrid_stub.py)
+SENDGRID_API_URL = os.getenv("SENDGRID_API_URL") or "https://api.sendgrid.com"
+
+# Recipients per mail/send request, capped at SendGrid's 1000 personalizations
+EMAIL_BATCH_SIZE = min(int(os.getenv("EMAIL_BATCH_SIZE") or "1000"), 1000)
+# Runs an email is attempted in before it is marked failed
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS") or "5")
+# Delay before the first retry of an email, doubled for every further one
+EMAIL_RETRY_SECONDS = float(os.getenv("EMAIL_RETRY_SECONDS") or "300")
+# Immediate retries of a request that got a 429 or 5xx
+REQUEST_ATTEMPTS = 3
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), "templates")
+# Placeholder SendGrid replaces with each recipient's result link
+LINK_TOKEN = "-result_link-"
+RESULT_LINK = "https://app.naatininja.com/mock-test/{mock_id}"
+
+SUBJECTS = {
+    "test_result_passed": "🎉 Congratulations! You Passed Your NAATI Ninja Test",
+    "test_result_failed": "📊 Keep Going! Your NAATI Ninja Test Results Are In",
+}
+
+
+def claim_pending_emails(session, limit):
+    """
+    Fetch up to `limit` outbox emails that are due, oldest first. On Postgres
+    the rows stay locked until the session commits, and rows locked by
+    another sender are skipped.
+    """
+    now = datetime.utcnow()
+    return session.execute(
+        select(EmailOutbox)
+        .where(
+            EmailOutbox.status == "pending",
+            or_(EmailOutbox.next_attempt_on.is_(None),
+                EmailOutbox.next_attempt_on <= now),
+        )
+        .order_by(EmailOutbox.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    ).scalars().all()
+
+
+class ResultEmailSender:
+    """
+    Delivers the result emails queued in the email outbox through SendGrid.
+
+    Each template is rendered once from templates/; the recipient's result
+    link is filled in by SendGrid substitutions, so one request carries up to
+    EMAIL_BATCH_SIZE recipients. Emails whose request fails are retried in
+    later runs with exponential backoff, up to EMAIL_MAX_ATTEMPTS times.
+
+    Args:
+        directory (UserDirectory): Resolves user IDs to email addresses.
+        api_key (str): SendGrid API key.
+        sender (str): From address.
+    """
+
+    def __init__(self, directory, api_key=SENDGRID_API_KEY, sender=EMAIL_USER):
+        if not api_key:
+            raise ValueError(
+                "[-] SENDGRID_API_KEY must be set in the environment variables.")
+
+        env = Environment(loader=FileSystemLoader(TEMPLATES_DIR),
+                          autoescape=select_autoescape(["html"]))
+        self.bodies = {name: env.get_template(f"{name}.html").render(link=LINK_TOKEN)
+                       for name in SUBJECTS}
+        self.directory = directory
+        self.api_key = api_key
+        self.sender = sender
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+
+    def send_pending(self, session):
+        """Send every due email in the outbox. Returns the number sent."""
+        sent = self.sent
+        while True:
+            rows = claim_pending_emails(session, EMAIL_BATCH_SIZE)
+            if not rows:
+                break
+            self._send_rows(rows)
+            session.commit()
+        return self.sent - sent
+
+    def _send_rows(self, rows):
+        emails = self.directory.resolve([row.user_id for row in rows])
+
+        by_template = {}
+        for row in rows:
+            email = emails.get(row.user_id)
+            if not email:
+                self._retry(row, "No email address for user")
+            elif row.template not in self.bodies:
+                self._retry(row, f"Unknown template {row.template}")
+            else:
+                by_template.setdefault(row.template, []).append((row, email))
+
+        for template, batch in by_template.items():
+            try:
+                with metrics.timer("email_send"):
+                    self._post(template, batch)
+            except httpx.HTTPError as ex:
+                print(
+                    f"[-] Error sending {len(batch)} emails via SendGrid: {ex}")
+                for row, _ in batch:
+                    self._retry(row, str(ex))
+                continue
+
+            now = datetime.utcnow()
+            for row, _ in batch:
+                row.status = "sent"
+                row.attempts += 1
+                row.sent_on = now
+            self.sent += len(batch)
+            metrics.inc("emails_sent_total", len(batch), template=template)
+            print(f"[+] Sent {len(batch)} '{template}' emails via SendGrid")
+
+    def _post(self, template, batch):
+        """Send one template to a batch of (row, email) in a single request."""
+        payload = {
+            "personalizations": [
+                {
+                    "to": [{"email": email}],
+                    "substitutions": {
+                        LINK_TOKEN: RESULT_LINK.format(mock_id=row.mock_id)},
+                    "custom_args": {"user_mock_id": row.user_mock_id},
+                }
+                for row, email in batch
+            ],
+            "from": {"email": self.sender},
+            "subject": SUBJECTS[template],
+            "content": [{"type": "text/html", "value": self.bodies[template]}],
+        }
+        headers = {"Authorization": f"Bearer {self.api_key}"}
+
+        for attempt in range(REQUEST_ATTEMPTS):
+            response = get_http_client().post(
+                f"{SENDGRID_API_URL}/v3/mail/send", json=payload, headers=headers)
+            retryable = response.status_code == 429 or response.status_code >= 500
+            if not retryable or attempt == REQUEST_ATTEMPTS - 1:
+                break
+            delay = float(response.headers.get("Retry-After") or 2 ** attempt)
+            print(
+                f"-> SendGrid returned {response.status_code}, retrying in {delay:.0f}s")
+            time.sleep(delay)
+        response.raise_for_status()
+
+    def _retry(self, row, error):
+        """Record a failed attempt and schedule the next one, or give up."""
+        row.attempts += 1
+        row.last_error = error[:1000]
+        if row.attempts >= EMAIL_MAX_ATTEMPTS:
+            row.status = "failed"
+            self.failed += 1
+            print(
+                f"[-] Giving up on result email of UserMock {row.user_mock_id}: {error}")
+        else:
+            row.next_attempt_on = datetime.utcnow() + timedelta(
+                seconds=EMAIL_RETRY_SECONDS * 2 ** (row.attempts - 1))
+            self.retried += 1
+
+    def stats(self):
+        return {"sent": self.sent, "retried": self.retried, "failed": self.failed}
+
+
+def main():
+    # Create a database session
+    engine = create_engine(DATABASE_URL)
+    SessionLocal = sessionmaker(
+        autocommit=False, autoflush=False, bind=engine)
+    session = SessionLocal()
+
+    directory = UserDirectory()
+    sender = ResultEmailSender(directory)
+    try:
+        sender.send_pending(session)
+    finally:
+        print("[+] Emails:", sender.stats())
+        print("[+] Users:", directory.stats())
+        metrics.export("email_outbox")
+        session.close()
+        directory.close()
+        close_clients()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,14 +3,12 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 from helpers import (
-    get_user_mocks,
-    get_mock_answers_by_user_mock_id,
-    update_user_mock,
-    fetch_user_from_clerk,
-    send_test_result_email,
-    get_mock_question_count,
-    send_test_result_email_sendgrid
+    get_user_mock_totals,
+    compute_mock_result,
+    bulk_finalise_user_mocks,
+    UserMockResult,
 )
+from metrics import metrics
 
 # Load environment variables from .env file
 load_dotenv()
@@ -18,56 +16,77 @@ load_dotenv()
 # Validate Supabase and Database URLs
 DATABASE_URL = os.getenv("POSTGRES_URL")
 
-# Create a database session
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-session = SessionLocal()
 
+def finalise(session, user_mock_ids=None, complete_only=False):
+    """
+    Compute the result of the pending user mocks, record it and queue the
+    result emails. Safe to run concurrently: a user mock is only ever
+    finalised once.
 
-# Fetch the user mock answers with null score and passed
-user_mocks = get_user_mocks(session)
+    Args:
+        session (Session): SQLAlchemy database session object.
+        user_mock_ids (List[str], optional): Only these user mocks.
+        complete_only (bool): Only user mocks whose every question has a
+                              scored answer.
 
-# Process each user mock
-for user_mock in user_mocks:
-    mock_answers = get_mock_answers_by_user_mock_id(session, user_mock.id)
-    total_score = sum(
-        answer.score for answer in mock_answers if answer.score is not None)
+    Returns:
+        List[UserMockResult]: The user mocks finalised by this call.
+    """
+    # Fetch the pending user mocks with their summed scores and question counts
+    user_mocks = get_user_mock_totals(session, user_mock_ids, complete_only)
+    if not user_mocks:
+        # End the read transaction
+        session.commit()
+        return []
 
-    # Get total number of mock questions instead of using answers
-    num_questions = get_mock_question_count(session, user_mock.mock_id)
+    results = []
+    for user_mock in user_mocks:
+        percentage, passed = compute_mock_result(
+            user_mock.total_score, user_mock.num_questions)
 
-    # Avoid division by zero
-    if num_questions > 0:
-        percentage = round((total_score / (5 * num_questions)) * 100)
-        print(
-            f"[+] User Mock ID: {user_mock.id}, Total Score: {total_score}, Percentage: {percentage}")
-    else:
-        print(f"[-] User Mock ID: {user_mock.id}, No questions found.")
-        percentage = 0  # Default to 0 if no questions exist
-
-    passed = percentage > 50  # Determine pass/fail based on 50% threshold
-    print("[+] Passed:", passed)
+        if user_mock.num_questions > 0:
+            print(
+                f"[+] User Mock ID: {user_mock.user_mock_id}, Total Score: {user_mock.total_score}, Percentage: {percentage}")
+        else:
+            print(
+                f"[-] User Mock ID: {user_mock.user_mock_id}, No questions found.")
+        print("[+] Passed:", passed)
 
-    # Update UserMocks
-    try:
-        result = update_user_mock(
-            session=session,
-            user_mock_id=user_mock.id,
+        results.append(UserMockResult(
+            user_mock_id=user_mock.user_mock_id,
             user_id=user_mock.user_id,
-            attempts_increment=1,
+            mock_id=user_mock.mock_id,
             total_score=percentage,
             passed=passed
-        )
-
-        if result:
-            print("[+] UserMocks updated successfully.")
+        ))
 
-            link = f"https://app.naatininja.com/mock-test/{user_mock.mock_id}"
-            recipient_email = fetch_user_from_clerk(user_mock.user_id)
-            to_email = recipient_email['email_addresses'][0]['email_address']
-            # send_test_result_email(to_email, link, passed=passed) # Credits reset on 21 May 2025
-            send_test_result_email_sendgrid(to_email, link, passed=passed)
-        else:
-            print("[-] Failed to update UserMocks.")
+    # Update UserMocks and queue the result emails in the same transaction;
+    # email_outbox.py sends them
+    try:
+        updated = bulk_finalise_user_mocks(session, results)
+        metrics.inc("user_mocks_finalised_total", len(updated))
+        print(f"[+] {len(updated)}/{len(results)} UserMocks updated successfully, result emails queued.")
     except Exception as ex:
-        print(f"[-] Error updating UserMock: {ex}")
+        print(f"[-] Error updating UserMocks: {ex}")
+        updated = []
+
+    return updated
+
+
+def main():
+    # Create a database session
+    engine = create_engine(DATABASE_URL)
+    SessionLocal = sessionmaker(
+        autocommit=False, autoflush=False, bind=engine)
+    session = SessionLocal()
+
+    with metrics.timer("finalise"):
+        finalise(session)
+    metrics.export("finalise_grading")
+
+    # Close the session
+    session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,28 @@
 import os
-from supabase import create_client
+import socket
+import threading
+from itertools import islice
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 # from pydub import AudioSegment
-from helpers import fetch_mock_answers, grade_translation, ollama_grade_translation, openai_transcribe, transcribe, update_user_mock, update_mock_answer, delete_supabase_file, extract_score
-import whisper
+from helpers import GRADING_MODEL, BATCH_GRADING_PROMPT_VERSION, FETCH_PAGE_SIZE, iter_mock_answers, iter_claimed_mock_answers, release_mock_answers, record_grading_failures, GRADING_MAX_FAILURES, get_pending_audio_file_names, grade_translations_batch, openai_transcribe, named_audio_buffer, transcribe, MockAnswerResult, parse_score
+from grading_router import build_grading_router, GRADING_BACKENDS
+from pipeline import Stage, run_pipeline
+from whisper_pool import close_whisper_pool, WHISPER_MODEL
+from cache import TranscriptCache, GradingCache
+from clients import get_supabase_client, close_clients
+from answer_writer import MockAnswerWriter
+from deletion_queue import StorageDeletionQueue
+from download_cache import DownloadCache
+from metrics import metrics
+from audio import (
+    preprocess_audio,
+    ENCODED_EXTENSION,
+    ENCODED_BITRATE,
+    PREPROCESS_SETTINGS,
+)
+from finalise_grading import finalise
 
 # Load environment variables from .env file
 load_dotenv()
@@ -20,45 +37,138 @@ API_KEY = os.getenv("OPENAI_API_KEY")
 download_folder = os.getenv("DOWNLOADS_FOLDER")
 prefix = os.getenv("SUPABASE_PREFIX")
 
+# "openai" for the Whisper API, "local" for the local Whisper worker pool
+TRANSCRIBE_ENGINE = (os.getenv("TRANSCRIBE_ENGINE") or "openai").lower()
+
+# Keep downloaded audio in memory; 1 also writes it to DOWNLOADS_FOLDER and
+# transcribes from there, for debugging. Either way DOWNLOADS_FOLDER keeps the
+# audio of failed answers so a retry doesn't download it again.
+AUDIO_TO_DISK = (os.getenv("AUDIO_TO_DISK") or "0") == "1"
+
+# Trim silence and re-encode at 16 kHz mono before transcribing; answers
+# without speech are scored 0 without calling the transcription or grading APIs
+AUDIO_PREPROCESS = (os.getenv("AUDIO_PREPROCESS") or "1") == "1"
+
+# Number of answers (user mocks with GRADING_BATCH) processed at once.
+# 1 keeps the original serial loop.
+GRADING_CONCURRENCY = int(os.getenv("GRADING_CONCURRENCY") or "1")
+# Grade all answers of a user mock in one LLM request, on OpenAI
+GRADING_BATCH = (os.getenv("GRADING_BATCH") or "0") == "1"
+if GRADING_BATCH and "openai" not in GRADING_BACKENDS:
+    print("[-] GRADING_BATCH grades on OpenAI, which GRADING_BACKENDS leaves out; "
+          "grading answers one by one instead.")
+    GRADING_BATCH = False
+# Force single-answer grading replies to {"score": <0-5>} with structured
+# output and a few max tokens; 0 lets the model reply with free text
+GRADING_CONSTRAINED = (os.getenv("GRADING_CONSTRAINED") or "1") == "1"
+# Capacity of the queues between pipeline stages (defaults to the concurrency)
+GRADING_QUEUE_SIZE = int(os.getenv("GRADING_QUEUE_SIZE") or "0") or None
+
+# Lease answers before grading them so several workers can split the backlog.
+# The lease columns are added by migrate.py, run it before enabling this.
+GRADING_LEASES = (os.getenv("GRADING_LEASES") or "0") == "1"
+# Answers claimed at once, and how long they stay leased; the lease must
+# cover grading a whole claim
+GRADING_CLAIM_SIZE = int(os.getenv("GRADING_CLAIM_SIZE") or "20")
+GRADING_LEASE_SECONDS = float(os.getenv("GRADING_LEASE_SECONDS") or "900")
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# Finalise a user mock and queue its result email as soon as its last
+# answer is written back, instead of waiting for finalise_grading.py
+FINALISE_ON_GRADE = (os.getenv("FINALISE_ON_GRADE") or "1") == "1"
+
 
 # if not SUPABASE_URL or not SUPABASE_KEY or not SUPABASE_BUCKET or not DATABASE_URL or API_KEY:
 #     raise ValueError(
 #         "[-] Ensure SUPABASE_URL, SUPABASE_KEY, SUPABASE_BUCKET, API_KEY and POSTGRES_URL are set in the .env file.")
 
 
-# Initialize Supabase client
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+class AnswerJob:
+    """State carried by one mock answer as it moves through the grading stages."""
+
+    __slots__ = ("index", "row", "file_name", "audio", "prepared",
+                 "transcription", "score", "is_correct")
 
-# Create a database session
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-session = SessionLocal()
+    def __init__(self, index, row):
+        self.index = index
+        self.row = row
+        self.file_name = None
+        self.audio = None
+        self.prepared = None
+        self.transcription = None
+        self.score = None
+        self.is_correct = None
 
-# Fetch the mock answers with null transcript and score
-mock_answers = fetch_mock_answers(session)
 
-# Ensure the download directory exists
-os.makedirs(download_folder, exist_ok=True)
+class GradingContext:
+    """Clients, caches and sinks shared by every stage of a grading run."""
 
-# # Process and download files
-for i, qa in enumerate(mock_answers):
-    # print("MOCK QA:", answer)
+    def __init__(self, supabase, transcript_cache, grading_cache, download_cache, deletion_queue):
+        self.supabase = supabase
+        self.transcript_cache = transcript_cache
+        self.grading_cache = grading_cache
+        self.download_cache = download_cache
+        self.deletion_queue = deletion_queue
+        self.writer = None
+        self.router = None
+        self.audio_seconds = 0.0
+        self.speech_seconds = 0.0
+        self.blank_answers = 0
+        # IDs of the answers written back, for callers that retry the rest
+        self.finished = set()
+        # IDs of the answers the grader gave no score for, see record_failures
+        self.no_score = set()
+        self._lock = threading.Lock()
+
+    def record_audio(self, prepared):
+        """Add one preprocessed answer to the audio duration totals."""
+        with self._lock:
+            self.audio_seconds += prepared.duration
+            self.speech_seconds += prepared.speech_duration
+            self.blank_answers += prepared.silent
+        metrics.inc("audio_seconds_total", prepared.duration, kind="recorded")
+        metrics.inc("audio_seconds_total", prepared.speech_duration, kind="speech")
+        metrics.inc("blank_answers_total", prepared.silent)
+
+    def audio_stats(self):
+        return {
+            "audio_seconds": round(self.audio_seconds, 1),
+            "speech_seconds": round(self.speech_seconds, 1),
+            "blank_answers": self.blank_answers,
+        }
+
+
+def download_answer(job, ctx):
+    """
+    Download the answer's audio file from Supabase into memory, and into the
+    download folder as well when AUDIO_TO_DISK is on. A copy left in the
+    download folder by an earlier failed attempt is reused instead.
+    """
     try:
-        file_name = qa[0].audio_file_url.strip().split(
+        file_name = job.row.audio_file_url.strip().split(
             '/')[-1]  # Strip spaces and get file name from Answers
+        job.file_name = file_name
 
-        # Save the file locally
-        local_path = os.path.join(download_folder, os.path.basename(file_name))
-        response = supabase.storage.from_(
+        job.audio = ctx.download_cache.get(file_name)
+        if job.audio is not None:
+            print(f"[+] Reused local copy: {file_name}")
+            return True
+
+        job.audio = ctx.supabase.storage.from_(
             SUPABASE_BUCKET).download(f"{prefix}/{file_name}")
 
-        with open(local_path, "wb") as f:
-            f.write(response)
-        print(f"[+] Downloaded: {local_path}")
+        if not AUDIO_TO_DISK:
+            print(f"[+] Downloaded: {file_name} ({len(job.audio)} bytes)")
+            return True
 
+        # Save the file locally
+        local_path = ctx.download_cache.put(file_name, job.audio)
+        print(f"[+] Downloaded: {local_path}")
+        return True
     except Exception as e:
-        print(f"[-] Error downloading file {file_name}: {e}, Loop {i}")
-        continue
+        print(
+            f"[-] Error downloading file {job.file_name}: {e}, Loop {job.index}")
+        return False
 
     # try:
     #     # Set the output file name to have a .wav extension
@@ -76,89 +186,474 @@ for i, qa in enumerate(mock_answers):
     # except Exception as ex:
     #     print(f"[-] Error converting file {file_name}: {ex}")
 
+
+def keep_for_retry(job, ctx):
+    """Save the audio of a failed answer so the next attempt skips the download."""
+    if job.audio is None or AUDIO_TO_DISK:
+        return
+    try:
+        ctx.download_cache.put(job.file_name, job.audio)
+    except Exception as ex:
+        print(f"[-] Error saving {job.file_name} for retry: {ex}")
+    job.audio = None
+
+
+def transcript_engine(trimmed):
+    """
+    The engine string transcripts are cached under: engine and model, plus
+    the preprocessing settings when the trimmed audio was transcribed.
+    """
+    if TRANSCRIBE_ENGINE == "local":
+        engine = f"local:{WHISPER_MODEL}"
+        if trimmed:
+            engine += f"+{PREPROCESS_SETTINGS}"
+    else:
+        engine = "openai:whisper-1"
+        if trimmed:
+            engine += f"+{PREPROCESS_SETTINGS}:opus:{ENCODED_BITRATE}"
+    return engine
+
+
+def preprocess_answer(job, ctx):
+    """
+    Decode the answer once, trim its leading and trailing silence and
+    re-encode it at 16 kHz mono. A blank answer is scored 0 here and skips
+    transcription and grading. Audio that can't be decoded is sent as is.
+    An answer with a cached transcript isn't decoded at all.
+    """
+    if not AUDIO_PREPROCESS:
+        return True
+
+    ans_lang = str(job.row.answer_language).title()
+    transcript = ctx.transcript_cache.get_transcript(
+        job.audio, ans_lang, transcript_engine(trimmed=True))
+    if transcript is not None:
+        job.transcription = transcript
+        return True
+
+    try:
+        job.prepared = preprocess_audio(
+            job.audio, encode=TRANSCRIBE_ENGINE != "local")
+    except Exception as ex:
+        print(
+            f"[-] Error preprocessing audio {job.file_name}: {ex}, Loop {job.index}, sending it as is")
+        return True
+
+    prepared = job.prepared
+    ctx.record_audio(prepared)
+    if prepared.silent:
+        print(
+            f"[+] Blank answer: {job.file_name} ({prepared.duration:.1f}s), scoring 0")
+        job.transcription = ""
+        set_score(job, 0)
+    else:
+        print(
+            f"[+] Trimmed {job.file_name}: {prepared.duration:.1f}s -> {prepared.speech_duration:.1f}s")
+    return True
+
+
+def transcribe_answer(job, ctx):
+    """
+    Transcribe the downloaded audio in the question's answer language,
+    reusing a cached transcript of identical audio when there is one.
+    """
+    if job.score is not None or job.transcription is not None:
+        # Blank answer, already scored, or transcript found before decoding
+        return True
+
     try:
         # Get Ans Language from Questions
-        ans_lang = str(qa[1].answer_language).title()
+        ans_lang = str(job.row.answer_language).title()
+        prepared = job.prepared
+
+        # Transcribe the trimmed audio, the downloaded file, or straight from memory
+        audio_file = ctx.download_cache.path(job.file_name) if AUDIO_TO_DISK else None
+
+        if TRANSCRIBE_ENGINE == "local":
+            if prepared is not None:
+                source = prepared.samples
+            else:
+                source = audio_file if AUDIO_TO_DISK else job.audio
 
-        # Transcribe
-        # transcription = transcribe(
-        # f"{download_folder}/{file_name}", language=ans_lang)
+            def transcribe_fn():
+                return transcribe(source, language=ans_lang)
+        else:
+            def source():
+                if prepared is not None:
+                    return named_audio_buffer(
+                        prepared.data, os.path.splitext(job.file_name)[0] + ENCODED_EXTENSION)
+                return audio_file if AUDIO_TO_DISK else named_audio_buffer(
+                    job.audio, job.file_name)
+
+            def transcribe_fn():
+                return openai_transcribe(source(), language=ans_lang, api_key=API_KEY)
 
-        transcription = openai_transcribe(
-            f"{download_folder}/{file_name}", language=ans_lang, api_key=API_KEY)
-        # transcription = transcription['text']
+        engine = transcript_engine(trimmed=prepared is not None)
+        if prepared is not None:
+            # Already looked up in preprocess_answer
+            job.transcription = transcribe_fn()
+            ctx.transcript_cache.put_transcript(job.audio, ans_lang, engine, job.transcription)
+        else:
+            job.transcription = ctx.transcript_cache.get_or_transcribe(
+                job.audio, ans_lang, engine, transcribe_fn)
 
+        # The trimmed audio isn't needed past transcription
+        job.prepared = None
+        return True
     except Exception as ex:
-        print(f"[-] Error transcribing audio {file_name}: {ex}, Loop {i}")
-        continue
+        print(
+            f"[-] Error transcribing audio {job.file_name}: {ex}, Loop {job.index}")
+        keep_for_retry(job, ctx)
+        return False
+
+
+def grade_answer(job, ctx):
+    """
+    Grade the transcription against the reference transcript, reusing the
+    stored grade when the same answer to the same reference was graded before.
+    """
+    if job.score is not None:
+        # Blank answer, already scored
+        return True
 
     try:
         # Grading
-        ref_answer = qa[1].transcript
-        user_answer = transcription
-        # score = ollama_grade_translation(ref_answer, user_answer, language=ans_lang)
-        score = grade_translation(
-            ref_answer, user_answer, API_KEY, language=ans_lang)
-        print("[+] Score:", score)
-
+        ans_lang = str(job.row.answer_language).title()
+        ref_answer = job.row.reference
+        user_answer = job.transcription
+        cache = ctx.grading_cache
+        keys = {backend.name: cache.grading_key(
+            ref_answer, user_answer, ans_lang, backend.prompt_version, backend.model)
+            for backend in ctx.router.backends}
+        # A grade from any of the configured backends will do
+        cached = cache.get_any(keys.values())
+        if cached is not None:
+            print(f"-> Grading cache hit ({ans_lang})")
+            checked_score = parse_score(cached)
+        else:
+            # Only a parsed score is cached; a reply without one raises and
+            # the answer is retried instead of being scored 0
+            checked_score, backend = ctx.router.grade(
+                ref_answer, user_answer, ans_lang)
+            cache.put(keys[backend.name], str(checked_score))
+        print("[+] Score:", checked_score)
     except Exception as ex:
-        print(f"[-] Error Grading Transcription {file_name}: {ex}, Loop {i}")
-        continue
-
-    # Update Mock Answers
-    is_it_correct = None
-    # checked_score = extract_score(response)
-    score = score.strip().replace('.', '')
-    if not score.isdigit():
-        checked_score = 0
-    else:
-        checked_score = int(score)
+        print(
+            f"[-] Error Grading Transcription {job.file_name}: {ex}, Loop {job.index}")
+        if isinstance(ex, ValueError):
+            # A reply without a score, unlike an outage, may never get better
+            with ctx._lock:
+                ctx.no_score.add(job.row.id)
+        keep_for_retry(job, ctx)
+        return False
+
+    set_score(job, checked_score)
+    return True
+
+
+def set_score(job, checked_score):
+    """Record a checked 0-5 score on the job."""
     print("Checked Score ", checked_score)
+    job.score = checked_score
+    job.is_correct = checked_score >= 3
+    print("Correct ", job.is_correct)
 
-    try:
-        if checked_score >= 3:
-            is_it_correct = True
+
+def grade_group(group, ctx):
+    """
+    Grade the answers of one user mock. With GRADING_BATCH every answer not
+    already in the cache is graded in a single request; a malformed batch
+    reply falls back to grading the answers one by one.
+    """
+    if not GRADING_BATCH or len(group) == 1:
+        return keep(group, grade_answer, ctx)
+
+    cache = ctx.grading_cache
+    pending = []
+    for job in group:
+        if job.score is not None:
+            continue
+        ans_lang = str(job.row.answer_language).title()
+        key = cache.grading_key(job.row.reference, job.transcription,
+                                ans_lang, BATCH_GRADING_PROMPT_VERSION, GRADING_MODEL)
+        cached = cache.get(key)
+        if cached is not None:
+            set_score(job, int(cached))
         else:
-            is_it_correct = False
-    except Exception:
-        is_it_correct = False
-    print("Correct ", is_it_correct)
+            pending.append((job, ans_lang, key))
 
-# Update Mock Answers
-    try:
-        result = update_mock_answer(
-            session=session,
-            mock_question_id=qa[0].mock_question_id,
-            user_mock_id=qa[0].user_mock_id,
-            user_id=qa[0].user_id,
-            transcript=transcription,
-            score=checked_score,
-            is_correct=is_it_correct,
-            mock_id=qa[1].mock_id
-        )
-
-        if result:
-            print("MockAnswers updated successfully.")
+    if pending:
+        try:
+            with metrics.timer("grade_batch"):
+                scores = grade_translations_batch(
+                    [(job.row.reference, job.transcription, ans_lang)
+                     for job, ans_lang, _ in pending], API_KEY)
+            print("[+] Batch Scores:", scores)
+        except Exception as ex:
+            print(
+                f"[-] Error batch grading user mock {group[0].row.user_mock_id}: {ex}, grading one by one")
+            failed = [job for job, _, _ in pending
+                      if not grade_answer(job, ctx)]
+            group[:] = [job for job in group if job not in failed]
+            return bool(group)
+
+        for (job, _, key), checked_score in zip(pending, scores):
+            cache.put(key, str(checked_score))
+            set_score(job, checked_score)
+    return True
+
+
+def persist_answer(job, ctx):
+    """Queue the transcript and score for the batched MockAnswers write-back."""
+    ctx.writer.add(MockAnswerResult(
+        mock_question_id=job.row.mock_question_id,
+        user_mock_id=job.row.user_mock_id,
+        user_id=job.row.user_id,
+        transcript=job.transcription,
+        score=job.score,
+        is_correct=job.is_correct,
+        mock_id=job.row.mock_id
+    ), context=job)
+    return True
+
+
+def finish_answer(job, ok, ctx):
+    """
+    Called by the writer once the answer's batch has been written; drops the
+    local audio and queues the stored file for deletion from Supabase.
+    """
+    if not ok:
+        print(f"Failed to update MockAnswers, Loop {job.index}")
+        keep_for_retry(job, ctx)
+        return
+
+    print("MockAnswers updated successfully.")
+    with ctx._lock:
+        ctx.finished.add(job.row.id)
+    job.audio = None
+    ctx.download_cache.discard(job.file_name)
+    if job.prepared is not None and job.prepared.silent:
+        # Scored 0 without a transcription: keep the recording so the
+        # answer can be checked and regraded
+        print(f"[+] Keeping blank answer {job.file_name} in storage")
+        return
+    ctx.deletion_queue.add(f"{prefix}/{job.file_name}")
+
+
+def finalise_written(session, results):
+    """
+    Called by the writer after each batch: finalise the user mocks of the
+    written answers that now have a scored answer for every question.
+    """
+    if not FINALISE_ON_GRADE:
+        return
+    user_mock_ids = sorted({result.user_mock_id for result in results})
+    with metrics.timer("finalise"):
+        finalise(session, user_mock_ids, complete_only=True)
+
+
+def keep(group, stage_fn, ctx):
+    """
+    Run a per-answer stage on every job of a group, dropping the jobs it fails
+    for. Returns False once no job is left.
+    """
+    stage = stage_fn.__name__.removesuffix("_answer")
+    kept = []
+    for job in group:
+        with metrics.timer(stage):
+            ok = stage_fn(job, ctx)
+        if ok:
+            kept.append(job)
         else:
-            print("Failed to update MockAnswers.")
+            metrics.inc("errors_total", stage=stage)
+    group[:] = kept
+    return bool(group)
+
+
+def group_jobs(jobs, window=FETCH_PAGE_SIZE):
+    """
+    Yield the jobs in groups: the answers of the same user mock together
+    when GRADING_BATCH is on, otherwise one answer per group.
+
+    The backlog is streamed in created_on order, where answers of different
+    user mocks submitted at the same time interleave, so the jobs are read
+    `window` at a time (a fetch page) and grouped by user mock within it.
+    """
+    if not GRADING_BATCH:
+        for job in jobs:
+            yield [job]
+        return
+
+    jobs = iter(jobs)
+    while True:
+        page = list(islice(jobs, window))
+        if not page:
+            return
+        groups = {}
+        for job in page:
+            groups.setdefault(job.row.user_mock_id, []).append(job)
+        yield from groups.values()
+
+
+def run_serial(groups, ctx):
+    """Process the answers one group at a time."""
+    for group in groups:
+        if not keep(group, download_answer, ctx):
             continue
-    except Exception as ex:
-        print(f"[-] Error updaring Answer: {ex}, Loop {i}")
-        continue
+        if not keep(group, preprocess_answer, ctx):
+            continue
+        if not keep(group, transcribe_answer, ctx):
+            continue
+        if not grade_group(group, ctx):
+            continue
+        keep(group, persist_answer, ctx)
+
+
+def run_pipelined(groups, ctx, concurrency):
+    """
+    Process the answer groups through a staged pipeline with `concurrency`
+    workers per stage and at most `concurrency` groups in flight. Graded
+    answers end in the shared batched writer.
+    """
+    stages = [
+        Stage("download", lambda group, _: keep(group, download_answer, ctx),
+              workers=concurrency),
+        Stage("preprocess", lambda group, _: keep(group, preprocess_answer, ctx),
+              workers=concurrency),
+        Stage("transcribe", lambda group, _: keep(group, transcribe_answer, ctx),
+              workers=concurrency),
+        Stage("grade", lambda group, _: grade_group(group, ctx),
+              workers=concurrency),
+        Stage("persist", lambda group, _: keep(group, persist_answer, ctx),
+              workers=concurrency),
+    ]
+    completed = run_pipeline(
+        groups, stages, max_in_flight=concurrency, queue_size=GRADING_QUEUE_SIZE)
+    print(f"[+] Pipeline finished, {completed} groups graded and queued for writing.")
+
+
+def build_context(SessionLocal):
+    """Create the clients, caches and batched writer shared by grading runs."""
+    ctx = GradingContext(
+        supabase=get_supabase_client(SUPABASE_URL, SUPABASE_KEY),
+        transcript_cache=TranscriptCache(),
+        grading_cache=GradingCache(),
+        download_cache=DownloadCache(download_folder),
+        deletion_queue=StorageDeletionQueue(
+            SUPABASE_BUCKET, SUPABASE_URL, SUPABASE_KEY),
+    )
+    ctx.writer = MockAnswerWriter(
+        SessionLocal, on_flushed=lambda job, ok: finish_answer(job, ok, ctx),
+        on_batch_flushed=finalise_written)
+    # Room on each backend for every grading worker's request plus the ones
+    # still running after losing a hedge
+    ctx.router = build_grading_router(
+        API_KEY, GRADING_CONSTRAINED, max_workers=2 * max(1, GRADING_CONCURRENCY))
+    return ctx
 
-    # Delete Audio File from Supabase
+
+def pending_answers(session, exclude=()):
+    """
+    Stream the answers to grade: leased batches with GRADING_LEASES,
+    otherwise the whole backlog. Answers in `exclude` are skipped, and
+    never leased.
+    """
+    if GRADING_LEASES:
+        return iter_claimed_mock_answers(
+            session, WORKER_ID, GRADING_CLAIM_SIZE, GRADING_LEASE_SECONDS, exclude=exclude)
+    return (row for row in iter_mock_answers(session) if row.id not in exclude)
+
+
+def release_leases(session):
+    """Hand the answers this worker claimed but didn't grade back to the others."""
+    if not GRADING_LEASES:
+        return
     try:
-        # Delete the file
-        success = delete_supabase_file(
-            prefix, file_name, SUPABASE_BUCKET, SUPABASE_URL, SUPABASE_KEY)
+        released = release_mock_answers(session, WORKER_ID)
+        if released:
+            print(f"[+] Released {released} leased answers")
+    except Exception as ex:
+        print(f"[-] Error releasing leases: {ex}")
 
-        if success:
-            print("File deleted successfully.")
-        else:
-            print("Failed to delete the file.")
 
+def record_failures(session, ctx):
+    """
+    Count a failed attempt for every answer the grader gave no score for in
+    this run; those that reach GRADING_MAX_FAILURES are no longer retried.
+    """
+    with ctx._lock:
+        no_score, ctx.no_score = ctx.no_score, set()
+    try:
+        given_up = record_grading_failures(session, no_score)
     except Exception as ex:
-        print(f"[-] Error updaring userMock: {ex}, Loop {i}")
+        print(f"[-] Error recording grading failures: {ex}")
+        return
+    metrics.inc("answers_given_up_total", len(given_up))
+    for answer_id in given_up:
+        print(
+            f"[-] No score for answer {answer_id} after {GRADING_MAX_FAILURES} attempts, not retrying it")
+
+
+def grade_answers(answers, ctx):
+    """Grade a stream of PendingAnswer rows with the configured runner."""
+    jobs = (AnswerJob(i, row) for i, row in enumerate(answers))
+    groups = group_jobs(jobs)
+
+    if GRADING_CONCURRENCY > 1:
+        run_pipelined(groups, ctx, GRADING_CONCURRENCY)
+    else:
+        run_serial(groups, ctx)
+
+
+def print_stats(ctx):
+    print("[+] MockAnswers:", ctx.writer.stats())
+    print("[+] Audio:", ctx.audio_stats())
+    print("[+] Transcript cache:", ctx.transcript_cache.stats())
+    print("[+] Grading cache:", ctx.grading_cache.stats())
+    print("[+] Graders:", ctx.router.stats())
+    print("[+] Download cache:", ctx.download_cache.stats())
+
+
+def close_context(ctx):
+    """Write back what is still buffered, delete the graded audio and close the caches."""
+    try:
+        ctx.writer.close()
+        ctx.deletion_queue.flush()
+    finally:
+        ctx.router.close()
+        ctx.transcript_cache.close()
+        ctx.grading_cache.close()
+
+
+def main():
+    # Create a database session
+    engine = create_engine(DATABASE_URL)
+    SessionLocal = sessionmaker(
+        autocommit=False, autoflush=False, bind=engine)
+    session = SessionLocal()
+
+    ctx = build_context(SessionLocal)
+
+    # Clear out audio that no pending answer needs any more
+    ctx.download_cache.cleanup(get_pending_audio_file_names(session))
+
+    try:
+        # Grade the mock answers with null transcript and score
+        grade_answers(pending_answers(session), ctx)
+    finally:
+        # Write back whatever is still buffered, then delete the audio files
+        close_context(ctx)
+        record_failures(session, ctx)
+        release_leases(session)
+
+    print_stats(ctx)
+    metrics.export("grade_tests")
+
+    # Close the session
+    session.close()
+    close_whisper_pool()
+    close_clients()
+
 
-# Close the session
-session.close()
+if __name__ == "__main__":
+    main()
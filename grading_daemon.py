@@ -0,0 +1,189 @@
+import os
+import time
+import select
+import signal
+import threading
+from itertools import takewhile
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from dotenv import load_dotenv
+
+from helpers import get_pending_audio_file_names
+from clients import get_openai_client, get_http_client, close_clients
+from whisper_pool import get_whisper_pool, close_whisper_pool
+from grade_tests import (
+    build_context,
+    pending_answers,
+    release_leases,
+    record_failures,
+    grade_answers,
+    print_stats,
+    close_context,
+    DATABASE_URL,
+    API_KEY,
+    TRANSCRIBE_ENGINE,
+)
+from metrics import metrics
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Channel the mock_answers insert trigger notifies; the trigger is created
+# by migrations/0005_mock_answers_notify.sql
+NOTIFY_CHANNEL = "mock_answers_inserted"
+# Seconds between sweeps of the whole backlog, which also retry failed answers
+SWEEP_SECONDS = float(os.getenv("DAEMON_SWEEP_SECONDS") or "300")
+# Seconds to wait after a notification so a whole mock's answers are graded together
+NOTIFY_DEBOUNCE_SECONDS = float(os.getenv("DAEMON_DEBOUNCE_SECONDS") or "2")
+LISTEN_RECONNECT_SECONDS = 5
+
+
+class GradingDaemon:
+    """
+    Grades new mock answers as they arrive, keeping clients, caches and the
+    Whisper workers warm between passes.
+
+    A listener thread wakes the daemon on every notification of the
+    mock_answers insert trigger (run migrate.py to create it; without it
+    the daemon relies on sweeps), and a sweep of the whole backlog runs every
+    SWEEP_SECONDS as a safety net for missed notifications. Answers that
+    failed are only retried by sweeps. SIGTERM and SIGINT stop the intake of
+    new answers, let the answers in flight finish and flush the writer.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.SessionLocal = sessionmaker(
+            autocommit=False, autoflush=False, bind=engine)
+        self.ctx = build_context(self.SessionLocal)
+        self.passes = 0
+        # Answers that failed since the last sweep
+        self._failed = set()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._listener = threading.Thread(
+            target=self._listen, name="grading-listener", daemon=True)
+
+    def warm_up(self):
+        """Create the API clients and start the Whisper workers before the first answer."""
+        get_http_client()
+        if API_KEY:
+            get_openai_client(API_KEY)
+        if TRANSCRIBE_ENGINE == "local":
+            get_whisper_pool()
+
+    def stop(self, signum=None, frame=None):
+        print("[+] Stopping, draining the answers in flight")
+        self._stop.set()
+        self._wake.set()
+
+    def _listen(self):
+        """Set the wake event on every notification, reconnecting when the connection drops."""
+        while not self._stop.is_set():
+            raw = None
+            try:
+                raw = self.engine.raw_connection()
+                conn = raw.driver_connection
+                # Keep this connection out of the pool, it stays in LISTEN
+                raw.detach()
+                conn.autocommit = True
+                conn.cursor().execute(f"LISTEN {NOTIFY_CHANNEL}")
+                print(f"[+] Listening on {NOTIFY_CHANNEL}")
+
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], 1.0)[0]:
+                        conn.poll()
+                        if conn.notifies:
+                            conn.notifies.clear()
+                            self._wake.set()
+            except Exception as ex:
+                print(f"[-] Listener error: {ex}, reconnecting")
+                # Notifications may have been missed while disconnected
+                self._wake.set()
+                self._stop.wait(LISTEN_RECONNECT_SECONDS)
+            finally:
+                if raw is not None:
+                    raw.close()
+
+    def run_pass(self, sweep):
+        """
+        Grade the pending answers; a notified pass skips answers that failed
+        before, without leasing them. The leases of answers that failed are
+        released at the end of the pass, so the next sweep or another worker
+        can retry them straight away.
+        """
+        session = self.SessionLocal()
+        self.ctx.finished.clear()
+        attempted = []
+
+        def answers():
+            for row in pending_answers(session, exclude=() if sweep else set(self._failed)):
+                attempted.append(row.id)
+                yield row
+
+        try:
+            # Stop taking answers once asked to stop; those in flight finish
+            grade_answers(takewhile(
+                lambda _: not self._stop.is_set(), answers()), self.ctx)
+            self.ctx.writer.flush()
+            self.ctx.deletion_queue.flush()
+        finally:
+            record_failures(session, self.ctx)
+            release_leases(session)
+            session.close()
+
+        if sweep:
+            self._failed.clear()
+        failed = set(attempted) - self.ctx.finished
+        self._failed |= failed
+        self.passes += 1
+        # Refresh the Prometheus file; the JSON summary is written on exit
+        metrics.export("grading_daemon", summary=False)
+        if attempted:
+            print(
+                f"[+] {'Sweep' if sweep else 'Pass'} done: {len(attempted) - len(failed)}/{len(attempted)} answers graded")
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        session = self.SessionLocal()
+        self.ctx.download_cache.cleanup(get_pending_audio_file_names(session))
+        session.close()
+
+        self.warm_up()
+        self._listener.start()
+
+        next_sweep = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                sweep = time.monotonic() >= next_sweep
+                if sweep:
+                    next_sweep = time.monotonic() + SWEEP_SECONDS
+                self.run_pass(sweep)
+
+                woken = self._wake.wait(max(0.0, next_sweep - time.monotonic()))
+                if woken and not self._stop.is_set():
+                    # Let the rest of a mock's answers arrive
+                    self._stop.wait(NOTIFY_DEBOUNCE_SECONDS)
+                self._wake.clear()
+        finally:
+            self._listener.join(timeout=LISTEN_RECONNECT_SECONDS)
+            close_context(self.ctx)
+            session = self.SessionLocal()
+            release_leases(session)
+            session.close()
+            print_stats(self.ctx)
+            metrics.export("grading_daemon")
+            close_whisper_pool()
+            close_clients()
+
+
+def main():
+    engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+    GradingDaemon(engine).run()
+
+
+if __name__ == "__main__":
+    main()
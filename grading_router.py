@@ -0,0 +1,329 @@
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from dotenv import load_dotenv
+
+from helpers import (
+    GRADING_MODEL,
+    OLLAMA_GRADING_MODEL,
+    GRADING_PROMPT_VERSION,
+    CONSTRAINED_GRADING_PROMPT_VERSION,
+    OLLAMA_GRADING_PROMPT_VERSION,
+    CONSTRAINED_OLLAMA_GRADING_PROMPT_VERSION,
+    grade_translation,
+    ollama_grade_translation,
+    parse_score,
+)
+from metrics import metrics
+
+load_dotenv()
+
+# Grader backends to route between, in order of preference while they have
+# no latency history, e.g. "openai,ollama". See GRADER_BACKENDS.
+GRADING_BACKENDS = [name.strip().lower() for name in (
+    os.getenv("GRADING_BACKENDS") or "openai").split(",") if name.strip()]
+# Send a hedged request to the next backend when the first hasn't answered
+# by the GRADING_HEDGE_QUANTILE of its recent latencies
+GRADING_HEDGE = (os.getenv("GRADING_HEDGE") or "1") == "1"
+GRADING_HEDGE_QUANTILE = float(os.getenv("GRADING_HEDGE_QUANTILE") or "0.95")
+# Hedge delay while a backend has fewer than ROUTER_MIN_SAMPLES latencies
+GRADING_HEDGE_INITIAL_SECONDS = float(
+    os.getenv("GRADING_HEDGE_INITIAL_SECONDS") or "10")
+# Never hedge sooner than this, so a fast backend's jitter doesn't double the load
+GRADING_HEDGE_MIN_SECONDS = float(os.getenv("GRADING_HEDGE_MIN_SECONDS") or "0.5")
+# How often a request still queued for its backend is checked for having started
+HEDGE_POLL_SECONDS = 0.05
+
+# Recent requests per backend the latency and error rate are computed over
+ROUTER_WINDOW = int(os.getenv("ROUTER_WINDOW") or "50")
+ROUTER_MIN_SAMPLES = 10
+# A backend failing more than this share of its recent requests is skipped...
+ROUTER_MAX_ERROR_RATE = float(os.getenv("ROUTER_MAX_ERROR_RATE") or "0.5")
+# ...except for one probe request every this many seconds
+ROUTER_PROBE_SECONDS = float(os.getenv("ROUTER_PROBE_SECONDS") or "30")
+
+
+class GraderBackend:
+    """
+    One LLM grader with its rolling latency and error history.
+
+    Args:
+        name (str): Backend name, as in GRADING_BACKENDS.
+        model (str): Model name, part of the grading cache key.
+        prompt_version (str): Fingerprint of the prompt, part of the cache key.
+        grade_fn (callable): Called as grade_fn(reference, answer, language);
+                             returns the model's reply.
+        window (int): Recent requests kept for the statistics.
+    """
+
+    def __init__(self, name, model, prompt_version, grade_fn, window=ROUTER_WINDOW):
+        self.name = name
+        self.model = model
+        self.prompt_version = prompt_version
+        self.grade_fn = grade_fn
+        # (seconds, ok) of the most recent requests
+        self._history = deque(maxlen=window)
+        self._last_attempt = 0.0
+        self._lock = threading.Lock()
+
+    def grade(self, reference, answer, language):
+        """Grade one answer. Returns the 0-5 score; raises if there is none."""
+        with self._lock:
+            self._last_attempt = time.monotonic()
+        started = time.perf_counter()
+        try:
+            score = parse_score(self.grade_fn(reference, answer, language))
+        except Exception:
+            self._record(time.perf_counter() - started, False)
+            raise
+        self._record(time.perf_counter() - started, True)
+        return score
+
+    def _record(self, seconds, ok):
+        with self._lock:
+            self._history.append((seconds, ok))
+        metrics.observe("grader_seconds", seconds, backend=self.name)
+        metrics.inc("grader_requests_total", backend=self.name,
+                    outcome="ok" if ok else "error")
+
+    def latency(self, quantile):
+        """The quantile of the recent successful latencies, or None without enough of them."""
+        with self._lock:
+            latencies = sorted(seconds for seconds, ok in self._history if ok)
+        if len(latencies) < ROUTER_MIN_SAMPLES:
+            return None
+        return latencies[min(len(latencies) - 1, int(quantile * len(latencies)))]
+
+    def error_rate(self):
+        with self._lock:
+            if len(self._history) < ROUTER_MIN_SAMPLES:
+                return 0.0
+            return sum(not ok for _, ok in self._history) / len(self._history)
+
+    def healthy(self):
+        """Below the error threshold, or due for a probe request."""
+        if self.error_rate() <= ROUTER_MAX_ERROR_RATE:
+            return True
+        with self._lock:
+            return time.monotonic() - self._last_attempt >= ROUTER_PROBE_SECONDS
+
+    def stats(self):
+        p50 = self.latency(0.5)
+        p95 = self.latency(0.95)
+        return {
+            "requests": len(self._history),
+            "p50": round(p50, 3) if p50 is not None else None,
+            "p95": round(p95, 3) if p95 is not None else None,
+            "error_rate": round(self.error_rate(), 3),
+        }
+
+
+def openai_backend(api_key, constrained):
+    return GraderBackend(
+        "openai", GRADING_MODEL,
+        CONSTRAINED_GRADING_PROMPT_VERSION if constrained else GRADING_PROMPT_VERSION,
+        lambda reference, answer, language: grade_translation(
+            reference, answer, api_key, language, constrained=constrained))
+
+
+def ollama_backend(api_key, constrained):
+    return GraderBackend(
+        "ollama", OLLAMA_GRADING_MODEL,
+        CONSTRAINED_OLLAMA_GRADING_PROMPT_VERSION if constrained else OLLAMA_GRADING_PROMPT_VERSION,
+        lambda reference, answer, language: ollama_grade_translation(
+            reference, answer, language, constrained=constrained))
+
+
+# Backend factories by name, called as factory(api_key, constrained)
+GRADER_BACKENDS = {
+    "openai": openai_backend,
+    "ollama": ollama_backend,
+}
+
+
+class GradingRouter:
+    """
+    Sends each grading request to the fastest healthy backend, by median
+    recent latency. Backends without enough history rank first, in the
+    configured order, so each is sampled before the latencies are compared.
+    A backend with `max_workers` requests already in flight ranks after the
+    others.
+
+    With `hedge`, if that backend hasn't answered its GRADING_HEDGE_QUANTILE
+    latency after the request started running, the same request also goes
+    to the next backend and whichever scores first wins. A request that
+    fails is retried on the next backend.
+
+    Every backend has its own thread pool, so requests stuck on a slow
+    backend, including hedges that lost, never hold up the others.
+
+    Args:
+        backends (List[GraderBackend]): The backends, in order of preference.
+        hedge (bool): Send hedged requests.
+        max_workers (int): Requests in flight at once per backend, hedges included.
+    """
+
+    def __init__(self, backends, hedge=GRADING_HEDGE, max_workers=8):
+        if not backends:
+            raise ValueError("[-] GradingRouter needs at least one backend.")
+        self.backends = list(backends)
+        self.hedge = hedge and len(self.backends) > 1
+        self.max_workers = max(1, max_workers)
+        self.hedged = 0
+        self.hedges_won = 0
+        # Requests submitted to each backend and not finished, queued ones included
+        self._in_flight = {backend.name: 0 for backend in self.backends}
+        self._stats_lock = threading.Lock()
+        self._executors = {
+            backend.name: ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix=f"grader-{backend.name}")
+            for backend in self.backends
+        }
+
+    def saturated(self, backend):
+        with self._stats_lock:
+            return self._in_flight[backend.name] >= self.max_workers
+
+    def ranked(self):
+        """The backends to try, healthy ones first, then free ones, fastest first."""
+        def key(item):
+            index, backend = item
+            p50 = backend.latency(0.5)
+            # Unsampled backends first, to build up their history
+            return (not backend.healthy(), self.saturated(backend),
+                    p50 if p50 is not None else 0.0, index)
+
+        return [backend for _, backend in sorted(enumerate(self.backends), key=key)]
+
+    def hedge_delay(self, backend):
+        latency = backend.latency(GRADING_HEDGE_QUANTILE)
+        if latency is None:
+            return GRADING_HEDGE_INITIAL_SECONDS
+        return max(GRADING_HEDGE_MIN_SECONDS, latency)
+
+    def _submit(self, backend, reference, answer, language):
+        """
+        Queue one request on the backend's pool. Returns the future and a
+        one-item list that receives the time the request starts running.
+        """
+        started = [None]
+
+        def run():
+            started[0] = time.monotonic()
+            return backend.grade(reference, answer, language)
+
+        with self._stats_lock:
+            self._in_flight[backend.name] += 1
+        future = self._executors[backend.name].submit(run)
+        future.add_done_callback(lambda _: self._finished(backend))
+        return future, started
+
+    def _finished(self, backend):
+        with self._stats_lock:
+            self._in_flight[backend.name] -= 1
+
+    def grade(self, reference, answer, language):
+        """
+        Grade one answer.
+
+        Returns:
+            (int, GraderBackend): The 0-5 score and the backend that gave it.
+
+        Raises:
+            Exception: The last backend's error, if every backend failed.
+        """
+        candidates = self.ranked()
+        if len(self.backends) == 1:
+            # Nothing to route or hedge to
+            return self.backends[0].grade(reference, answer, language), self.backends[0]
+
+        futures = {}
+        hedges = set()
+        error = None
+
+        def submit():
+            backend = candidates.pop(0)
+            future, started = self._submit(backend, reference, answer, language)
+            futures[future] = backend
+            return future, backend, started
+
+        primary_future, primary, primary_started = submit()
+        delay = self.hedge_delay(primary)
+        while futures:
+            timeout = None
+            can_hedge = (self.hedge and candidates and not hedges
+                         and primary_future in futures)
+            if can_hedge:
+                if primary_started[0] is None:
+                    # Still queued behind the backend's other requests
+                    timeout = HEDGE_POLL_SECONDS
+                else:
+                    timeout = max(0.0, primary_started[0] + delay - time.monotonic())
+            done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            if not done:
+                if primary_started[0] is None or time.monotonic() < primary_started[0] + delay:
+                    continue
+                # The primary is slower than usual: hedge on the next backend
+                _, backend, _ = submit()
+                hedges.add(backend)
+                with self._stats_lock:
+                    self.hedged += 1
+                metrics.inc("grader_hedges_total", backend=backend.name)
+                print(f"-> Grading on {primary.name} is slow, hedging on {backend.name}")
+                continue
+
+            for future in done:
+                backend = futures.pop(future)
+                try:
+                    score = future.result()
+                except Exception as ex:
+                    print(f"[-] Grading on {backend.name} failed: {ex}")
+                    error = ex
+                    continue
+                if backend in hedges:
+                    with self._stats_lock:
+                        self.hedges_won += 1
+                    metrics.inc("grader_hedges_won_total", backend=backend.name)
+                # A slower request still in flight finishes in the background,
+                # on its own backend's pool
+                return score, backend
+
+            if not futures and candidates:
+                # Every request so far failed, try the next backend
+                submit()
+
+        raise error
+
+    def stats(self):
+        return {
+            "backends": {backend.name: backend.stats() for backend in self.backends},
+            "hedged": self.hedged,
+            "hedges_won": self.hedges_won,
+        }
+
+    def close(self):
+        for executor in self._executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def build_grading_router(api_key, constrained, max_workers=8, names=None):
+    """
+    Create a GradingRouter over the backends named in GRADING_BACKENDS.
+
+    Args:
+        api_key (str): OpenAI API key.
+        constrained (bool): Use the constrained score output.
+        max_workers (int): Requests in flight at once per backend, hedges included.
+        names (List[str], optional): Backend names, instead of GRADING_BACKENDS.
+    """
+    names = names or GRADING_BACKENDS
+    unknown = [name for name in names if name not in GRADER_BACKENDS]
+    if unknown:
+        raise ValueError(
+            f"[-] Unknown grader backends {unknown}, expected some of {sorted(GRADER_BACKENDS)}.")
+    return GradingRouter([GRADER_BACKENDS[name](api_key, constrained) for name in names],
+                         max_workers=max_workers)
@@ -1,71 +1,406 @@
 import os
+import io
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 import smtplib
 import re
-import requests
+import json
+import hashlib
+from datetime import datetime, timedelta
+from collections import namedtuple
+import httpx
 from dotenv import load_dotenv
 
-import whisper
-from supabase import create_client
 # from supabase.storage import StorageException
 from sqlalchemy.exc import NoResultFound
-from ollama import Client
-from openai import OpenAI
 # import whisper
-import torch
 from langcodes import Language
 
-from models.schema import MockAnswers, MockQuestions, UserMocks, Subscriptions
+from metrics import metrics
+from clients import get_openai_client, get_supabase_client, get_ollama_client, get_http_client
+from models.schema import MockAnswers, MockQuestions, UserMocks, Subscriptions, EmailOutbox
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy import and_, or_, func, select, exists, tuple_, insert, update, values, column, String, Text, Integer, Boolean
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 # from sqlalchemy.orm import joinedload
 
 import warnings
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
+# Answer languages mapped to ISO 639-1 codes for the transcription engines
+LANG_MAP = {
+    "english": "en",
+    "hindi": "hi",
+    "mandarin": "zh",
+    "tamil": "ta",
+    "punjabi": "pa",
+    "sinhala": "si",
+    "nepali": "ne",
+    "spanish": "es",
+    "urdu": "ur"
+}
+
+GRADING_MODEL = "gpt-4o-mini"
+OLLAMA_GRADING_MODEL = os.getenv("OLLAMA_MODEL") or "llama3.2"
+# Ollama server, e.g. http://192.168.1.216:7000
+OLLAMA_HOST = os.getenv("OLLAMA_HOST") or "http://localhost:11434"
+
+# Structured output of the constrained grading mode: the reply can only be
+# {"score": <0-5>}, which fits in SCORE_MAX_TOKENS
+SCORE_SCHEMA = {
+    "type": "object",
+    "properties": {"score": {"type": "integer", "enum": [0, 1, 2, 3, 4, 5]}},
+    "required": ["score"],
+    "additionalProperties": False,
+}
+SCORE_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "translation_score", "strict": True, "schema": SCORE_SCHEMA},
+}
+SCORE_MAX_TOKENS = 10
+# Grading attempts that got no score from the model before an answer is
+# given up on. It then stays pending, with mock_answers.grading_failures
+# at this value, until someone looks at it.
+GRADING_MAX_FAILURES = int(os.getenv("GRADING_MAX_FAILURES") or "5")
+
+# OpenAI only caches prompt prefixes of at least this many tokens, so the
+# static system prefixes below must stay longer than this to be cached
+PROMPT_CACHE_MIN_TOKENS = 1024
+
+# Scoring criteria shared by the single and batched grading prompts
+GRADING_RUBRIC = """
+    The reference and the student answer are in the same language. The student
+    answer is a transcript of a spoken interpretation, so it has no punctuation
+    of its own and may contain filler words or self-corrections.
+
+    Compare based on:
+    1. Accuracy: Exact match of details, numbers, names, dates and quantities
+    2. Correctness: Precise meaning preservation, a faithful interpretation of the reference
+    3. Completeness: All essential information included
+    4. Grammar and consistency: Correct grammar in the language written, no mixing of languages
+    5. Clarity: Understandable to someone who only speaks that language
+
+    Mark down for:
+    - Omissions/additions
+    - Tone/emphasis changes
+    - Meaning-altering word choices
+    - Wrong or missing numbers, names, dates or units
+    - Words left in the source language where a translation exists
+    - Word count mismatch (-1 point if different)
+
+    Ignore only:
+    - Spacing, formatting and punctuation
+    - Capitalization (except proper nouns)
+    - Minor article usage if meaning intact
+    - Spelling variants and transcription errors that don't change the meaning
+    - Filler words ("um", "uh") and a phrase the student corrected themselves on
+
+    Score (0-5):
+    5: Perfect match. Every detail is there and the meaning is fully preserved.
+    4: 1-2 minor word variations. Synonyms or word order changes that don't affect correctness.
+    3: 3-4 minor or 1 moderate error. The general meaning is retained, but a detail
+       is softened, generalised or slightly wrong.
+    2: Multiple moderate or 1-2 major errors. A key detail is wrong or missing and the
+       meaning is distorted, but the answer shows some understanding of the reference.
+    1: Significant meaning alterations. Most of the content is missing or incorrect.
+    0: Incomprehensible/incorrect. No resemblance to the reference, an answer in another
+       language, or no answer at all.
+
+    A major error changes what the listener would do or believe: a wrong number,
+    dose, date, name, negation or instruction. A moderate error loses or changes a
+    detail without changing the overall message. A minor error is a word choice
+    that keeps the meaning. When in doubt between two scores, choose the lower one.
+
+    How to grade:
+    1. Split the reference into its units of meaning: who, what, when, where, how
+       much, conditions and instructions.
+    2. Look for each unit in the answer and note whether it is exact, a minor
+       variation, softened or generalised, wrong, or missing.
+    3. Note anything the answer adds that is not in the reference.
+    4. Classify every difference as minor, moderate or major as defined above, and
+       pick the score whose description matches them. A single major error caps the
+       score at 2, however good the rest of the answer is.
+    5. Judge the answer on its own: its length, confidence or fluency do not make up
+       for missing or wrong content, and a short answer that keeps every unit of
+       meaning is not marked down for being short.
+
+    Calibration examples, with the reason for each score. The same standards apply
+    in every language. The reasons are for guidance only: reply as instructed below.
+
+    Reference: Take two tablets every morning after breakfast for seven days.
+    Answer: Take two tablets each morning after breakfast for seven days.
+    Expected score: 5 (synonym only, meaning fully preserved)
+
+    Reference: Your appointment has been moved to Thursday the 14th at 3 pm.
+    Answer: Your appointment was moved to Thursday 14th at 3 in the afternoon.
+    Expected score: 5 (same details, different wording)
+
+    Reference: Please bring your passport and two recent photographs to the counter.
+    Answer: Please bring your passport and two photos to the counter.
+    Expected score: 4 (minor omission of "recent")
+
+    Reference: The school will be closed on Monday because of the public holiday.
+    Answer: The school is closed on Monday for the holiday.
+    Expected score: 4 (minor variations, "public" dropped)
+
+    Reference: If the pain gets worse or you develop a fever, go to the emergency department straight away.
+    Answer: If the pain gets worse, go to the emergency department.
+    Expected score: 3 (moderate omission of the fever condition and of the urgency)
+
+    Reference: The rent is due on the first of every month and late payments incur a fee of fifty dollars.
+    Answer: The rent is due every month and if you pay late there is a fee.
+    Expected score: 3 (due date and amount generalised, general meaning kept)
+
+    Reference: You must not drive for twenty-four hours after the procedure.
+    Answer: You can drive twenty-four hours after the procedure.
+    Expected score: 2 (the prohibition is lost, a major error, though the time is right)
+
+    Reference: The bus to the hospital leaves at 8:15 from platform 3, not platform 5.
+    Answer: The bus to the hospital leaves at 8:50 from platform 5.
+    Expected score: 2 (wrong time and wrong platform, two major errors)
+
+    Reference: Your application was approved, and the visa will be sent to you by post within ten working days.
+    Answer: The application is with the post office.
+    Expected score: 1 (approval, visa and timeline all missing or wrong)
+
+    Reference: Children under twelve must be accompanied by an adult at all times in the pool area.
+    Answer: The pool is open for all the children.
+    Expected score: 1 (the rule is reversed, almost nothing is kept)
+
+    Reference: The council will collect green waste every second Wednesday from next month.
+    Answer: I don't know, sorry.
+    Expected score: 0 (no translation of the reference)
+
+    Reference: Please sign both copies of the contract and return one of them to our office.
+    Answer: The weather will be sunny and warm tomorrow.
+    Expected score: 0 (no resemblance to the reference)
+
+    Reference: Mr Nguyen's flight from Melbourne lands at 6:40 tomorrow evening.
+    Answer: Mister Nguyen's flight from Melbourne arrives at 6:40 tomorrow evening.
+    Expected score: 5 (spelled-out title and a synonym, every detail kept)
+
+    Reference: The pharmacy can refill this prescription three more times before it expires in June.
+    Answer: The pharmacy can refill this prescription three more times, um, before it expires in June.
+    Expected score: 5 (a filler word is ignored)
+
+    Reference: Switch off the power at the meter box before you replace the broken light switch.
+    Answer: Turn the power off before you replace the light switch.
+    Expected score: 3 (where to switch it off and "broken" are lost, the instruction is kept)
+
+    Reference: The refund of 240 dollars will be paid into your bank account, not by cheque.
+    Answer: The refund of 420 dollars will be paid by cheque.
+    Expected score: 1 (the amount and the payment method are both wrong)
+"""
+
+# Revision of the grading prompts below, bumped with any change to them.
+# Part of the static system prefix, so a new revision also starts a new
+# prefix in the provider's prompt cache.
+GRADING_PROMPT_REVISION = "4"
+
+# Output instruction of the single-answer prompts, matching the free-text
+# reply or the {"score": <0-5>} one forced by SCORE_SCHEMA
+SCORE_OUTPUT = """
+    Return only numeric score (0-5).
+    """
+CONSTRAINED_SCORE_OUTPUT = """
+    Return only a JSON object of the form {"score": <score>} with an integer score (0-5).
+    """
+
+# Static system prefix of the single-answer grading requests: rubric, scale
+# and output instructions. It is sent byte-identical on every request so the
+# provider can cache it; everything that varies goes in GRADING_PROMPT.
+GRADING_SYSTEM_PROMPT_BASE = """
+    Grading prompt revision """ + GRADING_PROMPT_REVISION + """.
+    Evaluate a translation test comparing the reference and student answer in the given language.
+""" + GRADING_RUBRIC
+GRADING_SYSTEM_PROMPT = GRADING_SYSTEM_PROMPT_BASE + SCORE_OUTPUT
+CONSTRAINED_GRADING_SYSTEM_PROMPT = GRADING_SYSTEM_PROMPT_BASE + CONSTRAINED_SCORE_OUTPUT
+
+# Per-answer suffix, filled in with language, reference and answer
+GRADING_PROMPT = """
+    Language: {language}
+    Reference:
+    {reference}
+    Answer:
+    {answer}
+"""
+
+# Static system prefix of the batched grading requests
+BATCH_GRADING_SYSTEM_PROMPT = """
+    Grading prompt revision """ + GRADING_PROMPT_REVISION + """.
+    Evaluate numbered translation tests, each comparing a reference and student answer in the given language.
+    Grade every item on its own.
+""" + GRADING_RUBRIC + """
+    Return only a JSON object of the form {"scores": [<score>, ...]} with exactly one integer score (0-5) per item, in item order.
+    """
+
+# Batched suffix, filled in with count and the numbered items
+BATCH_GRADING_PROMPT = """
+    Evaluate these {count} translation tests.
+{items}"""
+
+BATCH_GRADING_ITEM = """
+    Item {number} ({language}):
+    Reference:
+    {reference}
+    Answer:
+    {answer}
+"""
+
+OLLAMA_GRADING_SYSTEM_PROMPT_BASE = """
+    You need to evaluate a user's translation test. You will be provided with two texts in the same language: a reference answer and a student's answer. 
+
+    Your task is to:
+    1. Compare the two texts based on **accuracy** (matching details and content), **correctness** (faithful interpretation of the reference), **grammar** and **consistency** in the language written (no mixing of languages).
+    2. Ignore differences in punctuation, spaces, spelling errors unless they affect the grammar, correctness or interpretation of the text.
+    3. Focus on how well the student's response matches the intended meaning and correctness of the reference text and how clear it is to someone who only speaks that language.
+    4. Only return the score, no explanation.
+    
+    Provide a score out of 5, where:
+    - 5 = Perfect match, fully accurate and correct interpretation.
+    - 4 = Very minor errors that don't affect overall correctness.
+    - 3 = Noticeable errors but the general meaning is retained.
+    - 2 = Significant errors that distort meaning but show some understanding.
+    - 1 = Poor understanding or largely incorrect.
+    - 0 = No resemblance.
+"""
+OLLAMA_GRADING_SYSTEM_PROMPT = OLLAMA_GRADING_SYSTEM_PROMPT_BASE + """
+    Return only the numeric score (0-5). DO NOT include any explanations or other text in your response. If you encounter an error just return a score of 0.
+    """
+CONSTRAINED_OLLAMA_GRADING_SYSTEM_PROMPT = OLLAMA_GRADING_SYSTEM_PROMPT_BASE + """
+    Return only a JSON object of the form {"score": <score>} with an integer score (0-5). DO NOT include any explanations or other text in your response. If you encounter an error just return a score of 0.
+    """
+
+# Ollama keeps the evaluated system prefix between requests to the same model
+OLLAMA_GRADING_PROMPT = GRADING_PROMPT
+
+# One graded answer to write back to MockAnswers
+MockAnswerResult = namedtuple("MockAnswerResult", [
+    "mock_question_id", "user_mock_id", "user_id", "transcript", "score", "is_correct", "mock_id"])
+
+# One pending answer with just the columns the grading pipeline needs
+PendingAnswer = namedtuple("PendingAnswer", [
+    "id", "created_on", "mock_question_id", "user_mock_id", "user_id", "audio_file_url",
+    "mock_id", "answer_language", "reference"])
+
+# Rows fetched per page by iter_mock_answers
+FETCH_PAGE_SIZE = 200
+
+# Outbox template of the result email, by passed
+RESULT_EMAIL_TEMPLATES = {True: "test_result_passed", False: "test_result_failed"}
+
+# Clerk Backend API, overridable with CLERK_API_URL (e.g. for a local stub)
+CLERK_API_URL = "https://api.clerk.dev"
+
+# Aggregated score of one pending user mock, from get_user_mock_totals
+UserMockTotal = namedtuple("UserMockTotal", [
+    "user_mock_id", "user_id", "mock_id", "total_score", "num_questions"])
+
+# Final result of one user mock: percentage score and pass/fail
+UserMockResult = namedtuple("UserMockResult", [
+    "user_mock_id", "user_id", "mock_id", "total_score", "passed"])
+
+
+def prompt_version(prompt):
+    """Short fingerprint of a prompt template, changes whenever its text does."""
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+
+
+GRADING_PROMPT_VERSION = prompt_version(GRADING_SYSTEM_PROMPT + GRADING_PROMPT)
+CONSTRAINED_GRADING_PROMPT_VERSION = prompt_version(
+    CONSTRAINED_GRADING_SYSTEM_PROMPT + GRADING_PROMPT + json.dumps(SCORE_RESPONSE_FORMAT))
+OLLAMA_GRADING_PROMPT_VERSION = prompt_version(
+    OLLAMA_GRADING_SYSTEM_PROMPT + OLLAMA_GRADING_PROMPT)
+CONSTRAINED_OLLAMA_GRADING_PROMPT_VERSION = prompt_version(
+    CONSTRAINED_OLLAMA_GRADING_SYSTEM_PROMPT + OLLAMA_GRADING_PROMPT + json.dumps(SCORE_SCHEMA))
+BATCH_GRADING_PROMPT_VERSION = prompt_version(
+    BATCH_GRADING_SYSTEM_PROMPT + BATCH_GRADING_PROMPT + BATCH_GRADING_ITEM)
+
+
+def record_grading_failures(session: Session, answer_ids):
+    """
+    Count one more failed grading attempt for each of the answers, so an
+    answer the model never gives a score for stops being retried after
+    GRADING_MAX_FAILURES runs.
+
+    Args:
+        session (Session): SQLAlchemy database session object.
+        answer_ids (Iterable[str]): IDs of the answers that got no score.
+
+    Returns:
+        List[str]: The IDs of the answers that reached GRADING_MAX_FAILURES.
+    """
+    answer_ids = list(answer_ids)
+    if not answer_ids:
+        return []
+    try:
+        rows = session.execute(
+            update(MockAnswers)
+            .where(MockAnswers.id.in_(answer_ids), MockAnswers.score == None)
+            .values(grading_failures=MockAnswers.grading_failures + 1)
+            .returning(MockAnswers.id, MockAnswers.grading_failures)
+            .execution_options(synchronize_session=False)
+        ).all()
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return [answer_id for answer_id, failures in rows if failures >= GRADING_MAX_FAILURES]
+
 
 def get_mock_question_count(session, mock_id):
     """Fetch the total number of questions for a given mock test."""
     return session.query(MockQuestions).filter(MockQuestions.mock_id == mock_id).count()
 
 
-def extract_score(ai_response) -> int:
+def check_score(score) -> int:
+    """
+    Validate one score from a grading reply.
+
+    Raises:
+        ValueError: If the score is not an integer (or digit string) in 0-5.
+    """
+    if isinstance(score, str) and score.strip().isdigit():
+        score = int(score)
+    if isinstance(score, bool) or not isinstance(score, int) or not 0 <= score <= 5:
+        raise ValueError(f"Invalid score in grading reply: {score!r}")
+    return score
+
+
+def parse_score(reply) -> int:
     """
-    Extracts a numeric score (0-5) from an AI response. Returns 0 if parsing fails.
+    Parse the reply of a single-answer grading request into a score. Accepts
+    the {"score": n} object of the constrained mode, a bare number ("4",
+    "4.", "4/5") on the first line, even if a comment follows on the next
+    ones, or a "score: 4" pattern in free text.
 
     Args:
-        ai_response (str or bytes): The response from the AI, which may contain just a number 
-                                    or additional text alongside the score.
+        reply (str or bytes): The model's reply.
 
     Returns:
-        int: The extracted score between 0 and 5, or 0 if invalid or parsing fails.
+        int: The score between 0 and 5.
+
+    Raises:
+        ValueError: If the reply holds no score between 0 and 5.
     """
-    try:
-        # Ensure the input is a string
-        if isinstance(ai_response, bytes):
-            ai_response = ai_response.decode("utf-8", errors="ignore")
-        elif not isinstance(ai_response, str):
-            print("-> Invalid input type, converting to empty string.")
-            ai_response = ""
-
-        # Try to parse the response as a standalone number
-        stripped_response = ai_response.strip()
-        if stripped_response.isdigit():
-            score = int(stripped_response)
-            return score if 0 <= score <= 5 else 0
-
-        # If not a standalone number, look for a "score: x" pattern
-        match = re.search(r"score\s*:\s*(\d+)", ai_response, re.IGNORECASE)
-        if match:
-            score = int(match.group(1))
-            return score if 0 <= score <= 5 else 0
-
-        # If no valid score found, return 0
-        return 0
-    except Exception as e:
-        print(f"-> Error extracting score: {e}")
-        return 0
+    if isinstance(reply, bytes):
+        reply = reply.decode("utf-8", errors="ignore")
+    if not isinstance(reply, str):
+        raise ValueError(f"Invalid grading reply type: {type(reply).__name__}")
+
+    stripped = reply.strip()
+    if stripped.startswith("{"):
+        try:
+            return check_score(json.loads(stripped)["score"])
+        except (TypeError, KeyError, json.JSONDecodeError) as e:
+            raise ValueError(f"Malformed grading reply: {e}")
+
+    first_line = stripped.split("\n", 1)[0].strip()
+    match = (re.fullmatch(r"(\d+)\s*(?:/\s*5)?\.?", first_line)
+             or re.search(r"score\s*:\s*(\d+)", stripped, re.IGNORECASE))
+    if not match:
+        raise ValueError(f"No score in grading reply: {stripped[:100]!r}")
+    return check_score(int(match.group(1)))
 
 
 def get_user_mocks(session: Session):
@@ -146,6 +481,422 @@ def fetch_mock_answers(session: Session):
     return results
 
 
+def _pending_answers_query():
+    """
+    Select the PendingAnswer columns of the mock_answers where transcript and
+    score are NULL, for users whose subscription has payment_required = False.
+    """
+    return select(
+        MockAnswers.id,
+        MockAnswers.created_on,
+        MockAnswers.mock_question_id,
+        MockAnswers.user_mock_id,
+        MockAnswers.user_id,
+        MockAnswers.audio_file_url,
+        MockQuestions.mock_id,
+        MockQuestions.answer_language,
+        MockQuestions.transcript,
+    ).join(
+        MockQuestions, MockAnswers.mock_question_id == MockQuestions.id
+    ).where(
+        MockAnswers.transcript == None,
+        MockAnswers.score == None,
+        MockAnswers.grading_failures < GRADING_MAX_FAILURES,
+        exists().where(
+            Subscriptions.user_id == MockAnswers.user_id,
+            Subscriptions.payment_required == False
+        )
+    )
+
+
+def iter_mock_answers(session: Session, page_size: int = FETCH_PAGE_SIZE, until: datetime = None):
+    """
+    Stream the mock_answers where transcript and score are NULL, for users
+    whose subscription has payment_required = False, in pages ordered by
+    (created_on, id) using keyset pagination.
+
+    Only the columns the grading pipeline uses are selected, and rows come
+    back as plain PendingAnswer tuples rather than ORM objects. Answers created
+    after the `until` watermark (the start of the call by default) are left
+    for the next run.
+
+    Args:
+        session (Session): SQLAlchemy database session object.
+        page_size (int): Rows fetched per query.
+        until (datetime, optional): Only answers created up to this time.
+
+    Yields:
+        PendingAnswer: One pending answer with its question's language and
+                       reference transcript.
+    """
+    if until is None:
+        until = datetime.utcnow()
+
+    base = _pending_answers_query()
+
+    # Answers without a created_on can't be ordered by it, page them by id last
+    pages = [
+        (base.where(MockAnswers.created_on <= until),
+         (MockAnswers.created_on, MockAnswers.id)),
+        (base.where(MockAnswers.created_on == None), (MockAnswers.id,)),
+    ]
+    for query, keys in pages:
+        last = None
+        while True:
+            page = query
+            if last is not None:
+                page = page.where(tuple_(*keys) > tuple_(*last))
+            rows = session.execute(page.order_by(*keys).limit(page_size)).all()
+            # End the read transaction so no snapshot is held between pages
+            session.commit()
+
+            for row in rows:
+                yield PendingAnswer(*row)
+            if len(rows) < page_size:
+                break
+            last = tuple(getattr(rows[-1], key.key) for key in keys)
+
+
+def claim_mock_answers(session: Session, worker_id: str, limit: int, lease_seconds: float, until: datetime = None,
+                       exclude=()):
+    """
+    Lease up to `limit` pending mock_answers to `worker_id`, oldest first, so
+    several grading workers can split the backlog.
+
+    Candidates are locked with SELECT ... FOR UPDATE SKIP LOCKED, so
+    concurrent claims never return the same answer, and answers leased to
+    another worker are skipped until the lease expires. An expired lease
+    (e.g. of a crashed worker) can be claimed again.
+
+    Args:
+        session (Session): SQLAlchemy database session object.
+        worker_id (str): Identifies the claiming worker.
+        limit (int): Most answers to claim.
+        lease_seconds (float): How long the answers stay leased.
+        until (datetime, optional): Only answers created up to this time.
+        exclude (Collection[str], optional): IDs of answers not to claim.
+
+    Returns:
+        List[PendingAnswer]: The claimed answers, ordered by (created_on, id).
+    """
+    now = datetime.utcnow()
+    if until is None:
+        until = now
+
+    candidates = _pending_answers_query().with_only_columns(MockAnswers.id).where(
+        or_(MockAnswers.created_on <= until, MockAnswers.created_on == None),
+        or_(MockAnswers.lease_expires_on == None,
+            MockAnswers.lease_expires_on < now),
+    ).order_by(
+        MockAnswers.created_on, MockAnswers.id
+    ).limit(limit).with_for_update(of=MockAnswers, skip_locked=True)
+    if exclude:
+        candidates = candidates.where(MockAnswers.id.not_in(list(exclude)))
+
+    try:
+        claimed = session.execute(
+            update(MockAnswers)
+            .where(MockAnswers.id.in_(candidates.scalar_subquery()))
+            .values(lease_owner=worker_id,
+                    lease_expires_on=now + timedelta(seconds=lease_seconds))
+            .returning(MockAnswers.id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+
+        rows = []
+        if claimed:
+            rows = session.execute(
+                _pending_answers_query()
+                .where(MockAnswers.id.in_(claimed))
+                .order_by(MockAnswers.created_on, MockAnswers.id)
+            ).all()
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+    return [PendingAnswer(*row) for row in rows]
+
+
+def iter_claimed_mock_answers(session: Session, worker_id: str, claim_size: int, lease_seconds: float, until: datetime = None,
+                              exclude=()):
+    """
+    Stream pending mock_answers like iter_mock_answers, claiming them in
+    leased batches of `claim_size` with claim_mock_answers as they are
+    consumed. `lease_seconds` should cover grading a whole batch. Answers
+    in `exclude` are never claimed.
+
+    Yields:
+        PendingAnswer: One answer leased to `worker_id`.
+    """
+    if until is None:
+        until = datetime.utcnow()
+
+    while True:
+        rows = claim_mock_answers(
+            session, worker_id, claim_size, lease_seconds, until, exclude)
+        if not rows:
+            return
+        yield from rows
+
+
+def release_mock_answers(session: Session, worker_id: str):
+    """
+    Drop the leases `worker_id` holds on answers it didn't grade, so other
+    workers can claim them right away instead of waiting for the expiry.
+
+    Args:
+        session (Session): SQLAlchemy database session object.
+        worker_id (str): The worker whose leases to release.
+
+    Returns:
+        int: The number of leases released.
+    """
+    try:
+        result = session.execute(
+            update(MockAnswers)
+            .where(MockAnswers.lease_owner == worker_id, MockAnswers.transcript == None)
+            .values(lease_owner=None, lease_expires_on=None)
+            .execution_options(synchronize_session=False)
+        )
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return result.rowcount
+
+
+def get_user_mock_totals(session: Session, user_mock_ids=None, complete_only: bool = False):
+    """
+    Fetch, in one aggregate query, every UserMocks record that get_user_mocks
+    would return together with the sum of its answer scores and the number of
+    questions in its mock.
+
+    Args:
+        session (Session): SQLAlchemy database session object.
+        user_mock_ids (List[str], optional): Only these user mocks.
+        complete_only (bool): Only user mocks with a scored answer for every
+                              question of their mock and none still pending.
+
+    Returns:
+        List[UserMockTotal]: One row per pending user mock.
+    """
+    if user_mock_ids is not None and not user_mock_ids:
+        return []
+
+    try:
+        total_score = select(
+            func.coalesce(func.sum(MockAnswers.score), 0)
+        ).where(
+            MockAnswers.user_mock_id == UserMocks.id
+        ).scalar_subquery()
+
+        # Counted per pending user mock through ix_mock_questions_mock_id,
+        # rather than aggregating the questions of every mock
+        num_questions = select(
+            func.count(MockQuestions.id)
+        ).where(
+            MockQuestions.mock_id == UserMocks.mock_id
+        ).scalar_subquery()
+
+        query = select(
+            UserMocks.id,
+            UserMocks.user_id,
+            UserMocks.mock_id,
+            total_score,
+            num_questions,
+        ).where(
+            UserMocks.total_score.is_(None),
+            UserMocks.attempts == 0,
+            exists().where(
+                Subscriptions.user_id == UserMocks.user_id,
+                Subscriptions.payment_required == False
+            )
+        )
+
+        if user_mock_ids is not None:
+            query = query.where(UserMocks.id.in_(user_mock_ids))
+
+        if complete_only:
+            scored_answers = select(
+                func.count(MockAnswers.id)
+            ).where(
+                MockAnswers.user_mock_id == UserMocks.id,
+                MockAnswers.score.is_not(None)
+            ).scalar_subquery()
+
+            query = query.where(
+                num_questions > 0,
+                scored_answers >= num_questions,
+                ~exists().where(
+                    MockAnswers.user_mock_id == UserMocks.id,
+                    MockAnswers.score.is_(None)
+                )
+            )
+
+        rows = session.execute(query).all()
+        return [UserMockTotal(*row) for row in rows]
+    except Exception as e:
+        session.rollback()
+        print(f"-> Error fetching UserMocks totals: {e}")
+        return []
+
+
+def compute_mock_result(total_score: int, num_questions: int):
+    """
+    Turn a user mock's summed answer scores into its final result.
+
+    Args:
+        total_score (int): Sum of the 0-5 answer scores.
+        num_questions (int): Number of questions in the mock.
+
+    Returns:
+        tuple: (percentage, passed), passed meaning more than 50%.
+    """
+    # Avoid division by zero
+    if num_questions > 0:
+        percentage = round((total_score / (5 * num_questions)) * 100)
+    else:
+        percentage = 0  # Default to 0 if no questions exist
+
+    passed = percentage > 50  # Determine pass/fail based on 50% threshold
+    return percentage, passed
+
+
+def bulk_finalise_user_mocks(session: Session, results, queue_emails: bool = True):
+    """
+    Record the final result of many user mocks with one UPDATE ... RETURNING:
+    increment attempts and set total_score and passed.
+
+    Only records still pending (attempts = 0 and total_score NULL) are
+    updated, so finalising the same user mock twice is a no-op. With
+    `queue_emails`, the result emails of the updated records are added to
+    the outbox in the same transaction.
+
+    Args:
+        session (Session): SQLAlchemy session.
+        results (List[UserMockResult]): The results to record.
+        queue_emails (bool): Queue a result email per updated record.
+
+    Returns:
+        List[UserMockResult]: The results that were applied, as returned by
+                              the database.
+
+    Raises:
+        Exception: Any database error, after rolling back.
+    """
+    if not results:
+        return []
+
+    pending = and_(UserMocks.attempts == 0, UserMocks.total_score.is_(None))
+    returning = (UserMocks.id, UserMocks.user_id, UserMocks.mock_id,
+                 UserMocks.total_score, UserMocks.passed)
+
+    try:
+        if session.get_bind().dialect.name == "postgresql":
+            v = values(
+                column("id", String),
+                column("user_id", String),
+                column("total_score", Integer),
+                column("passed", Boolean),
+                name="v",
+            ).data([(r.user_mock_id, r.user_id, r.total_score, r.passed) for r in results])
+
+            rows = session.execute(
+                update(UserMocks)
+                .where(UserMocks.id == v.c.id, UserMocks.user_id == v.c.user_id, pending)
+                .values(
+                    attempts=UserMocks.attempts + 1,
+                    total_score=v.c.total_score,
+                    passed=v.c.passed,
+                )
+                .returning(*returning)
+                .execution_options(synchronize_session=False)
+            ).all()
+        else:
+            rows = []
+            for r in results:
+                rows += session.execute(
+                    update(UserMocks)
+                    .where(UserMocks.id == r.user_mock_id, UserMocks.user_id == r.user_id, pending)
+                    .values(
+                        attempts=UserMocks.attempts + 1,
+                        total_score=r.total_score,
+                        passed=r.passed,
+                    )
+                    .returning(*returning)
+                    .execution_options(synchronize_session=False)
+                ).all()
+
+        updated = [UserMockResult(*row) for row in rows]
+        if queue_emails:
+            enqueue_result_emails(session, updated)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+    return updated
+
+
+def enqueue_result_emails(session: Session, results):
+    """
+    Add a result email for each finalised user mock to the email outbox,
+    without committing. User mocks that already have one are skipped.
+
+    Args:
+        session (Session): SQLAlchemy session.
+        results (List[UserMockResult]): The finalised user mocks.
+    """
+    if not results:
+        return
+
+    rows = [{
+        "user_mock_id": r.user_mock_id,
+        "user_id": r.user_id,
+        "mock_id": r.mock_id,
+        "template": RESULT_EMAIL_TEMPLATES[bool(r.passed)],
+        "status": "pending",
+        "attempts": 0,
+    } for r in results]
+
+    if session.get_bind().dialect.name == "postgresql":
+        session.execute(
+            pg_insert(EmailOutbox).values(rows)
+            .on_conflict_do_nothing(index_elements=[EmailOutbox.user_mock_id])
+        )
+    else:
+        existing = set(session.execute(
+            select(EmailOutbox.user_mock_id).where(
+                EmailOutbox.user_mock_id.in_([row["user_mock_id"] for row in rows]))
+        ).scalars())
+        rows = [row for row in rows if row["user_mock_id"] not in existing]
+        if rows:
+            session.execute(insert(EmailOutbox), rows)
+
+
+def get_pending_audio_file_names(session: Session):
+    """
+    Fetch the audio file names of every mock_answer still waiting to be
+    graded (transcript and score NULL).
+
+    Args:
+        session (Session): SQLAlchemy database session object.
+
+    Returns:
+        set: The file names, as used in the download folder.
+    """
+    rows = session.execute(
+        select(MockAnswers.audio_file_url).where(
+            MockAnswers.transcript == None,
+            MockAnswers.score == None
+        )
+    ).scalars()
+    names = {url.strip().split('/')[-1] for url in rows if url}
+    session.commit()
+    return names
+
+
 def update_user_mock(session: Session, user_mock_id: str, user_id: str, attempts_increment: int, total_score: int, passed: bool):
     """
     Update the UserMocks record with the given parameters.
@@ -229,6 +980,93 @@ def update_mock_answer(session: Session, mock_question_id: str, user_mock_id: st
         return False
 
 
+def bulk_update_mock_answers(session: Session, results):
+    """
+    Update many MockAnswers records in one statement and one commit.
+
+    On Postgres this is a single UPDATE ... FROM (VALUES ...) RETURNING; other
+    databases fall back to one UPDATE per row inside a single transaction.
+    Only answers that are still ungraded are written, so when a lease expired
+    and another worker graded the same answer, the first write wins.
+
+    Args:
+        session (Session): SQLAlchemy session.
+        results (List[MockAnswerResult]): The graded answers to write.
+
+    Returns:
+        List[bool]: For each result, True if a matching record was updated,
+                    False if none was found or it was already graded.
+
+    Raises:
+        Exception: Any database error, after rolling back the whole batch.
+    """
+    if not results:
+        return []
+
+    def key(row):
+        return (row.mock_question_id, row.user_mock_id, row.user_id)
+
+    try:
+        if session.get_bind().dialect.name == "postgresql":
+            v = values(
+                column("mock_question_id", String),
+                column("user_mock_id", String),
+                column("user_id", String),
+                column("transcript", Text),
+                column("score", Integer),
+                column("is_correct", Boolean),
+                column("mock_id", String),
+                name="v",
+            ).data([tuple(row) for row in results])
+
+            updated = session.execute(
+                update(MockAnswers)
+                .where(
+                    MockAnswers.mock_question_id == v.c.mock_question_id,
+                    MockAnswers.user_mock_id == v.c.user_mock_id,
+                    MockAnswers.user_id == v.c.user_id,
+                    MockAnswers.score.is_(None),
+                )
+                .values(
+                    transcript=v.c.transcript,
+                    score=v.c.score,
+                    is_correct=v.c.is_correct,
+                    mock_id=v.c.mock_id,
+                )
+                .returning(MockAnswers.mock_question_id, MockAnswers.user_mock_id, MockAnswers.user_id)
+                .execution_options(synchronize_session=False)
+            ).all()
+            found = {tuple(row) for row in updated}
+        else:
+            found = set()
+            for row in results:
+                result = session.execute(
+                    update(MockAnswers)
+                    .where(
+                        MockAnswers.mock_question_id == row.mock_question_id,
+                        MockAnswers.user_mock_id == row.user_mock_id,
+                        MockAnswers.user_id == row.user_id,
+                        MockAnswers.score.is_(None),
+                    )
+                    .values(
+                        transcript=row.transcript,
+                        score=row.score,
+                        is_correct=row.is_correct,
+                        mock_id=row.mock_id,
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                if result.rowcount:
+                    found.add(key(row))
+
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+    return [key(row) in found for row in results]
+
+
 def delete_supabase_file(path_prefix: str, file_name: str, bucket_name: str, supabase_url: str, supabase_key: str) -> bool:
     """
     Delete a file from a Supabase storage bucket.
@@ -244,8 +1082,8 @@ def delete_supabase_file(path_prefix: str, file_name: str, bucket_name: str, sup
         bool: True if the file is deleted successfully, False otherwise.
     """
     try:
-        # I-> nitialize Supabase client
-        supabase = create_client(supabase_url, supabase_key)
+        # Shared Supabase client
+        supabase = get_supabase_client(supabase_url, supabase_key)
 
         # Construct the full file path
         file_path = f"{path_prefix}/{file_name}".lstrip("/")
@@ -269,7 +1107,80 @@ def delete_supabase_file(path_prefix: str, file_name: str, bucket_name: str, sup
         return False
 
 
-def grade_translation(reference, answer, api_key, language):
+def delete_supabase_files(paths, bucket_name: str, supabase_url: str, supabase_key: str, chunk_size: int = 100):
+    """
+    Delete many files from a Supabase storage bucket with one remove() call
+    per chunk of paths.
+
+    Args:
+        paths (List[str]): Full paths of the files within the bucket.
+        bucket_name (str): The name of the Supabase storage bucket.
+        supabase_url (str): The Supabase project URL.
+        supabase_key (str): The Supabase project API key.
+        chunk_size (int): Paths sent per remove() call.
+
+    Returns:
+        set: The paths that were deleted. Paths missing from it failed or
+             didn't exist.
+    """
+    supabase = get_supabase_client(supabase_url, supabase_key)
+    deleted = set()
+
+    for start in range(0, len(paths), chunk_size):
+        chunk = paths[start:start + chunk_size]
+        try:
+            response = supabase.storage.from_(bucket_name).remove(chunk)
+            deleted.update(obj.get("name") for obj in response or [])
+        except Exception as e:
+            print(
+                f"-> Supabase Storage Exception deleting {len(chunk)} files: {e}")
+
+    return deleted & set(paths)
+
+
+def record_token_usage(completion, model):
+    """
+    Count and report the prompt, cached prompt and completion tokens of a
+    chat completion.
+    """
+    usage = getattr(completion, "usage", None)
+    if usage is None:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = getattr(details, "cached_tokens", None) or 0
+    record_tokens(usage.prompt_tokens, usage.completion_tokens, model, cached_tokens)
+
+
+def record_tokens(prompt_tokens, completion_tokens, model, cached_tokens=0):
+    """
+    Count the tokens of one LLM call, in totals and per-call histograms.
+    `cached_tokens` is the part of the prompt served from the provider's
+    prompt cache.
+    """
+    print(
+        f"-> {model} tokens: {prompt_tokens} prompt ({cached_tokens} cached), {completion_tokens} completion")
+    for kind, tokens in (("prompt", prompt_tokens), ("cached", cached_tokens),
+                         ("completion", completion_tokens)):
+        metrics.inc("llm_tokens_total", tokens, kind=kind, model=model)
+        metrics.observe("llm_call_tokens", tokens, kind=kind, model=model)
+
+
+def grade_translation(reference, answer, api_key, language, constrained=False):
+    """
+    Grade a transcribed answer against the reference with the OpenAI model.
+
+    Args:
+        reference (str): The reference transcript.
+        answer (str): The student's transcribed answer.
+        api_key (str): OpenAI API key.
+        language (str): The answer language.
+        constrained (bool): Force a {"score": <0-5>} reply through structured
+                            output and cap it at SCORE_MAX_TOKENS, instead of
+                            free text.
+
+    Returns:
+        str: The model's reply, for parse_score.
+    """
 
     # prompt = f"""
     # You need to evaluate a user's translation test. You will be provided with two texts in {language}: a reference answer and a student's answer.
@@ -296,114 +1207,172 @@ def grade_translation(reference, answer, api_key, language):
     # Return only the numeric score (0-5). Do not include any explanations or other text in your response.
     # """
 
-    prompt = f"""
-    Evaluate this {language} translation test comparing reference and student answer:
-    Reference:
-    {reference}
-    Answer:
-    {answer}
-
-    Compare based on:
-    1. Accuracy: Exact match of details, numbers, names
-    2. Correctness: Precise meaning preservation
-    3. Completeness: All essential information included
-
-    Mark down for:
-    - Omissions/additions
-    - Tone/emphasis changes
-    - Meaning-altering word choices
-    - Word count mismatch (-1 point if different) 
-
-    Ignore only:
-    - Spacing, formatting
-    - Capitalization (except proper nouns)
-    - Minor article usage if meaning intact
+    prompt = GRADING_PROMPT.format(
+        language=language, reference=reference, answer=answer)
+    client = get_openai_client(api_key)
 
-    Score (0-5):
-    5: Perfect match
-    4: 1-2 minor word variations
-    3: 3-4 minor or 1 moderate error
-    2: Multiple moderate or 1-2 major errors
-    1: Significant meaning alterations
-    0: Incomprehensible/incorrect
-
-    Return only numeric score (0-5).
-    """
-    client = OpenAI(
-        api_key=api_key
-    )
+    options = {}
+    if constrained:
+        options = dict(response_format=SCORE_RESPONSE_FORMAT,
+                       max_tokens=SCORE_MAX_TOKENS, temperature=0)
 
     chat_completion = client.chat.completions.create(
         messages=[
+            {
+                "role": "system",
+                "content": CONSTRAINED_GRADING_SYSTEM_PROMPT if constrained else GRADING_SYSTEM_PROMPT
+            },
             {
                 "role": "user",
                 "content": prompt
             }
         ],
-        model="gpt-4o-mini",
+        model=GRADING_MODEL,
+        **options,
     )
+    record_token_usage(chat_completion, GRADING_MODEL)
     return chat_completion.choices[0].message.content
 
 
-def ollama_grade_translation(reference, answer, language):
+def parse_batch_scores(content, count):
+    """
+    Parse and validate the JSON reply of a batched grading request.
 
-    prompt = f"""
-    You need to evaluate a user's translation test. You will be provided with two texts in {language}: a reference answer and a student's answer. 
+    Args:
+        content (str): The model's reply.
+        count (int): Number of items that were graded.
 
-    Reference:
-    {reference}
+    Returns:
+        List[int]: One score (0-5) per item, in item order.
 
-    Answer:
-    {answer}
+    Raises:
+        ValueError: If the reply is not valid JSON, has the wrong number of
+                    scores or a score outside 0-5.
+    """
+    try:
+        scores = json.loads(content)["scores"]
+    except (TypeError, KeyError, json.JSONDecodeError) as e:
+        raise ValueError(f"Malformed batch grading reply: {e}")
 
-    Your task is to:
-    1. Compare the two texts based on **accuracy** (matching details and content), **correctness** (faithful interpretation of the reference), **grammar** and **consistency** in the language written (no mixing of languages).
-    2. Ignore differences in punctuation, spaces, spelling errors unless they affect the grammar, correctness or interpretation of the text.
-    3. Focus on how well the student's response matches the intended meaning and correctness of the reference text and how clear it is to someone who only speaks that language.
-    4. Only return the score, no explanation.
-    
-    Provide a score out of 5, where:
-    - 5 = Perfect match, fully accurate and correct interpretation.
-    - 4 = Very minor errors that don't affect overall correctness.
-    - 3 = Noticeable errors but the general meaning is retained.
-    - 2 = Significant errors that distort meaning but show some understanding.
-    - 1 = Poor understanding or largely incorrect.
-    - 0 = No resemblance.
+    if not isinstance(scores, list) or len(scores) != count:
+        raise ValueError(
+            f"Expected {count} scores in batch grading reply, got {scores!r}")
 
-    Return only the numeric score (0-5). DO NOT include any explanations or other text in your response. If you encounter an error just return a score of 0.
+    return [check_score(score) for score in scores]
+
+
+def grade_translations_batch(items, api_key):
+    """
+    Grades several answers in a single chat completion, sending the rubric once.
+
+    Args:
+        items (List[tuple]): (reference, answer, language) for each answer.
+        api_key (str): OpenAI API key.
+
+    Returns:
+        List[int]: One score (0-5) per item, in item order.
+
+    Raises:
+        ValueError: If the reply doesn't hold exactly one valid score per item.
     """
-    client = Client(
-        #    host='http://192.168.1.216:7000',
-        host='http://localhost:11434'
+    prompt = BATCH_GRADING_PROMPT.format(
+        count=len(items),
+        items="".join(
+            BATCH_GRADING_ITEM.format(
+                number=n, language=language, reference=reference, answer=answer)
+            for n, (reference, answer, language) in enumerate(items, start=1)
+        ),
     )
-    response = client.chat(model='llama3.2', messages=[
+    client = get_openai_client(api_key)
+
+    chat_completion = client.chat.completions.create(
+        messages=[
+            {
+                "role": "system",
+                "content": BATCH_GRADING_SYSTEM_PROMPT
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ],
+        model=GRADING_MODEL,
+        response_format={"type": "json_object"},
+    )
+    record_token_usage(chat_completion, GRADING_MODEL)
+    return parse_batch_scores(chat_completion.choices[0].message.content, len(items))
+
+
+def ollama_grade_translation(reference, answer, language, constrained=False):
+    """
+    Grade a transcribed answer with the local Ollama model. With
+    `constrained`, the reply is forced to {"score": <0-5>} like
+    grade_translation's. Returns the reply, for parse_score.
+    """
+    prompt = OLLAMA_GRADING_PROMPT.format(
+        language=language, reference=reference, answer=answer)
+    client = get_ollama_client(host=OLLAMA_HOST)
+
+    options = {}
+    if constrained:
+        options = dict(format=SCORE_SCHEMA,
+                       options={"num_predict": SCORE_MAX_TOKENS, "temperature": 0})
+
+    response = client.chat(model=OLLAMA_GRADING_MODEL, messages=[
+        {
+            'role': 'system',
+            'content': CONSTRAINED_OLLAMA_GRADING_SYSTEM_PROMPT if constrained else OLLAMA_GRADING_SYSTEM_PROMPT
+        },
         {
             'role': 'user',
             'content': prompt
         },
-    ])
+    ], **options)
+    if response.prompt_eval_count is not None:
+        record_tokens(response.prompt_eval_count,
+                      response.eval_count or 0, OLLAMA_GRADING_MODEL)
     # or access fields directly from the response object
     return response.message.content
 
 
 def transcribe(audio_file, language):
     """
-    Transcribes the given audio data using the Whisper speech recognition model.
+    Transcribes the given audio data using the local Whisper worker pool, so
+    the model is loaded once per worker instead of once per call. With
+    WHISPER_BATCH_SIZE above 1, clips are batched across calling threads.
 
     Args:
-        audio_np: The audio data to be transcribed.
+        audio_file: The audio file path, the audio file's bytes, or
+                    decoded 16 kHz mono samples.
+        language: The spoken language in the audio.
 
     Returns:
         str: The transcribed text.
     """
-    # Load Whisper Model
-    model = whisper.load_model("small")  # or base
-    torch.cuda.empty_cache()
-    # stt = whisper.load_model("small")  # or base
-    # Set fp16=True if using a GPU
-    # audio = model.load_audio(audio_file)
-    result = model.transcribe(audio_file, fp16=True, language=language)
-    return result
+    from whisper_pool import get_whisper_pool, get_whisper_batcher, WHISPER_BATCH_SIZE
+
+    iso_lang = LANG_MAP.get(language.lower(), "en")
+    if WHISPER_BATCH_SIZE > 1:
+        # Decoded together with other clips in the same language
+        return get_whisper_batcher().transcribe(audio_file, iso_lang)
+    return get_whisper_pool().transcribe(audio_file, iso_lang)
+
+
+def named_audio_buffer(data: bytes, file_name: str):
+    """
+    Wrap downloaded audio bytes in an in-memory file object. The name is kept
+    because the transcription API uses its extension to detect the format.
+
+    Args:
+        data (bytes): The audio file contents.
+        file_name (str): The original file name, e.g. "answer.webm".
+
+    Returns:
+        io.BytesIO: A readable file object with a `name` attribute.
+    """
+    buffer = io.BytesIO(data)
+    buffer.name = file_name
+    return buffer
 
 
 def openai_transcribe(audio_file, language, api_key):
@@ -411,42 +1380,34 @@ def openai_transcribe(audio_file, language, api_key):
     Transcribes the given audio data using the Whisper speech recognition model.
 
     Args:
-        audio_file: The audio file path to be transcribed.
+        audio_file: The audio file path, or a named in-memory file object
+                    such as one from named_audio_buffer().
         language: The spoken language in the audio.
         api_key: OpenAI API key.
 
     Returns:
         str: The transcribed text.
     """
-    client = OpenAI(api_key=api_key)
-
-    # Use a dictionary for language mapping
-    lang_map = {
-        "english": "en",
-        "hindi": "hi",
-        "mandarin": "zh",
-        "tamil": "ta",
-        "punjabi": "pa",
-        "sinhala": "si",
-        "nepali": "ne",
-        "spanish": "es",
-        "urdu": "ur"
-    }
-    iso_lang = lang_map.get(language.lower(), "en")
+    client = get_openai_client(api_key)
+
+    iso_lang = LANG_MAP.get(language.lower(), "en")
 
     lang = Language.get(iso_lang).is_valid()
     print(f"-> Language: {language} {iso_lang} {lang}")
-    audio_file = open(audio_file, "rb")
-    if lang is True:
-        translation = client.audio.transcriptions.create(
-            model="whisper-1",
-            language=iso_lang,
-            file=audio_file,
-        )
+    options = {"language": iso_lang} if lang is True else {}
+
+    if isinstance(audio_file, (str, os.PathLike)):
+        with open(audio_file, "rb") as f:
+            translation = client.audio.transcriptions.create(
+                model="whisper-1",
+                file=f,
+                **options
+            )
     else:
         translation = client.audio.transcriptions.create(
             model="whisper-1",
             file=audio_file,
+            **options
         )
     print("-> Translation ", translation.text)
     return translation.text
@@ -543,10 +1504,11 @@ def send_test_result_email_sendgrid(recipient_email: str, link: str, passed: boo
     }
 
     try:
-        response = requests.post(sendgrid_url, json=payload, headers=headers)
+        response = get_http_client().post(
+            sendgrid_url, json=payload, headers=headers)
         response.raise_for_status()
         print(f"Email successfully sent to {recipient_email} via SendGrid")
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"[-] Error sending email via SendGrid: {e}")
 
 
@@ -637,13 +1599,54 @@ def send_test_result_email(recipient_email: str, link: str, passed: bool):
     }
 
     try:
-        response = requests.post(postmark_url, json=payload, headers=headers)
+        response = get_http_client().post(
+            postmark_url, json=payload, headers=headers)
         response.raise_for_status()  # Raise an error if request fails
         print(f"Email successfully sent to {recipient_email}")
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"[-] Error sending email: {e}")
 
 
+def fetch_users_from_clerk(user_ids):
+    """
+    Fetches several users from the Clerk API in one request, using the user
+    list endpoint filtered by user ID.
+
+    Args:
+        user_ids (List[str]): The IDs of the users to fetch, at most 500.
+
+    Returns:
+        dict: User data keyed by user ID. Users that don't exist are missing.
+
+    Raises:
+        httpx.HTTPError: If the request fails.
+    """
+    # Load environment variables
+    load_dotenv()
+
+    CLERK_SECRET_KEY = os.getenv("CLERK_SECRET_KEY")
+    if not CLERK_SECRET_KEY:
+        raise ValueError("CLERK_SECRET_KEY environment variable is not set.")
+
+    clerk_api_url = f"{os.getenv('CLERK_API_URL') or CLERK_API_URL}/v1/users"
+    params = [("user_id", user_id) for user_id in user_ids]
+    params.append(("limit", len(user_ids)))
+
+    response = get_http_client().get(clerk_api_url, params=params, headers={
+        "Authorization": f"Bearer {CLERK_SECRET_KEY}"})
+    response.raise_for_status()
+    return {user["id"]: user for user in response.json()}
+
+
+def primary_email_address(user):
+    """Return the user's primary email address from Clerk user data, or None."""
+    addresses = (user or {}).get("email_addresses") or []
+    for address in addresses:
+        if address.get("id") == user.get("primary_email_address_id"):
+            return address.get("email_address")
+    return addresses[0].get("email_address") if addresses else None
+
+
 def fetch_user_from_clerk(user_id):
     """
     Fetches user data from Clerk API using the provided user ID.
@@ -663,12 +1666,12 @@ def fetch_user_from_clerk(user_id):
         raise ValueError("CLERK_SECRET_KEY environment variable is not set.")
 
     # Define the Clerk API URL
-    clerk_api_url = f"https://api.clerk.dev/v1/users/{user_id}"
+    clerk_api_url = f"{os.getenv('CLERK_API_URL') or CLERK_API_URL}/v1/users/{user_id}"
 
     try:
         # Make a GET request to fetch user data
-        response = requests.get(clerk_api_url, headers={
-                                "Authorization": f"Bearer {CLERK_SECRET_KEY}"})
+        response = get_http_client().get(clerk_api_url, headers={
+            "Authorization": f"Bearer {CLERK_SECRET_KEY}"})
 
         # Check if the request was successful
         if response.status_code == 200:
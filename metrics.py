@@ -0,0 +1,203 @@
+import os
+import json
+import time
+import random
+import threading
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 1 records timers, counters and histograms; 0 makes every call a no-op
+METRICS = (os.getenv("METRICS") or "0") == "1"
+# Where <job>.prom (for the node_exporter textfile collector) and the per-run
+# <job>-<timestamp>.json summaries are written
+METRICS_DIR = os.getenv("METRICS_DIR") or ".cache/metrics"
+METRICS_PREFIX = "grading_"
+
+# Samples kept per histogram; past that a uniform reservoir sample is kept
+HISTOGRAM_SAMPLES = 10000
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """Count, sum and a bounded reservoir of samples for quantiles."""
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.samples = []
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        if len(self.samples) < HISTOGRAM_SAMPLES:
+            self.samples.append(value)
+        else:
+            slot = random.randrange(self.count)
+            if slot < HISTOGRAM_SAMPLES:
+                self.samples[slot] = value
+
+    def quantiles(self):
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {q: 0.0 for q in QUANTILES}
+        return {q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+                for q in QUANTILES}
+
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, **extra):
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+class Metrics:
+    """
+    In-process metrics registry: counters and histograms keyed by name and
+    labels. Safe to use from several threads.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        """Add `value` to a counter."""
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """Record one sample in a histogram."""
+        key = (name, _labels_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, stage):
+        """
+        Time a block as one sample of stage_seconds{stage=...}. An exception
+        escaping the block also counts in errors_total{stage=...}.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.inc("errors_total", stage=stage)
+            raise
+        finally:
+            self.observe("stage_seconds", time.perf_counter() - started, stage=stage)
+
+    def summary(self):
+        """Return every counter and histogram as a JSON-serialisable dict."""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (h.count, h.sum, h.quantiles())
+                          for key, h in self._histograms.items()}
+
+        return {
+            "started": datetime.utcfromtimestamp(self.started).isoformat() + "Z",
+            "elapsed_seconds": round(time.time() - self.started, 3),
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(counters.items())
+            ],
+            "histograms": [
+                {"name": name, "labels": dict(labels), "count": count,
+                 "sum": round(total, 6),
+                 **{f"p{int(q * 100)}": round(v, 6) for q, v in quantiles.items()}}
+                for (name, labels), (count, total, quantiles) in sorted(histograms.items())
+            ],
+        }
+
+    def prometheus(self, job):
+        """Render the metrics in the Prometheus text exposition format."""
+        summary = self.summary()
+        lines = []
+        typed = set()
+
+        def declare(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        for counter in summary["counters"]:
+            name = METRICS_PREFIX + counter["name"]
+            declare(name, "counter")
+            lines.append(
+                f"{name}{_format_labels(counter['labels'].items(), job=job)} {counter['value']}")
+
+        for histogram in summary["histograms"]:
+            name = METRICS_PREFIX + histogram["name"]
+            labels = histogram["labels"].items()
+            declare(name, "summary")
+            for q in QUANTILES:
+                lines.append(
+                    f"{name}{_format_labels(labels, job=job, quantile=q)} {histogram[f'p{int(q * 100)}']}")
+            lines.append(f"{name}_sum{_format_labels(labels, job=job)} {histogram['sum']}")
+            lines.append(f"{name}_count{_format_labels(labels, job=job)} {histogram['count']}")
+
+        name = METRICS_PREFIX + "last_run_timestamp_seconds"
+        declare(name, "gauge")
+        lines.append(f"{name}{_format_labels([], job=job)} {time.time():.0f}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, job, summary=True):
+        """
+        Write METRICS_DIR/<job>.prom and, with `summary`, a JSON summary of
+        the run. Returns the path of the JSON summary, if written.
+        """
+        os.makedirs(METRICS_DIR, exist_ok=True)
+
+        prom_path = os.path.join(METRICS_DIR, f"{job}.prom")
+        tmp_path = f"{prom_path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.prometheus(job))
+        # Replaced atomically so the collector never reads a partial file
+        os.replace(tmp_path, prom_path)
+
+        if not summary:
+            return None
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+        json_path = os.path.join(METRICS_DIR, f"{job}-{stamp}.json")
+        with open(json_path, "w") as f:
+            json.dump({"job": job, **self.summary()}, f, indent=2)
+        print(f"[+] Metrics written to {prom_path} and {json_path}")
+        return json_path
+
+
+class NullMetrics:
+    """Stand-in used when METRICS is off; every call does nothing."""
+
+    _timer = nullcontext()
+
+    def inc(self, name, value=1, **labels):
+        pass
+
+    def observe(self, name, value, **labels):
+        pass
+
+    def timer(self, stage):
+        return self._timer
+
+    def summary(self):
+        return {}
+
+    def export(self, job, summary=True):
+        return None
+
+
+metrics = Metrics() if METRICS else NullMetrics()
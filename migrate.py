@@ -0,0 +1,129 @@
+import os
+import re
+import argparse
+from datetime import datetime
+
+from sqlalchemy import create_engine, text
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+DATABASE_URL = os.getenv("POSTGRES_URL")
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), "migrations")
+# First line of a migration that must run outside a transaction, e.g. for
+# CREATE INDEX CONCURRENTLY. Its statements are run and committed one by one.
+NO_TRANSACTION = "-- migrate: no-transaction"
+# pg_advisory_lock key held while migrating, so concurrent runs queue up
+MIGRATION_LOCK_ID = 72100022
+
+MIGRATIONS_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name VARCHAR NOT NULL,
+    applied_on TIMESTAMP NOT NULL
+)
+"""
+
+
+def list_migrations(path=MIGRATIONS_DIR):
+    """
+    Return the migrations in `path` as (version, name, file path), ordered by
+    version. Files are named <version>_<name>.sql, e.g. 0002_grading_indexes.sql.
+    """
+    migrations = []
+    for file_name in os.listdir(path):
+        match = re.fullmatch(r"(\d+)_(\w+)\.sql", file_name)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2),
+                               os.path.join(path, file_name)))
+    return sorted(migrations)
+
+
+def _statements(sql):
+    """Split a migration into statements. Only for files without $$ bodies."""
+    sql = "\n".join(line for line in sql.splitlines()
+                    if not line.lstrip().startswith("--"))
+    return [statement.strip() for statement in sql.split(";") if statement.strip()]
+
+
+def apply_migrations(engine, path=MIGRATIONS_DIR):
+    """
+    Apply the migrations in `path` that haven't been applied to the database
+    yet, in version order, recording each in schema_migrations.
+
+    A migration runs in its own transaction, unless its first line is
+    NO_TRANSACTION; such a migration should be safe to rerun if it stops
+    halfway.
+
+    Args:
+        engine (Engine): Engine of the (Postgres) database to migrate.
+        path (str): Folder of the migration files.
+
+    Returns:
+        List[str]: The file names of the migrations applied.
+    """
+    applied = []
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+        try:
+            conn.execute(text(MIGRATIONS_TABLE_SQL))
+            done = set(conn.execute(
+                text("SELECT version FROM schema_migrations")).scalars())
+
+            for version, name, file_path in list_migrations(path):
+                if version in done:
+                    continue
+                with open(file_path) as f:
+                    sql = f.read()
+
+                print(f"[+] Applying migration {version:04d} {name}")
+                record = text(
+                    "INSERT INTO schema_migrations (version, name, applied_on) "
+                    "VALUES (:version, :name, :applied_on)")
+                params = {"version": version, "name": name,
+                          "applied_on": datetime.utcnow()}
+
+                if sql.startswith(NO_TRANSACTION):
+                    for statement in _statements(sql):
+                        conn.exec_driver_sql(statement)
+                    conn.execute(record, params)
+                else:
+                    with engine.begin() as tx:
+                        tx.exec_driver_sql(sql)
+                        tx.execute(record, params)
+                applied.append(os.path.basename(file_path))
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATION_LOCK_ID})
+
+    return applied
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Apply the pending migrations in migrations/ to POSTGRES_URL.")
+    parser.add_argument("--list", action="store_true",
+                        help="Only list the migrations and whether they are applied")
+    args = parser.parse_args()
+
+    engine = create_engine(DATABASE_URL)
+    if args.list:
+        with engine.connect() as conn:
+            conn.execute(text(MIGRATIONS_TABLE_SQL))
+            conn.commit()
+            done = set(conn.execute(
+                text("SELECT version FROM schema_migrations")).scalars())
+        for version, name, _ in list_migrations():
+            print(f"{version:04d} {name}: {'applied' if version in done else 'pending'}")
+        return
+
+    applied = apply_migrations(engine)
+    print(f"[+] {len(applied)} migrations applied")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
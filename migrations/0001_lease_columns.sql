@@ -0,0 +1,4 @@
+-- Grading leases, see helpers.claim_mock_answers
+ALTER TABLE mock_answers
+    ADD COLUMN IF NOT EXISTS lease_owner VARCHAR,
+    ADD COLUMN IF NOT EXISTS lease_expires_on TIMESTAMP;
@@ -0,0 +1,33 @@
+-- migrate: no-transaction
+-- Built CONCURRENTLY so graders and the app keep writing while they build.
+-- Each statement commits on its own; IF NOT EXISTS makes a rerun after a
+-- failure pick up where it stopped (drop an index left INVALID first).
+
+-- Pending answers (fetch_mock_answers, iter_mock_answers, claim_mock_answers,
+-- get_pending_audio_file_names), in the (created_on, id) order they are paged in
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_mock_answers_pending
+    ON mock_answers (created_on, id)
+    WHERE transcript IS NULL AND score IS NULL;
+
+-- Answers of a user mock with their scores (get_mock_answers_by_user_mock_id,
+-- the totals and completeness checks of get_user_mock_totals)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_mock_answers_user_mock_id
+    ON mock_answers (user_mock_id, score);
+
+-- Leases held by a worker (release_mock_answers)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_mock_answers_lease_owner
+    ON mock_answers (lease_owner)
+    WHERE lease_owner IS NOT NULL;
+
+-- Questions of a mock (get_mock_question_count, get_user_mock_totals)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_mock_questions_mock_id
+    ON mock_questions (mock_id);
+
+-- User mocks waiting for a result (get_user_mocks, get_user_mock_totals)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_user_mocks_pending
+    ON user_mocks (user_id, id)
+    WHERE total_score IS NULL AND attempts = 0;
+
+-- Declared on the model, but not created on databases that predate it
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_subscriptions_user_id
+    ON subscriptions (user_id);
@@ -0,0 +1,4 @@
+-- Grading attempts that got no score, see helpers.record_grading_failures.
+-- A constant default doesn't rewrite the table.
+ALTER TABLE mock_answers
+    ADD COLUMN IF NOT EXISTS grading_failures INTEGER NOT NULL DEFAULT 0;
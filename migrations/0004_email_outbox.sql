@@ -0,0 +1,19 @@
+-- Result emails waiting to be sent, see email_outbox.py
+CREATE TABLE IF NOT EXISTS email_outbox (
+    id SERIAL PRIMARY KEY,
+    -- One result email per user mock
+    user_mock_id VARCHAR NOT NULL UNIQUE REFERENCES user_mocks (id),
+    user_id VARCHAR NOT NULL,
+    mock_id VARCHAR NOT NULL,
+    template VARCHAR NOT NULL,
+    status VARCHAR NOT NULL,
+    attempts INTEGER NOT NULL,
+    next_attempt_on TIMESTAMP,
+    last_error TEXT,
+    sent_on TIMESTAMP,
+    created_on TIMESTAMP
+);
+
+-- Due emails (claim_pending_emails)
+CREATE INDEX IF NOT EXISTS ix_email_outbox_pending
+    ON email_outbox (status, next_attempt_on);
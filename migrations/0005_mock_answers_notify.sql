@@ -0,0 +1,14 @@
+-- Wakes grading_daemon.py, which LISTENs on mock_answers_inserted, on
+-- every new answer. DROP + CREATE rather than CREATE OR REPLACE TRIGGER,
+-- which needs Postgres 14.
+CREATE OR REPLACE FUNCTION notify_mock_answer_inserted() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('mock_answers_inserted', NEW.id);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS mock_answers_notify_inserted ON mock_answers;
+CREATE TRIGGER mock_answers_notify_inserted
+    AFTER INSERT ON mock_answers
+    FOR EACH ROW EXECUTE PROCEDURE notify_mock_answer_inserted();
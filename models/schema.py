@@ -6,9 +6,11 @@ from sqlalchemy import (
     DateTime,
     ForeignKey,
     Text,
+    Index,
+    text,
 )
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 from datetime import datetime
 
 Base = declarative_base()
@@ -47,6 +49,11 @@ class MockQuestions(Base):
     mock = relationship("Mocks", back_populates="mock_questions")
     mock_answers = relationship("MockAnswers", back_populates="mock_question")
 
+    # Indexes are added to existing databases by migrations/, see migrate.py
+    __table_args__ = (
+        Index("ix_mock_questions_mock_id", "mock_id"),
+    )
+
 
 class MockAnswers(Base):
     __tablename__ = "mock_answers"
@@ -65,12 +72,29 @@ class MockAnswers(Base):
     expires_on = Column(DateTime)
     created_on = Column(DateTime, default=datetime.utcnow)
     mock_id = Column(String, ForeignKey("mocks.id"))
+    # Grading lease, see helpers.claim_mock_answers. Deferred so nothing else
+    # selects them and they only need to exist when leases are enabled.
+    lease_owner = deferred(Column(String, nullable=True))
+    lease_expires_on = deferred(Column(DateTime, nullable=True))
+    # Grading attempts that got no score, see helpers.record_grading_failures
+    grading_failures = deferred(Column(Integer, nullable=False, default=0, server_default="0"))
 
     mock_question = relationship(
         "MockQuestions", back_populates="mock_answers")
     mock = relationship("Mocks", back_populates="mock_answers")
     user_mock = relationship("UserMocks", back_populates="mock_answers")
 
+    __table_args__ = (
+        # Answers waiting to be graded, in the order they are paged in
+        Index("ix_mock_answers_pending", "created_on", "id",
+              postgresql_where=text("transcript IS NULL AND score IS NULL"),
+              sqlite_where=text("transcript IS NULL AND score IS NULL")),
+        Index("ix_mock_answers_user_mock_id", "user_mock_id", "score"),
+        Index("ix_mock_answers_lease_owner", "lease_owner",
+              postgresql_where=text("lease_owner IS NOT NULL"),
+              sqlite_where=text("lease_owner IS NOT NULL")),
+    )
+
 
 class UserMocks(Base):
     __tablename__ = "user_mocks"
@@ -95,6 +119,13 @@ class UserMocks(Base):
     # One-to-many relationship with MockAnswers
     mock_answers = relationship("MockAnswers", back_populates="user_mock")
 
+    __table_args__ = (
+        # User mocks waiting for their result
+        Index("ix_user_mocks_pending", "user_id", "id",
+              postgresql_where=text("total_score IS NULL AND attempts = 0"),
+              sqlite_where=text("total_score IS NULL AND attempts = 0")),
+    )
+
 
 class Subscriptions(Base):
     __tablename__ = 'subscriptions'
@@ -106,3 +137,25 @@ class Subscriptions(Base):
     payment_required = Column(Boolean, default=False)
     expires_on = Column(DateTime, nullable=True)
     created_on = Column(DateTime)
+
+
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    # One result email per user mock
+    user_mock_id = Column(String, ForeignKey("user_mocks.id"),
+                          nullable=False, unique=True)
+    user_id = Column(String, nullable=False)
+    mock_id = Column(String, nullable=False)
+    template = Column(String, nullable=False)  # e.g. "test_result_passed"
+    status = Column(String, nullable=False, default="pending")  # pending, sent or failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_on = Column(DateTime, nullable=True)  # Retry not before
+    last_error = Column(Text, nullable=True)
+    sent_on = Column(DateTime, nullable=True)
+    created_on = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_email_outbox_pending", "status", "next_attempt_on"),
+    )
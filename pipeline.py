@@ -0,0 +1,120 @@
+import queue
+import threading
+
+
+# Marker pushed through a stage queue to tell its workers to exit
+_STOP = object()
+
+
+class Stage:
+    """
+    A single step of a grading pipeline.
+
+    Args:
+        name (str): Stage name used in log lines.
+        func (callable): Called as func(item, state). Returns True to hand the
+                         item to the next stage, False to drop it.
+        workers (int): Number of worker threads running this stage.
+        setup (callable, optional): Called once per worker thread; the return
+                                    value is passed to func as `state`.
+        teardown (callable, optional): Called with the worker's state on exit.
+    """
+
+    def __init__(self, name, func, workers=1, setup=None, teardown=None):
+        self.name = name
+        self.func = func
+        self.workers = max(1, int(workers))
+        self.setup = setup
+        self.teardown = teardown
+
+
+def run_pipeline(items, stages, max_in_flight=1, queue_size=None):
+    """
+    Push items through a sequence of stages, each with its own pool of worker
+    threads connected by bounded queues.
+
+    At most `max_in_flight` items are inside the pipeline at any time, and a
+    full queue blocks the stage feeding it, so a slow stage applies
+    backpressure to everything upstream. An item whose stage returns False or
+    raises is dropped without affecting the other items.
+
+    Args:
+        items (iterable): Work items, consumed lazily.
+        stages (List[Stage]): The stages, in order.
+        max_in_flight (int): Maximum number of items being processed at once.
+        queue_size (int, optional): Capacity of each inter-stage queue.
+                                    Defaults to max_in_flight.
+
+    Returns:
+        int: Number of items that passed every stage.
+    """
+    max_in_flight = max(1, int(max_in_flight))
+    queue_size = queue_size or max_in_flight
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+    in_flight = threading.BoundedSemaphore(max_in_flight)
+    lock = threading.Lock()
+    remaining = [stage.workers for stage in stages]
+    completed = [0]
+
+    def worker(index):
+        stage = stages[index]
+        state = None
+        ready = True
+        if stage.setup:
+            try:
+                state = stage.setup()
+            except Exception as ex:
+                # Keep draining the queue so upstream stages never block
+                print(f"[-] Error starting stage {stage.name}: {ex}")
+                ready = False
+        try:
+            while True:
+                item = queues[index].get()
+                if item is _STOP:
+                    break
+
+                try:
+                    ok = ready and stage.func(item, state)
+                except Exception as ex:
+                    print(f"[-] Unhandled error in stage {stage.name}: {ex}")
+                    ok = False
+
+                if ok and index + 1 < len(stages):
+                    queues[index + 1].put(item)
+                    continue
+
+                if ok:
+                    with lock:
+                        completed[0] += 1
+                in_flight.release()
+        finally:
+            if stage.teardown and ready:
+                stage.teardown(state)
+
+            # The last worker of a stage to exit shuts down the next stage
+            with lock:
+                remaining[index] -= 1
+                last = remaining[index] == 0
+            if last and index + 1 < len(stages):
+                for _ in range(stages[index + 1].workers):
+                    queues[index + 1].put(_STOP)
+
+    threads = []
+    for index, stage in enumerate(stages):
+        for n in range(stage.workers):
+            thread = threading.Thread(
+                target=worker, args=(index,), name=f"{stage.name}-{n}", daemon=True)
+            thread.start()
+            threads.append(thread)
+
+    try:
+        for item in items:
+            in_flight.acquire()
+            queues[0].put(item)
+    finally:
+        for _ in range(stages[0].workers):
+            queues[0].put(_STOP)
+        for thread in threads:
+            thread.join()
+
+    return completed[0]
@@ -7,6 +7,11 @@ cd /home/gojira/Desktop/oberoi.io/naati/code/tasks/
 
 source venv/bin/activate
 
+# Apply pending schema migrations
+echo "Running migrate..." 
+python3 migrate.py
+echo "Finished migrate at $(date)" 
+
 # Run grade_tests
 echo "Running grade_tests" 
 python3 grade_tests.py
@@ -17,6 +22,11 @@ echo "Running finalise_grading..."
 python3 finalise_grading.py
 echo "Finished finalise_grading at $(date)" 
 
+# Send the queued result emails
+echo "Running email_outbox..." 
+python3 email_outbox.py
+echo "Finished email_outbox at $(date)" 
+
 deactivate
 
 echo "Grading process completed at $(date)" 
@@ -0,0 +1,83 @@
+"""
+A local stand-in for SendGrid's mail/send endpoint. Accepts requests the way
+SendGrid does (202, no body), prints a line per request and optionally
+appends every request to a JSONL file, so email_outbox.py can be run
+without sending real email:
+
+    python testing/sendgrid_stub.py --port 8025 --log sent.jsonl
+    SENDGRID_API_URL=http://localhost:8025 python email_outbox.py
+
+--fail-rate and --latency make it return 503s and answer slowly.
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MAX_PERSONALIZATIONS = 1000
+
+
+def make_handler(fail_rate, latency, log_path):
+    log_lock = threading.Lock()
+
+    class SendGridStub(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            time.sleep(latency)
+
+            if self.path != "/v3/mail/send":
+                return self._reply(404, {"errors": [{"message": "Not found"}]})
+            if not self.headers.get("Authorization", "").startswith("Bearer "):
+                return self._reply(401, {"errors": [{"message": "Unauthorized"}]})
+            if random.random() < fail_rate:
+                return self._reply(503, {"errors": [{"message": "Injected failure"}]})
+
+            try:
+                payload = json.loads(body)
+                personalizations = payload["personalizations"]
+            except (ValueError, KeyError):
+                return self._reply(400, {"errors": [{"message": "Bad payload"}]})
+            if not 1 <= len(personalizations) <= MAX_PERSONALIZATIONS:
+                return self._reply(400, {"errors": [{
+                    "message": f"personalizations must hold 1 to {MAX_PERSONALIZATIONS} items"}]})
+
+            print(
+                f"-> mail/send: {len(personalizations)} recipients, subject {payload.get('subject')!r}")
+            if log_path:
+                with log_lock, open(log_path, "a") as f:
+                    f.write(json.dumps(payload) + "\n")
+            self._reply(202)
+
+        def _reply(self, status, body=None):
+            data = json.dumps(body).encode() if body is not None else b""
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return SendGridStub
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--fail-rate", type=float, default=0.0,
+                        help="Fraction of requests answered with a 503")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Seconds to wait before answering")
+    parser.add_argument("--log", help="Append every accepted request to this JSONL file")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", args.port), make_handler(args.fail_rate, args.latency, args.log))
+    print(f"[+] SendGrid stub listening on http://127.0.0.1:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
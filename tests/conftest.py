@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from models.schema import Base, Mocks, MockQuestions, MockAnswers, UserMocks, Subscriptions
+
+
+@pytest.fixture
+def session(tmp_path):
+    """A session on a fresh SQLite database with the full schema."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'grading.sqlite3'}")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def seed_user_mock(session, number, scores, questions=None, language="English"):
+    """
+    Add user mock number `number` of a mock with `questions` questions, a
+    paid-up subscription for its user and one answer per score in `scores`
+    (None for a pending answer). Returns the user mock ID.
+    """
+    started = datetime.utcnow() - timedelta(hours=1)
+    questions = questions or len(scores)
+    mock_id, user_id, user_mock_id = f"mock-{number}", f"user_{number}", f"um-{number}"
+    session.add(Mocks(id=mock_id, name=mock_id, description="", time_duration=20,
+                      no_of_qa=questions, language=language))
+    for n in range(questions):
+        session.add(MockQuestions(id=f"{mock_id}-q{n}", mock_id=mock_id, audio_file_url="",
+                                  order=n + 1, transcript=f"Reference {n}", answer_language="Hindi"))
+    session.add(Subscriptions(id=f"sub-{number}", user_id=user_id, mocks_available=5,
+                              mocks_used=1, payment_required=False, created_on=started))
+    session.add(UserMocks(id=user_mock_id, mock_id=mock_id, user_id=user_id,
+                          attempts=0, created_on=started))
+    for n, score in enumerate(scores):
+        session.add(MockAnswers(
+            id=f"ans-{number}-{n}", mock_question_id=f"{mock_id}-q{n}", user_mock_id=user_mock_id,
+            user_id=user_id, audio_file_url=f"answers/{user_mock_id}-{n}.webm", mock_id=mock_id,
+            transcript=None if score is None else "Transcript", score=score,
+            is_correct=None if score is None else score >= 3,
+            created_on=started + timedelta(seconds=number * 10 + n)))
+    session.commit()
+    return user_mock_id
+
+
+@pytest.fixture
+def add_user_mock(session):
+    """Seed user mocks with seed_user_mock, numbered from 1."""
+    count = 0
+
+    def add(scores, questions=None, language="English"):
+        nonlocal count
+        count += 1
+        return seed_user_mock(session, count, scores, questions, language)
+
+    return add
@@ -0,0 +1,38 @@
+from sqlalchemy import select
+
+import answer_writer
+from answer_writer import MockAnswerWriter
+from helpers import MockAnswerResult
+from models.schema import MockAnswers
+
+
+def result(user_mock_id, n, score):
+    mock_id = user_mock_id.replace("um-", "mock-")
+    return MockAnswerResult(f"{mock_id}-q{n}", user_mock_id, user_mock_id.replace("um-", "user_"),
+                            f"transcript {score}", score, score >= 3, mock_id)
+
+
+def test_failed_batch_is_written_one_by_one(session, add_user_mock, monkeypatch):
+    user_mock_id = add_user_mock([None, None, None])
+    bulk_update_mock_answers = answer_writer.bulk_update_mock_answers
+
+    def fail_on_bad_row(session, results):
+        if any(row.transcript == "transcript 1" for row in results):
+            raise RuntimeError("bad row")
+        return bulk_update_mock_answers(session, results)
+
+    monkeypatch.setattr(answer_writer, "bulk_update_mock_answers", fail_on_bad_row)
+    flushed = []
+    writer = MockAnswerWriter(lambda: session, batch_size=10, flush_interval=60,
+                              on_flushed=lambda context, ok: flushed.append((context, ok)))
+    for n, score in enumerate([4, 1, 5]):
+        writer.add(result(user_mock_id, n, score), context=n)
+    assert writer.flush() == 2
+    writer.close()
+
+    assert flushed == [(0, True), (1, False), (2, True)]
+    assert (writer.written, writer.missing, writer.failed) == (2, 0, 1)
+    scores = session.execute(
+        select(MockAnswers.id, MockAnswers.score).order_by(MockAnswers.id)).all()
+    assert [tuple(row) for row in scores] == [
+        ("ans-1-0", 4), ("ans-1-1", None), ("ans-1-2", 5)]
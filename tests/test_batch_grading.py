@@ -0,0 +1,60 @@
+from types import SimpleNamespace
+
+import pytest
+
+import grade_tests
+from cache import GradingCache
+from grade_tests import AnswerJob, GradingContext, grade_group
+from grading_router import GraderBackend, GradingRouter
+from helpers import parse_batch_scores
+
+
+@pytest.mark.parametrize("reply, scores", [
+    ('{"scores": [4, 0, 5]}', [4, 0, 5]),
+    ('{"scores": ["3", 2, "1"]}', [3, 2, 1]),
+])
+def test_parse_batch_scores(reply, scores):
+    assert parse_batch_scores(reply, 3) == scores
+
+
+@pytest.mark.parametrize("reply", [
+    "4, 0, 5", '{"score": [4, 0, 5]}', '{"scores": [4, 0]}', '{"scores": [4, 0, 6]}',
+    '{"scores": [4, true, 5]}', '{"scores": "4, 0, 5"}', "null",
+])
+def test_parse_batch_scores_rejects_malformed_replies(reply):
+    with pytest.raises(ValueError):
+        parse_batch_scores(reply, 3)
+
+
+def test_malformed_batch_reply_falls_back_to_grading_one_by_one(tmp_path, monkeypatch):
+    monkeypatch.setattr(grade_tests, "GRADING_BATCH", True)
+    batches = []
+
+    def grade_translations_batch(items, api_key):
+        batches.append(items)
+        return parse_batch_scores('{"scores": [4]}', len(items))
+
+    monkeypatch.setattr(grade_tests, "grade_translations_batch", grade_translations_batch)
+
+    def grade(reference, answer, language):
+        return "no score" if answer == "unscorable" else str(len(answer) % 6)
+
+    ctx = GradingContext(None, None, GradingCache(tmp_path / "cache.sqlite3"), None, None)
+    ctx.router = GradingRouter([GraderBackend("single", "m", "v", grade)], max_workers=2)
+    group = []
+    for n, transcription in enumerate(["four", "three", "unscorable"]):
+        job = AnswerJob(n, SimpleNamespace(id=f"ans-{n}", user_mock_id="um-1", answer_language="hindi",
+                                           reference=f"Reference {n}"))
+        job.file_name, job.transcription = f"ans-{n}.webm", transcription
+        group.append(job)
+
+    try:
+        assert grade_group(group, ctx)
+    finally:
+        ctx.router.close()
+
+    assert len(batches) == 1 and len(batches[0]) == 3
+    # The answers that got a score carry on, the one without is dropped and counted
+    assert [(job.row.id, job.score, job.is_correct) for job in group] == [
+        ("ans-0", 4, True), ("ans-1", 5, True)]
+    assert ctx.no_score == {"ans-2"}
@@ -0,0 +1,62 @@
+import os
+import time
+
+from download_cache import DownloadCache, DOWNLOAD_TMP_MAX_AGE_SECONDS
+
+
+def age(cache, file_name, seconds):
+    """Make `file_name` look last used `seconds` ago."""
+    used = time.time() - seconds
+    os.utime(cache.path(file_name), (used, used))
+
+
+def test_least_recently_used_files_are_evicted_over_the_file_cap(tmp_path):
+    cache = DownloadCache(str(tmp_path), max_bytes=10_000, max_files=3)
+    for n in range(3):
+        cache.put(f"a{n}.webm", b"x" * 10)
+        age(cache, f"a{n}.webm", 100 - n * 10)
+    # Reading the oldest file makes it the most recently used
+    assert cache.get("a0.webm") == b"x" * 10
+
+    cache.put("a3.webm", b"x" * 10)
+    assert sorted(os.listdir(tmp_path)) == ["a0.webm", "a2.webm", "a3.webm"]
+    assert cache.stats() == {"reused": 1, "evicted": 1}
+
+
+def test_file_just_written_is_kept_over_the_size_cap(tmp_path):
+    cache = DownloadCache(str(tmp_path), max_bytes=100, max_files=10)
+    cache.put("small.webm", b"x" * 40)
+    age(cache, "small.webm", 60)
+
+    cache.put("large.webm", b"x" * 200)
+    assert os.listdir(tmp_path) == ["large.webm"]
+    assert cache.get("small.webm") is None
+
+
+def test_cleanup_keeps_only_pending_answers(tmp_path):
+    cache = DownloadCache(str(tmp_path), max_bytes=10_000, max_files=10)
+    for file_name in ("pending.webm", "graded.webm"):
+        cache.put(file_name, b"x")
+
+    cache.cleanup({"pending.webm"})
+    assert os.listdir(tmp_path) == ["pending.webm"]
+
+
+def test_cleanup_leaves_recent_writes_of_other_processes(tmp_path):
+    cache = DownloadCache(str(tmp_path), max_bytes=10_000, max_files=10)
+    other = os.getpid() + 1
+    for name in (f"recent.webm.{other}-1.part", f"abandoned.webm.{other}-1.part",
+                 f"own.webm.{os.getpid()}-1.part"):
+        (tmp_path / name).write_bytes(b"x")
+    age(cache, f"abandoned.webm.{other}-1.part", DOWNLOAD_TMP_MAX_AGE_SECONDS + 60)
+
+    cache.cleanup(set())
+    assert os.listdir(tmp_path) == [f"recent.webm.{other}-1.part"]
+
+
+def test_cache_without_a_folder_does_nothing():
+    cache = DownloadCache(None)
+    assert cache.put("a.webm", b"x") is None
+    assert cache.get("a.webm") is None
+    cache.discard("a.webm")
+    cache.cleanup(set())
@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+from sqlalchemy import select, update
+
+import email_outbox
+from email_outbox import ResultEmailSender
+from helpers import enqueue_result_emails, UserMockResult
+from models.schema import EmailOutbox
+
+
+class Directory:
+    """Gives every user an address, except those in `unknown`."""
+
+    def __init__(self, unknown=()):
+        self.unknown = set(unknown)
+
+    def resolve(self, user_ids):
+        return {user_id: None if user_id in self.unknown else f"{user_id}@example.com"
+                for user_id in user_ids}
+
+
+def outbox(session):
+    session.expire_all()
+    return session.execute(select(EmailOutbox).order_by(EmailOutbox.user_mock_id)).scalars().all()
+
+
+def make_due(session):
+    session.execute(update(EmailOutbox).values(next_attempt_on=datetime.utcnow() - timedelta(seconds=1)))
+    session.commit()
+
+
+@pytest.fixture
+def queued(session, add_user_mock):
+    """Two finalised user mocks with their result emails queued."""
+    results = [UserMockResult(add_user_mock([4, 5]), "user_1", "mock-1", 90, True),
+               UserMockResult(add_user_mock([1, 0]), "user_2", "mock-2", 10, False)]
+    enqueue_result_emails(session, results)
+    session.commit()
+    return results
+
+
+def test_result_email_is_queued_once_per_user_mock(session, queued):
+    enqueue_result_emails(session, queued)
+    session.commit()
+
+    assert [(row.user_mock_id, row.template, row.status) for row in outbox(session)] == [
+        ("um-1", "test_result_passed", "pending"), ("um-2", "test_result_failed", "pending")]
+
+
+def test_failed_sends_are_retried_with_backoff(session, queued, monkeypatch):
+    monkeypatch.setattr(email_outbox, "EMAIL_RETRY_SECONDS", 60)
+    sender = ResultEmailSender(Directory(), api_key="test")
+    posted = []
+
+    def post(template, batch):
+        posted.append([row.user_mock_id for row, _ in batch])
+        if len(posted) <= 2:
+            raise httpx.ConnectError("SendGrid is down")
+
+    monkeypatch.setattr(sender, "_post", post)
+    started = datetime.utcnow()
+    assert sender.send_pending(session) == 0
+    rows = outbox(session)
+    assert [(row.status, row.attempts) for row in rows] == [("pending", 1), ("pending", 1)]
+    assert all(row.next_attempt_on >= started + timedelta(seconds=60) for row in rows)
+    assert "SendGrid is down" in rows[0].last_error
+
+    # Not retried before the backoff is over...
+    assert sender.send_pending(session) == 0
+    assert len(posted) == 2
+
+    # ...and sent once it is
+    make_due(session)
+    assert sender.send_pending(session) == 2
+    assert [(row.status, row.attempts) for row in outbox(session)] == [("sent", 2), ("sent", 2)]
+    assert sender.stats() == {"sent": 2, "retried": 2, "failed": 0}
+
+
+def test_email_is_given_up_on_after_max_attempts(session, queued, monkeypatch):
+    monkeypatch.setattr(email_outbox, "EMAIL_MAX_ATTEMPTS", 2)
+    sender = ResultEmailSender(Directory(unknown={"user_2"}), api_key="test")
+    monkeypatch.setattr(sender, "_post", lambda template, batch: None)
+
+    assert sender.send_pending(session) == 1
+    make_due(session)
+    assert sender.send_pending(session) == 0
+
+    rows = outbox(session)
+    assert [(row.status, row.attempts) for row in rows] == [("sent", 1), ("failed", 2)]
+    assert rows[1].last_error == "No email address for user"
+    make_due(session)
+    assert sender.send_pending(session) == 0
+    assert sender.stats() == {"sent": 1, "retried": 1, "failed": 1}
@@ -0,0 +1,82 @@
+import os
+import threading
+
+import pytest
+from sqlalchemy import create_engine, select, func
+from sqlalchemy.orm import sessionmaker
+
+from models.schema import Base, UserMocks, EmailOutbox
+from finalise_grading import finalise
+from conftest import seed_user_mock
+
+# The concurrent case needs row locks, so it runs against a scratch Postgres
+# database only, e.g. TEST_POSTGRES_URL=postgresql://localhost/grading_test
+TEST_POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+WORKERS = 6
+
+
+def user_mock_state(session, user_mock_id):
+    attempts, total_score, passed = session.execute(
+        select(UserMocks.attempts, UserMocks.total_score, UserMocks.passed)
+        .where(UserMocks.id == user_mock_id)).one()
+    emails = session.execute(
+        select(EmailOutbox.template).where(EmailOutbox.user_mock_id == user_mock_id)).scalars().all()
+    return attempts, total_score, passed, emails
+
+
+def test_finalising_twice_records_the_result_once(session, add_user_mock):
+    user_mock_id = add_user_mock([5, 4, 3, 4, 4])
+
+    assert [result.user_mock_id for result in finalise(session)] == [user_mock_id]
+    assert finalise(session) == []
+    assert user_mock_state(session, user_mock_id) == (1, 80, True, ["test_result_passed"])
+
+
+def test_complete_only_skips_user_mocks_with_missing_answers(session, add_user_mock):
+    complete = add_user_mock([1, 0, 2])
+    pending = add_user_mock([5, None, 5])
+    unanswered = add_user_mock([5, 5], questions=3)
+
+    finalised = finalise(session, [complete, pending, unanswered], complete_only=True)
+    assert [result.user_mock_id for result in finalised] == [complete]
+    assert user_mock_state(session, complete)[0] == 1
+    assert user_mock_state(session, complete)[3] == ["test_result_failed"]
+    assert user_mock_state(session, pending) == (0, None, None, [])
+    assert user_mock_state(session, unanswered) == (0, None, None, [])
+
+
+@pytest.mark.skipif(not TEST_POSTGRES_URL, reason="TEST_POSTGRES_URL not set")
+def test_concurrent_finalise_never_double_increments_attempts():
+    engine = create_engine(TEST_POSTGRES_URL, pool_size=WORKERS + 2)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    session = SessionLocal()
+    user_mock_ids = [seed_user_mock(session, n, [4, 3, 5, 2, 4]) for n in range(20)]
+    session.close()
+
+    barrier = threading.Barrier(WORKERS)
+    finalised = []
+
+    def work():
+        session = SessionLocal()
+        barrier.wait()
+        finalised.extend(result.user_mock_id for result in finalise(session, user_mock_ids))
+        session.close()
+
+    try:
+        threads = [threading.Thread(target=work) for _ in range(WORKERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert sorted(finalised) == sorted(user_mock_ids)
+        session = SessionLocal()
+        assert session.execute(select(func.max(UserMocks.attempts))).scalar() == 1
+        assert session.execute(select(func.count()).select_from(EmailOutbox)).scalar() == len(user_mock_ids)
+        session.close()
+    finally:
+        Base.metadata.drop_all(engine)
+        engine.dispose()
@@ -0,0 +1,44 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import grading_router
+from grading_router import GraderBackend, GradingRouter
+
+
+def test_hanging_primary_does_not_block_the_fast_backend(monkeypatch):
+    monkeypatch.setattr(grading_router, "GRADING_HEDGE_INITIAL_SECONDS", 0.3)
+    release = threading.Event()
+
+    def hang(reference, answer, language):
+        release.wait(10)
+        return "1"
+
+    def fast(reference, answer, language):
+        time.sleep(0.1)
+        return "4"
+
+    # The hanging backend has no history, so it ranks first until its pool is full
+    router = GradingRouter([GraderBackend("slow", "m", "v", hang),
+                            GraderBackend("fast", "m", "v", fast)],
+                           hedge=True, max_workers=4)
+
+    def grade_answers(_):
+        latencies = []
+        for _ in range(20):
+            started = time.monotonic()
+            score, backend = router.grade("reference", "answer", "Hindi")
+            latencies.append(time.monotonic() - started)
+            assert (score, backend.name) == (4, "fast")
+        return latencies
+
+    try:
+        with ThreadPoolExecutor(max_workers=2) as workers:
+            latencies = sorted(sum(workers.map(grade_answers, range(2)), []))
+    finally:
+        release.set()
+        router.close()
+
+    assert latencies[len(latencies) // 2] < 0.3
+    assert latencies[-1] < 1.0
+    assert router.stats()["hedges_won"] >= 1
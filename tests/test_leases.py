@@ -0,0 +1,110 @@
+import os
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from models.schema import Base, Mocks, MockQuestions, MockAnswers, UserMocks, Subscriptions
+from helpers import claim_mock_answers, bulk_update_mock_answers, MockAnswerResult
+
+# Leases rely on SELECT ... FOR UPDATE SKIP LOCKED, so these run against a
+# scratch Postgres database only, e.g.
+# TEST_POSTGRES_URL=postgresql://localhost/grading_test. Its tables are dropped.
+TEST_POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+pytestmark = pytest.mark.skipif(not TEST_POSTGRES_URL, reason="TEST_POSTGRES_URL not set")
+
+ANSWERS = 400
+WORKERS = 8
+
+
+@pytest.fixture
+def SessionLocal():
+    engine = create_engine(TEST_POSTGRES_URL, pool_size=WORKERS + 2)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+
+    started = datetime.utcnow() - timedelta(hours=1)
+    with engine.begin() as conn:
+        conn.execute(insert(Mocks), [dict(id="mock", name="mock", description="", time_duration=20,
+                                          no_of_qa=1, language="English")])
+        conn.execute(insert(MockQuestions), [dict(id="q", mock_id="mock", audio_file_url="", order=1,
+                                                  transcript="Reference", answer_language="Hindi")])
+        conn.execute(insert(Subscriptions), [dict(id=f"sub-{n}", user_id=f"user_{n}", mocks_available=1,
+                                                  mocks_used=1, payment_required=False, created_on=started)
+                                             for n in range(ANSWERS)])
+        conn.execute(insert(UserMocks), [dict(id=f"um-{n}", mock_id="mock", user_id=f"user_{n}",
+                                              attempts=0, created_on=started)
+                                         for n in range(ANSWERS)])
+        conn.execute(insert(MockAnswers), [dict(id=f"ans-{n:04d}", mock_question_id="q", user_mock_id=f"um-{n}",
+                                                user_id=f"user_{n}", audio_file_url=f"answers/{n}.webm",
+                                                mock_id="mock", created_on=started + timedelta(seconds=n))
+                                           for n in range(ANSWERS)])
+
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+
+
+def result(answer, score):
+    return MockAnswerResult(answer.mock_question_id, answer.user_mock_id, answer.user_id,
+                            f"transcript {score}", score, score >= 3, answer.mock_id)
+
+
+def test_concurrent_claims_never_return_the_same_answer(SessionLocal):
+    claimed = {}
+    barrier = threading.Barrier(WORKERS)
+
+    def work(worker_id):
+        session = SessionLocal()
+        barrier.wait()
+        answers = []
+        while True:
+            batch = claim_mock_answers(session, worker_id, 7, 60)
+            if not batch:
+                break
+            answers.extend(answer.id for answer in batch)
+        session.close()
+        claimed[worker_id] = answers
+
+    threads = [threading.Thread(target=work, args=(f"worker-{n}",)) for n in range(WORKERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    ids = sum(claimed.values(), [])
+    assert len(ids) == len(set(ids)) == ANSWERS
+    # Every worker got a share, so the claims really overlapped
+    assert all(claimed.values())
+
+
+def test_answer_graded_after_its_lease_expired_is_written_once(SessionLocal):
+    session = SessionLocal()
+    # The first worker's lease expires before it writes its grade...
+    first = claim_mock_answers(session, "first", 1, -1)
+    second = claim_mock_answers(session, "second", 1, 60)
+    assert [answer.id for answer in first] == [answer.id for answer in second]
+
+    # ...so the second worker grades the answer too, and writes first
+    assert bulk_update_mock_answers(session, [result(second[0], 4)]) == [True]
+    assert bulk_update_mock_answers(session, [result(first[0], 1)]) == [False]
+
+    score, transcript = session.execute(
+        select(MockAnswers.score, MockAnswers.transcript).where(MockAnswers.id == first[0].id)).one()
+    assert (score, transcript) == (4, "transcript 4")
+    session.close()
+
+
+def test_excluded_answers_are_not_leased(SessionLocal):
+    session = SessionLocal()
+    excluded = {f"ans-{n:04d}" for n in range(3)}
+    claimed = claim_mock_answers(session, "worker", 5, 60, exclude=excluded)
+    assert [answer.id for answer in claimed] == [f"ans-{n:04d}" for n in range(3, 8)]
+
+    leased = session.execute(
+        select(MockAnswers.id).where(MockAnswers.lease_owner != None)).scalars().all()
+    assert sorted(leased) == [answer.id for answer in claimed]
+    session.close()
@@ -0,0 +1,58 @@
+import os
+import select
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, insert, text
+
+from models.schema import Base, Mocks, MockQuestions, MockAnswers, UserMocks
+from migrate import apply_migrations, list_migrations
+from grading_daemon import NOTIFY_CHANNEL
+
+# Runs the migrations against a scratch Postgres database, whose tables are
+# dropped, e.g. TEST_POSTGRES_URL=postgresql://localhost/grading_test
+TEST_POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+pytestmark = pytest.mark.skipif(not TEST_POSTGRES_URL, reason="TEST_POSTGRES_URL not set")
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine(TEST_POSTGRES_URL)
+    Base.metadata.drop_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS schema_migrations"))
+    Base.metadata.create_all(engine)
+    yield engine
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+
+
+def test_migrations_apply_once(engine):
+    assert len(apply_migrations(engine)) == len(list_migrations())
+    assert apply_migrations(engine) == []
+
+
+def test_new_answers_notify_the_daemon(engine):
+    apply_migrations(engine)
+    raw = engine.raw_connection()
+    try:
+        conn = raw.driver_connection
+        conn.autocommit = True
+        conn.cursor().execute(f"LISTEN {NOTIFY_CHANNEL}")
+
+        with engine.begin() as tx:
+            tx.execute(insert(Mocks).values(id="mock", name="mock", description="",
+                                            time_duration=20, no_of_qa=1))
+            tx.execute(insert(MockQuestions).values(id="q", mock_id="mock", audio_file_url="",
+                                                    transcript="Reference"))
+            tx.execute(insert(UserMocks).values(id="um", mock_id="mock", user_id="user"))
+            tx.execute(insert(MockAnswers).values(
+                id="ans", mock_question_id="q", user_mock_id="um", user_id="user",
+                audio_file_url="answers/ans.webm", created_on=datetime.utcnow()))
+
+        assert select.select([conn], [], [], 5)[0]
+        conn.poll()
+        assert [notify.payload for notify in conn.notifies] == ["ans"]
+    finally:
+        raw.close()
@@ -0,0 +1,183 @@
+import os
+import json
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, event, insert, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import CreateTable
+
+from models.schema import Base, Mocks, MockQuestions, MockAnswers, UserMocks, Subscriptions
+from migrate import apply_migrations
+from helpers import (
+    fetch_mock_answers,
+    iter_mock_answers,
+    claim_mock_answers,
+    release_mock_answers,
+    get_mock_question_count,
+    get_mock_answers_by_user_mock_id,
+    get_user_mocks,
+    get_user_mock_totals,
+    get_pending_audio_file_names,
+)
+from email_outbox import claim_pending_emails
+
+# The grading queries must be served by indexes. The tables are created
+# without any secondary index (like a database that predates migrations/),
+# seeded with a realistic backlog and migrated, then every query the helpers
+# send is EXPLAINed. Needs a scratch Postgres database, whose tables are
+# dropped, e.g. TEST_POSTGRES_URL=postgresql://localhost/grading_test.
+TEST_POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+pytestmark = pytest.mark.skipif(not TEST_POSTGRES_URL, reason="TEST_POSTGRES_URL not set")
+
+# Tables that grow with the users, which the grading queries must never
+# scan sequentially
+GROWING_TABLES = {"mock_answers", "user_mocks", "subscriptions"}
+# The question catalogue only grows with content: reading all of it to
+# build a hash join is fine, filtering it row by row is not
+CATALOGUE_TABLES = {"mocks", "mock_questions"}
+QUESTIONS_PER_MOCK = 5
+MOCKS = 200
+USERS = 20000
+# Share of user mocks still waiting to be graded, and of users whose
+# subscription requires payment
+PENDING_RATIO = 0.02
+UNPAID_RATIO = 0.1
+
+# The helpers to check, called as helper(session, pending_user_mock)
+HELPERS = {
+    "fetch_mock_answers": lambda s, _: fetch_mock_answers(s),
+    "iter_mock_answers": lambda s, _: list(iter_mock_answers(s, page_size=100)),
+    "claim_mock_answers": lambda s, _: claim_mock_answers(s, "test_query_plans", 20, 60),
+    "release_mock_answers": lambda s, _: release_mock_answers(s, "test_query_plans"),
+    "get_mock_question_count": lambda s, _: get_mock_question_count(s, "mock-0000"),
+    "get_mock_answers_by_user_mock_id": lambda s, pending: get_mock_answers_by_user_mock_id(s, pending),
+    "get_user_mocks": lambda s, _: get_user_mocks(s),
+    "get_user_mock_totals": lambda s, _: get_user_mock_totals(s),
+    "get_user_mock_totals(complete_only)": lambda s, pending: get_user_mock_totals(
+        s, [pending], complete_only=True),
+    "get_pending_audio_file_names": lambda s, _: get_pending_audio_file_names(s),
+    "claim_pending_emails": lambda s, _: claim_pending_emails(s, 100),
+}
+
+
+def create_tables(engine):
+    """Create the tables with their primary keys only, as migrations/ expects to find them."""
+    Base.metadata.drop_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS schema_migrations"))
+        for table in Base.metadata.sorted_tables:
+            conn.execute(CreateTable(table))
+
+
+def seed(engine, mocks=MOCKS, users=USERS, pending_ratio=PENDING_RATIO, unpaid_ratio=UNPAID_RATIO):
+    """
+    Insert `mocks` mocks and one finished or pending user mock per user:
+    `pending_ratio` of them still waiting to be graded, and `unpaid_ratio`
+    of the users with payment_required. Returns a pending user mock ID.
+    """
+    rng = random.Random(22)
+    started = datetime.utcnow() - timedelta(days=30)
+    mock_ids = [f"mock-{n:04d}" for n in range(mocks)]
+
+    rows = {table: [] for table in (Mocks, MockQuestions, Subscriptions, UserMocks, MockAnswers)}
+    for mock_id in mock_ids:
+        rows[Mocks].append(dict(id=mock_id, name=mock_id, description="", time_duration=20,
+                                no_of_qa=QUESTIONS_PER_MOCK, language="English"))
+        for n in range(QUESTIONS_PER_MOCK):
+            rows[MockQuestions].append(dict(id=f"{mock_id}-q{n}", mock_id=mock_id, audio_file_url="",
+                                            order=n + 1, transcript="Reference", answer_language="Hindi"))
+
+    pending_user_mock = None
+    for number in range(users):
+        user_id = f"user_{number:06d}"
+        user_mock_id = f"um-{number:06d}"
+        mock_id = rng.choice(mock_ids)
+        pending = rng.random() < pending_ratio
+        created_on = started + timedelta(seconds=number * 60)
+        rows[Subscriptions].append(dict(id=f"sub-{number:06d}", user_id=user_id, mocks_available=5,
+                                        mocks_used=1, payment_required=rng.random() < unpaid_ratio,
+                                        created_on=created_on))
+        rows[UserMocks].append(dict(id=user_mock_id, mock_id=mock_id, user_id=user_id,
+                                    attempts=0 if pending else 1,
+                                    total_score=None if pending else rng.randrange(101),
+                                    passed=None if pending else rng.random() < 0.6,
+                                    created_on=created_on))
+        for n in range(QUESTIONS_PER_MOCK):
+            score = None if pending else rng.randrange(6)
+            rows[MockAnswers].append(dict(
+                id=f"ans-{number:06d}-{n}", mock_question_id=f"{mock_id}-q{n}", user_mock_id=user_mock_id,
+                user_id=user_id, audio_file_url=f"answers/{user_mock_id}-{n}.webm", mock_id=mock_id,
+                transcript=None if pending else "Transcript", score=score,
+                is_correct=None if pending else score >= 3, created_on=created_on))
+        if pending:
+            pending_user_mock = user_mock_id
+
+    with engine.begin() as conn:
+        for table, values in rows.items():
+            conn.execute(insert(table), values)
+    return pending_user_mock
+
+
+def seq_scans(plan):
+    """Yield the relation of every offending Seq Scan node in a JSON plan."""
+    if plan.get("Node Type") == "Seq Scan":
+        relation = plan["Relation Name"]
+        if relation in GROWING_TABLES or (relation in CATALOGUE_TABLES and "Filter" in plan):
+            yield relation
+    for child in plan.get("Plans", []):
+        yield from seq_scans(child)
+
+
+@pytest.fixture(scope="module")
+def backlog():
+    """A seeded and migrated database. Yields (engine, pending user mock ID)."""
+    engine = create_engine(TEST_POSTGRES_URL)
+    create_tables(engine)
+    pending_user_mock = seed(engine)
+    apply_migrations(engine)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("ANALYZE"))
+
+    yield engine, pending_user_mock
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+
+
+def capture_queries(engine, run):
+    """Run `run(session)` and return the distinct (statement, parameters) it sent."""
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    captured = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(("SELECT", "UPDATE", "WITH")):
+            captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    session = SessionLocal()
+    try:
+        run(session)
+    finally:
+        session.rollback()
+        session.close()
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    # Paged helpers send the same statement for every page
+    return list({statement: (statement, parameters) for statement, parameters in captured}.values())
+
+
+@pytest.mark.parametrize("name", HELPERS)
+def test_query_is_served_by_indexes(backlog, name):
+    engine, pending_user_mock = backlog
+    queries = capture_queries(engine, lambda session: HELPERS[name](session, pending_user_mock))
+    assert queries
+
+    for statement, parameters in queries:
+        with engine.connect() as conn:
+            plan = conn.exec_driver_sql(
+                f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()
+            conn.rollback()
+        plan = (plan if isinstance(plan, list) else json.loads(plan))[0]["Plan"]
+        assert not sorted(set(seq_scans(plan))), (
+            f"{name} scans sequentially:\n{json.dumps(plan, indent=2)}")
@@ -0,0 +1,45 @@
+import pytest
+
+import helpers
+from helpers import parse_score, record_grading_failures, iter_mock_answers
+
+
+@pytest.mark.parametrize("reply, score", [
+    ('{"score": 4}', 4),
+    ("4", 4),
+    (" 3.\n", 3),
+    ("2/5", 2),
+    ("4\nGood work, minor grammar slips.", 4),
+    ("The translation is close. Score: 3", 3),
+    (b"5", 5),
+])
+def test_parse_score(reply, score):
+    assert parse_score(reply) == score
+
+
+@pytest.mark.parametrize("reply", ['{"score": 6}', '{"grade": 4}', "Good work\n4", "7\nToo high", ""])
+def test_parse_score_rejects_replies_without_a_valid_score(reply):
+    with pytest.raises(ValueError):
+        parse_score(reply)
+
+
+def test_answer_is_given_up_on_after_max_grading_failures(session, add_user_mock, monkeypatch):
+    monkeypatch.setattr(helpers, "GRADING_MAX_FAILURES", 3)
+    add_user_mock([None, None])
+
+    assert record_grading_failures(session, ["ans-1-0"]) == []
+    assert record_grading_failures(session, ["ans-1-0"]) == []
+    assert [row.id for row in iter_mock_answers(session)] == ["ans-1-0", "ans-1-1"]
+
+    assert record_grading_failures(session, ["ans-1-0"]) == ["ans-1-0"]
+    assert [row.id for row in iter_mock_answers(session)] == ["ans-1-1"]
+
+
+@pytest.mark.parametrize("prompt", [
+    helpers.GRADING_SYSTEM_PROMPT,
+    helpers.CONSTRAINED_GRADING_SYSTEM_PROMPT,
+    helpers.BATCH_GRADING_SYSTEM_PROMPT,
+])
+def test_static_grading_prefix_is_long_enough_to_be_cached(prompt):
+    # Every word is at least one token, so this bounds the token count from below
+    assert len(prompt.split()) >= helpers.PROMPT_CACHE_MIN_TOKENS
@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+
+import pytest
+
+import user_directory
+from user_directory import UserDirectory
+
+
+def clerk_user(user_id, *emails):
+    addresses = [dict(id=f"idn_{n}", email_address=email) for n, email in enumerate(emails)]
+    return dict(id=user_id, email_addresses=addresses,
+                primary_email_address_id=addresses[-1]["id"] if addresses else None)
+
+
+USERS = {
+    "user_1": clerk_user("user_1", "old@example.com", "one@example.com"),
+    "user_2": clerk_user("user_2", "two@example.com"),
+    "user_3": clerk_user("user_3"),
+}
+
+
+@pytest.fixture
+def clerk(monkeypatch):
+    """
+    Stand-in for Clerk's user list endpoint. Records the IDs of every request
+    and fails the next `outages` of them.
+    """
+    clerk = SimpleNamespace(requests=[], outages=0)
+
+    def fetch_users_from_clerk(user_ids):
+        clerk.requests.append(list(user_ids))
+        if clerk.outages:
+            clerk.outages -= 1
+            raise ConnectionError("Clerk is down")
+        return {user_id: USERS[user_id] for user_id in user_ids if user_id in USERS}
+
+    monkeypatch.setattr(user_directory, "fetch_users_from_clerk", fetch_users_from_clerk)
+    monkeypatch.setattr(user_directory, "USER_LOOKUP_BACKOFF", 0)
+    return clerk
+
+
+def test_users_are_fetched_in_batches_and_cached(tmp_path, clerk):
+    path = tmp_path / "cache.sqlite3"
+    directory = UserDirectory(path, batch_size=2)
+    emails = directory.resolve(["user_1", "user_2", "user_1", "user_3", "user_4"])
+
+    assert emails == {"user_1": "one@example.com", "user_2": "two@example.com",
+                      "user_3": None, "user_4": None}
+    assert clerk.requests == [["user_1", "user_2"], ["user_3", "user_4"]]
+    assert directory.stats()["fetched"] == 2 and directory.stats()["not_found"] == 2
+
+    # Known users are answered from memory, then from the cache of another run
+    assert directory.email("user_2") == "two@example.com"
+    directory.close()
+    directory = UserDirectory(path, batch_size=2)
+    assert directory.resolve(["user_1", "user_2"]) == {
+        "user_1": "one@example.com", "user_2": "two@example.com"}
+    assert len(clerk.requests) == 2
+    directory.close()
+
+
+def test_failed_lookups_are_retried_together(tmp_path, clerk):
+    clerk.outages = 1
+    directory = UserDirectory(tmp_path / "cache.sqlite3", batch_size=1, attempts=2)
+
+    assert directory.resolve(["user_1", "user_2"]) == {
+        "user_1": "one@example.com", "user_2": "two@example.com"}
+    assert clerk.requests == [["user_1"], ["user_2"], ["user_1"]]
+    assert directory.stats()["failed"] == 0
+    directory.close()
+
+
+def test_users_that_cannot_be_fetched_resolve_to_none(tmp_path, clerk):
+    clerk.outages = 2
+    directory = UserDirectory(tmp_path / "cache.sqlite3", attempts=2)
+
+    assert directory.resolve(["user_1"]) == {"user_1": None}
+    assert directory.stats()["failed"] == 1
+    directory.close()
@@ -0,0 +1,16 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from whisper_pool import WhisperPool
+
+
+def test_model_load_failure_fails_the_jobs_instead_of_hanging():
+    pool = WhisperPool("no-such-model", workers=1)
+    try:
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(pool.transcribe, b"audio", "hi")
+            with pytest.raises(RuntimeError, match="failed to load model 'no-such-model'"):
+                future.result(timeout=60)
+    finally:
+        pool.close()
@@ -0,0 +1,115 @@
+import os
+import time
+
+from dotenv import load_dotenv
+
+from cache import SqliteCache, CACHE_PATH
+from helpers import fetch_users_from_clerk, primary_email_address
+
+load_dotenv()
+
+# Users fetched per Clerk request (the list endpoint allows up to 500)
+USER_LOOKUP_BATCH = int(os.getenv("USER_LOOKUP_BATCH") or "100")
+# Attempts for lookups that fail, with a doubling pause in between
+USER_LOOKUP_ATTEMPTS = int(os.getenv("USER_LOOKUP_ATTEMPTS") or "3")
+USER_LOOKUP_BACKOFF = 2.0
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES") or "20000")
+USER_CACHE_MAX_AGE_HOURS = float(os.getenv("USER_CACHE_MAX_AGE_HOURS") or "24")
+
+
+class UserDirectory:
+    """
+    Resolves Clerk user IDs to email addresses. Unknown IDs are fetched in
+    bulk through Clerk's user list endpoint, and the addresses are cached in
+    memory for the run and in the local SQLite cache for
+    USER_CACHE_MAX_AGE_HOURS. Lookups that fail are retried together after
+    the first pass instead of one by one.
+
+    Args:
+        path (str): SQLite database file of the cache.
+        batch_size (int): User IDs per Clerk request.
+        attempts (int): Passes over the IDs whose lookup failed.
+    """
+
+    def __init__(self, path=CACHE_PATH, batch_size=USER_LOOKUP_BATCH, attempts=USER_LOOKUP_ATTEMPTS):
+        self.cache = SqliteCache("user_emails", path, USER_CACHE_MAX_ENTRIES,
+                                 USER_CACHE_MAX_AGE_HOURS * 3600 if USER_CACHE_MAX_AGE_HOURS else None)
+        self.batch_size = max(1, min(batch_size, 500))
+        self.attempts = max(1, attempts)
+        self.fetched = 0
+        self.not_found = 0
+        self.failed = 0
+        # user_id -> email, or None for users without one
+        self._emails = {}
+
+    def resolve(self, user_ids):
+        """
+        Look up the email address of every user in `user_ids`.
+
+        Returns:
+            dict: Email address keyed by user ID; None for users that don't
+                  exist, have no address, or couldn't be fetched.
+        """
+        missing = []
+        for user_id in dict.fromkeys(user_ids):
+            if user_id in self._emails:
+                continue
+            email = self.cache.get(user_id)
+            if email is not None:
+                self._emails[user_id] = email
+            else:
+                missing.append(user_id)
+
+        for attempt in range(self.attempts):
+            if not missing:
+                break
+            if attempt:
+                delay = USER_LOOKUP_BACKOFF * 2 ** (attempt - 1)
+                print(
+                    f"-> Retrying {len(missing)} Clerk user lookups in {delay:.0f}s")
+                time.sleep(delay)
+            missing = self._fetch(missing)
+
+        for user_id in missing:
+            print(f"[-] Couldn't fetch user {user_id} from Clerk")
+        self.failed += len(missing)
+
+        return {user_id: self._emails.get(user_id) for user_id in user_ids}
+
+    def _fetch(self, user_ids):
+        """Fetch `user_ids` in batches. Returns the IDs whose batch failed."""
+        failed = []
+        for start in range(0, len(user_ids), self.batch_size):
+            chunk = user_ids[start:start + self.batch_size]
+            try:
+                users = fetch_users_from_clerk(chunk)
+            except Exception as ex:
+                print(f"[-] Error fetching {len(chunk)} users from Clerk: {ex}")
+                failed.extend(chunk)
+                continue
+
+            for user_id in chunk:
+                email = primary_email_address(users.get(user_id))
+                self._emails[user_id] = email
+                if email is None:
+                    print(f"-> No email address found for user {user_id}")
+                    self.not_found += 1
+                else:
+                    self.cache.put(user_id, email)
+                    self.fetched += 1
+        return failed
+
+    def email(self, user_id):
+        """Look up one user's email address, or None."""
+        return self.resolve([user_id])[user_id]
+
+    def stats(self):
+        return {
+            "fetched": self.fetched,
+            "not_found": self.not_found,
+            "failed": self.failed,
+            "cache": self.cache.stats(),
+        }
+
+    def close(self):
+        self.cache.close()
@@ -0,0 +1,392 @@
+import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import Future
+
+from dotenv import load_dotenv
+
+from metrics import metrics
+
+load_dotenv()
+
+WHISPER_MODEL = os.getenv("WHISPER_MODEL") or "small"
+WHISPER_WORKERS = int(os.getenv("WHISPER_WORKERS") or "1")
+# Clips decoded together in one batch; 1 transcribes clip by clip
+WHISPER_BATCH_SIZE = int(os.getenv("WHISPER_BATCH_SIZE") or "1")
+# Longest time in seconds a clip waits for its batch to fill up
+WHISPER_BATCH_WAIT = float(os.getenv("WHISPER_BATCH_WAIT") or "2")
+
+# Approximate resident memory needed by one worker per model size, in bytes
+MODEL_MEMORY = {
+    "tiny": 1 << 30,
+    "base": 1 << 30,
+    "small": 2 << 30,
+    "medium": 5 << 30,
+    "large": 10 << 30,
+    "turbo": 6 << 30,
+}
+
+# Model held by each worker process, loaded once by _init_worker
+_model = None
+# Why the worker couldn't load the model, raised by each of its jobs
+_init_error = None
+
+_pool = None
+_batcher = None
+_pool_lock = threading.Lock()
+
+
+def available_memory():
+    """
+    Return the memory available for new processes in bytes, or None if it
+    can't be determined on this platform.
+    """
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def max_workers_for_memory(model_name):
+    """Number of workers holding `model_name` that fit in available memory."""
+    available = available_memory()
+    if available is None:
+        return None
+    # "small.en" and "large-v3" share the footprint of their base size
+    size = model_name.split(".")[0].split("-")[0]
+    per_worker = MODEL_MEMORY.get(size, 2 << 30)
+    return max(1, available // per_worker)
+
+
+def _init_worker(model_name, threads):
+    """
+    Pool initializer: load the Whisper model once for this process. An
+    initializer that raises makes the pool respawn the worker forever and
+    every job hang, so a failure is kept and raised by the jobs instead.
+    """
+    global _model, _init_error
+    try:
+        import torch
+        import whisper
+
+        torch.set_num_threads(threads)
+        _model = whisper.load_model(model_name)
+    except Exception as ex:
+        _init_error = f"Whisper worker {os.getpid()} failed to load model '{model_name}': {ex!r}"
+        print(f"[-] {_init_error}")
+        return
+    print(f"-> Whisper worker {os.getpid()} loaded model '{model_name}'")
+
+
+def _worker_model():
+    """The worker's loaded model. Raises RuntimeError if it failed to load."""
+    if _model is None:
+        raise RuntimeError(_init_error or "Whisper model not loaded")
+    return _model
+
+
+def _transcribe_job(audio_file, language):
+    """
+    Pool task: transcribe one file path, the bytes of an in-memory audio
+    file, or already decoded 16 kHz samples, with the worker's preloaded model.
+    """
+    model = _worker_model()
+    import torch
+    from audio import decode_audio
+
+    if isinstance(audio_file, bytes):
+        audio_file = decode_audio(audio_file)
+
+    result = model.transcribe(
+        audio_file, fp16=torch.cuda.is_available(), language=language)
+    return result["text"]
+
+
+def _load_samples(audio_file):
+    """Decode a path or in-memory audio file to 16 kHz samples; samples pass through."""
+    import whisper
+    from audio import decode_audio
+
+    if isinstance(audio_file, bytes):
+        return decode_audio(audio_file)
+    if isinstance(audio_file, (str, os.PathLike)):
+        return whisper.load_audio(audio_file)
+    return audio_file
+
+
+def _transcribe_batch_job(clips, language):
+    """
+    Pool task: transcribe several clips in the same language. Clips up to
+    Whisper's 30 s window are padded to it and run through the encoder and
+    decoder as one batch; longer clips fall back to transcribe() one by one.
+
+    Returns:
+        tuple: (texts, audio_seconds) where texts follow the order of `clips`.
+    """
+    model = _worker_model()
+    import torch
+    import whisper
+    from whisper.audio import N_SAMPLES, SAMPLE_RATE
+
+    fp16 = torch.cuda.is_available()
+    clips = [_load_samples(clip) for clip in clips]
+    texts = [None] * len(clips)
+
+    short = [i for i, samples in enumerate(clips) if len(samples) <= N_SAMPLES]
+    if short:
+        mel = torch.stack([
+            whisper.log_mel_spectrogram(
+                whisper.pad_or_trim(clips[i]), model.dims.n_mels)
+            for i in short
+        ]).to(model.device)
+        options = whisper.DecodingOptions(
+            language=language, fp16=fp16, without_timestamps=True)
+        for i, result in zip(short, whisper.decode(model, mel, options)):
+            texts[i] = result.text
+
+    for i, samples in enumerate(clips):
+        if texts[i] is None:
+            texts[i] = model.transcribe(
+                samples, fp16=fp16, language=language)["text"]
+
+    return texts, sum(len(samples) for samples in clips) / SAMPLE_RATE
+
+
+class WhisperPool:
+    """
+    A pool of long-lived worker processes, each holding a loaded Whisper model,
+    that transcribe (path, language) jobs.
+
+    Args:
+        model_name (str): Whisper model to load in every worker.
+        workers (int): Requested number of workers. Capped by how many copies
+                       of the model fit in available memory.
+    """
+
+    def __init__(self, model_name=WHISPER_MODEL, workers=WHISPER_WORKERS):
+        limit = max_workers_for_memory(model_name)
+        if limit is not None and workers > limit:
+            print(
+                f"-> Only memory for {limit} Whisper workers, requested {workers}")
+            workers = limit
+        self.model_name = model_name
+        self.workers = max(1, workers)
+
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        # Spawn rather than fork so CUDA/torch state is never inherited
+        context = multiprocessing.get_context("spawn")
+        self._pool = context.Pool(
+            processes=self.workers,
+            initializer=_init_worker,
+            initargs=(model_name, threads),
+        )
+        print(
+            f"[+] Started {self.workers} Whisper workers with model '{model_name}'")
+
+    def transcribe(self, audio_file, language):
+        """
+        Transcribe an audio file on one of the workers. Safe to call from
+        several threads at once.
+
+        Args:
+            audio_file (str, bytes or np.ndarray): Path to the audio file, its
+                contents, or decoded 16 kHz mono samples.
+            language (str): Whisper language code or name, e.g. "hi".
+
+        Returns:
+            str: The transcribed text.
+        """
+        return self._pool.apply(_transcribe_job, (audio_file, language))
+
+    def transcribe_batch(self, audio_files, language, callback=None, error_callback=None):
+        """
+        Transcribe several clips in the same language as one batch on one of
+        the workers.
+
+        Args:
+            audio_files (list): Paths, file contents or decoded samples.
+            language (str): Whisper language code or name, e.g. "hi".
+            callback (callable, optional): Makes the call asynchronous; called
+                                           with (texts, audio_seconds) when done.
+            error_callback (callable, optional): Called with the exception if
+                                                 an asynchronous batch fails.
+
+        Returns:
+            tuple: (texts, audio_seconds), or None when called with a callback.
+        """
+        if callback is None:
+            return self._pool.apply(_transcribe_batch_job, (audio_files, language))
+        self._pool.apply_async(_transcribe_batch_job, (audio_files, language),
+                               callback=callback, error_callback=error_callback)
+
+    def close(self):
+        """Stop the workers once queued jobs are done."""
+        self._pool.close()
+        self._pool.join()
+
+
+class WhisperBatcher:
+    """
+    Collects transcription requests from many threads and runs them on a
+    WhisperPool in batches of clips in the same language. A batch is sent
+    once it holds `batch_size` clips or its oldest clip has waited `max_wait`
+    seconds, so full batches need about `batch_size` answers in flight.
+
+    Args:
+        pool (WhisperPool): Pool the batches run on.
+        batch_size (int): Clips per batch.
+        max_wait (float): Seconds before a partial batch is sent.
+    """
+
+    def __init__(self, pool, batch_size=WHISPER_BATCH_SIZE, max_wait=WHISPER_BATCH_WAIT):
+        self.pool = pool
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max_wait
+        self.clips = 0
+        self.batches = 0
+        self.audio_seconds = 0.0
+        self._started = None
+        self._finished = None
+
+        # language -> [(audio_file, future, queued_at)]
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._stats_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._dispatch, name="whisper-batcher", daemon=True)
+        self._thread.start()
+
+    def transcribe(self, audio_file, language):
+        """
+        Queue one clip and wait for the transcript of its batch. Same
+        arguments and result as WhisperPool.transcribe().
+        """
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("WhisperBatcher is closed")
+            self._pending.setdefault(language, []).append(
+                (audio_file, future, time.monotonic()))
+            self._cond.notify()
+        return future.result()
+
+    def _next_batch(self):
+        """
+        Pop a batch that is full or has waited long enough. Returns
+        (language, batch, None), or (None, None, seconds until one is due).
+        """
+        now = time.monotonic()
+        wait = None
+        for language, queue in self._pending.items():
+            due = queue[0][2] + self.max_wait
+            if len(queue) >= self.batch_size or due <= now or self._closed:
+                batch = queue[:self.batch_size]
+                del queue[:self.batch_size]
+                if not queue:
+                    del self._pending[language]
+                return language, batch, None
+            wait = due - now if wait is None else min(wait, due - now)
+        return None, None, wait
+
+    def _dispatch(self):
+        while True:
+            with self._cond:
+                language, batch, wait = self._next_batch()
+                while batch is None:
+                    if self._closed and not self._pending:
+                        return
+                    self._cond.wait(wait)
+                    language, batch, wait = self._next_batch()
+            self._submit(language, batch)
+
+    def _submit(self, language, batch):
+        started = time.monotonic()
+        with self._stats_lock:
+            if self._started is None:
+                self._started = started
+
+        def done(result):
+            texts, audio_seconds = result
+            finished = time.monotonic()
+            with self._stats_lock:
+                self.clips += len(batch)
+                self.batches += 1
+                self.audio_seconds += audio_seconds
+                self._finished = finished
+            metrics.inc("whisper_audio_seconds_total", audio_seconds)
+            metrics.observe("whisper_batch_size", len(batch))
+            print(
+                f"-> Transcribed {len(batch)} '{language}' clips, {audio_seconds:.0f}s of audio in {finished - started:.1f}s")
+            for (_, future, _), text in zip(batch, texts):
+                future.set_result(text)
+
+        def failed(ex):
+            for _, future, _ in batch:
+                future.set_exception(ex)
+
+        try:
+            self.pool.transcribe_batch(
+                [audio_file for audio_file, _, _ in batch], language,
+                callback=done, error_callback=failed)
+        except Exception as ex:
+            failed(ex)
+
+    def stats(self):
+        """Return batch counters and throughput in audio-seconds per wall-second."""
+        with self._stats_lock:
+            elapsed = (self._finished or 0) - (self._started or 0)
+            return {
+                "clips": self.clips,
+                "batches": self.batches,
+                "audio_seconds": round(self.audio_seconds, 1),
+                "audio_seconds_per_second":
+                    round(self.audio_seconds / elapsed, 2) if elapsed > 0 else 0.0,
+            }
+
+    def close(self):
+        """Send the clips still waiting, then stop batching."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+
+def get_whisper_pool():
+    """Return the process-wide WhisperPool, starting it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = WhisperPool()
+        return _pool
+
+
+def get_whisper_batcher():
+    """Return the process-wide WhisperBatcher over the WhisperPool, starting both on first use."""
+    global _batcher
+    pool = get_whisper_pool()
+    with _pool_lock:
+        if _batcher is None:
+            _batcher = WhisperBatcher(pool)
+        return _batcher
+
+
+def close_whisper_pool():
+    """Shut down the process-wide WhisperBatcher and WhisperPool if they were started."""
+    global _pool, _batcher
+    with _pool_lock:
+        if _batcher is not None:
+            _batcher.close()
+            print("[+] Whisper batches:", _batcher.stats())
+            _batcher = None
+        if _pool is not None:
+            _pool.close()
+            _pool = None